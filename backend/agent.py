@@ -1,9 +1,21 @@
-from typing import Dict, Any, List, Optional
-from elasticsearch import Elasticsearch
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from elasticsearch import AsyncElasticsearch
 from datetime import datetime
 import google.generativeai as genai
+import asyncio
 import os
 import json
+from audit_writer import AuditWriter
+from history_index import HistoryIndex
+from compaction import compact_context
+from plan_cache import PlanCache, plan_fingerprint
+from plan_batcher import PlanBatcher, PLAN_BATCH_ENABLED, strip_code_fence
+from llm_guard import LLMGuard, CircuitOpenError
+from query_cache import QueryCache
+from esql_results import EsqlResult, run_esql, columnar_result
+from playbooks import PlaybookEngine, PLAYBOOKS_FILE, PLAYBOOK_MIN_CONFIDENCE
+from log_store import LogStore, LOCAL_STORE_MIRROR
+from local_esql import LocalEsql, ESQL_BACKEND
 
 class GreenStickAgent:
     def __init__(self, es_cloud_id: Optional[str] = None, es_api_key: Optional[str] = None, gemini_api_key: Optional[str] = None, es_endpoint: Optional[str] = None):
@@ -13,12 +25,12 @@ class GreenStickAgent:
         if (es_cloud_id or es_endpoint) and es_api_key:
             try:
                 if es_cloud_id:
-                    self.es_client = Elasticsearch(
+                    self.es_client = AsyncElasticsearch(
                         cloud_id=es_cloud_id,
                         api_key=es_api_key
                     )
                 else:
-                    self.es_client = Elasticsearch(
+                    self.es_client = AsyncElasticsearch(
                         hosts=[es_endpoint],
                         api_key=es_api_key
                     )
@@ -37,30 +49,109 @@ class GreenStickAgent:
             self.model = None
             print("Warning: Gemini API key not provided.")
 
+        self.audit_writer = AuditWriter(self.es_client) if self.es_client else None
+        self.history_index = HistoryIndex()
+        self.plan_cache = PlanCache()
+        self.playbooks = self._load_playbooks()
+        self.llm_guard = LLMGuard()
+        self.query_cache = QueryCache()
+        self.log_store = self._open_log_store()
+        # ES|QL queries run on the cluster, or in-process with ESQL_BACKEND=local
+        self.esql_backend = LocalEsql(self.log_store) if ESQL_BACKEND == "local" and self.log_store else self.es_client
+        self.plan_batcher = None
+        if self.model and PLAN_BATCH_ENABLED:
+            self.plan_batcher = PlanBatcher(self._call_model, self._generate_single_plan, self._degraded_plan)
+
+    async def close(self):
+        """Flush buffered audit entries and logs, and close the Elasticsearch connection pool."""
+        if self.audit_writer:
+            await self.audit_writer.close()
+        if self.log_store:
+            self.log_store.flush()
+        if self.es_client:
+            await self.es_client.close()
+
     async def analyze_incident(self, incident_id: str) -> Dict[str, Any]:
         """
         Main workflow: Detect -> Search -> Correlate -> Plan -> Execute
         """
-        # 1. Fetch Incident Data
-        incident_data = self._fetch_recent_errors(incident_id)
-        
-        if not incident_data:
-            return {"error": "No recent errors found matching criteria"}
-
-        # 2. Search Historical Context
-        history = self._search_history(incident_data[0].get("message", ""))
+        result = {"error": "Analysis ended without a result"}
+        async for event, data in self.analyze_incident_events(incident_id):
+            if event in ("result", "error"):
+                result = data
+        return result
+    
+    async def analyze_incident_events(self, incident_id: str, stream_plan: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Run the analysis workflow, yielding (event, data) as each stage
+        completes: "anomalies", "history" and "correlations" (in completion
+        order), "plan_token" chunks when stream_plan is set, "plan",
+        "execution", "audit" and finally "result" with the assembled analysis
+        (or a single "error" when no incident data is found).
         
-        # 3. Correlate Events (ES|QL)
-        correlations = self._correlate_events(incident_id)
+        Retrieval runs as a small dependency graph:
+        fetch errors ──> search history (needs the first message)
+        correlate events (independent)
+        Correlation starts immediately alongside the fetch, and the history
+        search starts as soon as the fetch returns, so the stage takes about
+        as long as its longest path instead of the sum of all three queries.
+        """
+        # 1-3. Fetch incident data, historical context and correlations
+        correlations_task = asyncio.create_task(self._correlate_events(incident_id))
+        pending: Dict[asyncio.Task, str] = {correlations_task: "correlations"}
+        context: Dict[str, Any] = {}
+        try:
+            incident_data = await self._fetch_recent_errors(incident_id)
+            if not incident_data:
+                yield "error", {"error": "No recent errors found matching criteria"}
+                return
+            yield "anomalies", incident_data
+            
+            history_task = asyncio.create_task(self._search_history(incident_data[0].get("message", "")))
+            pending[history_task] = "history"
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = pending.pop(task)
+                    context[name] = task.result()
+                    yield name, context[name]
+        finally:
+            for task in pending:
+                task.cancel()
+        history, correlations = context["history"], context["correlations"]
         
-        # 4. Generate Remediation Plan (Gemini)
-        plan = await self._generate_plan(incident_data, history, correlations)
+        # 4. Remediation plan: a confident playbook match skips the model;
+        # otherwise Gemini plans from a budget-compacted context
+        self.playbooks.reload_if_changed()
+        playbook = self.playbooks.match(incident_data, history)
+        prompt_stats = None
+        if playbook and (playbook["confidence"] >= PLAYBOOK_MIN_CONFIDENCE or not self.model):
+            plan, plan_source = playbook["plan"], "playbook"
+        else:
+            playbook = None
+            compacted, prompt_stats = compact_context(incident_data, history, correlations)
+            if stream_plan:
+                async for chunk in self._generate_plan_stream(*compacted):
+                    if isinstance(chunk, str):
+                        yield "plan_token", chunk
+                    else:
+                        plan = chunk
+            else:
+                plan = await self._generate_plan(*compacted)
+            if not self.model:
+                plan_source = "unconfigured"
+            elif plan.get("degraded"):
+                plan_source = "degraded"
+            else:
+                plan_source = "cache" if plan.get("cached") else "llm"
+        yield "plan", plan
         
         # 5. Execute Action (if confidence is high enough)
         execution_result = await self._execute_action(plan)
+        yield "execution", execution_result
         
         # 6. Log to Audit Trail
-        self._log_audit_entry(
+        audit_id = await self._log_audit_entry(
             trace_id=incident_id,
             action_type=plan.get("action", "ANALYSIS"),
             description=plan.get("reasoning", "Analysis completed"),
@@ -68,10 +159,13 @@ class GreenStickAgent:
             metadata={
                 "correlations_count": len(correlations) if correlations else 0,
                 "historical_matches": len(history) if history else 0,
+                "plan_source": plan_source,
+                "playbook": playbook["playbook"] if playbook else None,
             }
         )
+        yield "audit", {"id": audit_id}
         
-        return {
+        yield "result", {
             "incident_id": incident_id,
             "timestamp": datetime.now().isoformat(),
             "detected_anomalies": incident_data,
@@ -82,54 +176,65 @@ class GreenStickAgent:
                 "summary": plan.get("reasoning", "Analysis pending.")
             },
             "plan": plan,
-            "execution": execution_result
+            "plan_source": plan_source,
+            "playbook": playbook["playbook"] if playbook else None,
+            "prompt_compaction": prompt_stats,
+            "execution": execution_result,
+            "audit_id": audit_id
         }
     
-    def _log_audit_entry(self, trace_id: str, action_type: str, description: str, confidence: float, metadata: dict = None):
-        """Log an action to the audit trail in Elasticsearch."""
-        if not self.es_client:
-            return
-        
+    def _load_playbooks(self) -> PlaybookEngine:
+        """Compile the remediation playbooks; without them every plan comes from the model."""
         try:
-            # Create index if not exists
-            if not self.es_client.indices.exists(index="greenstick-audit"):
-                self.es_client.indices.create(index="greenstick-audit", body={
-                    "mappings": {
-                        "properties": {
-                            "@timestamp": {"type": "date"},
-                            "trace_id": {"type": "keyword"},
-                            "action_type": {"type": "keyword"},
-                            "description": {"type": "text"},
-                            "confidence": {"type": "float"},
-                            "status": {"type": "keyword"},
-                            "metadata": {"type": "object", "enabled": True}
-                        }
-                    }
-                })
-            
-            doc = {
-                "@timestamp": datetime.now().isoformat() + "Z",
-                "trace_id": trace_id,
-                "action_type": action_type,
-                "description": description,
-                "confidence": confidence,
-                "status": "pending",
-                "metadata": metadata or {}
-            }
-            
-            self.es_client.index(index="greenstick-audit", document=doc, refresh=True)
+            playbooks = PlaybookEngine.from_file(PLAYBOOKS_FILE)
+            print(f"Loaded {len(playbooks.playbooks)} remediation playbooks from {PLAYBOOKS_FILE}")
+            return playbooks
         except Exception as e:
-            print(f"Failed to log audit entry: {e}")
+            print(f"Remediation playbooks unavailable ({e})")
+            return PlaybookEngine([])
+
+    def _open_log_store(self) -> Optional[LogStore]:
+        """The local columnar copy of the logs, when the local backend or mirroring is enabled."""
+        if ESQL_BACKEND != "local" and not LOCAL_STORE_MIRROR:
+            return None
+        try:
+            store = LogStore()
+            print(f"Opened local log store at {store.path} ({store.rows} rows)")
+            return store
+        except Exception as e:
+            print(f"Local log store unavailable ({e})")
+            return None
+
+    async def _log_audit_entry(self, trace_id: str, action_type: str, description: str, confidence: float, metadata: dict = None) -> Optional[str]:
+        """Queue an action for the audit trail in Elasticsearch. Returns the entry id."""
+        if not self.audit_writer:
+            return None
+        
+        doc = {
+            "@timestamp": datetime.now().isoformat() + "Z",
+            "trace_id": trace_id,
+            "action_type": action_type,
+            "description": description,
+            "confidence": confidence,
+            "status": "pending",
+            "metadata": metadata or {}
+        }
+        return await self.audit_writer.write(doc)
 
-    def _fetch_recent_errors(self, query_term: str) -> List[Dict[str, Any]]:
-        """Fetch recent errors, trying exact trace_id match first, then falling back to recent errors."""
+    async def _fetch_recent_errors(self, query_term: str) -> List[Dict[str, Any]]:
+        """
+        Fetch recent errors: logs matching the trace_id if any, else recent
+        ERROR logs, else any recent logs. All three searches go out in one
+        _msearch and the first non-empty result wins.
+        """
         if not self.es_client:
             print("No Elasticsearch client available")
             return []
-            
-        try:
-            # First try exact trace_id match
-            response = self.es_client.search(index="greenstick-logs", body={
+        
+        newest_first = {"size": 10, "sort": [{"@timestamp": {"order": "desc"}}]}
+        fallbacks = [
+            # Exact trace_id match
+            {
                 "query": {
                     "bool": {
                         "should": [
@@ -139,52 +244,56 @@ class GreenStickAgent:
                         "minimum_should_match": 1
                     }
                 },
-                "size": 10,
-                "sort": [{"@timestamp": {"order": "desc"}}]
-            })
-            
-            hits = response.get("hits", {}).get("hits", [])
-            if hits:
-                print(f"Found {len(hits)} logs matching trace_id: {query_term}")
-                return [hit["_source"] for hit in hits]
-            
-            # If no exact match, get recent ERROR logs
-            print(f"No exact match for {query_term}, fetching recent errors...")
-            response = self.es_client.search(index="greenstick-logs", body={
-                "query": {
-                    "match": {"level": "ERROR"}
-                },
-                "size": 10,
-                "sort": [{"@timestamp": {"order": "desc"}}]
-            })
-            
-            hits = response.get("hits", {}).get("hits", [])
-            if hits:
-                print(f"Found {len(hits)} recent ERROR logs")
-                return [hit["_source"] for hit in hits]
-            
-            # Final fallback: get any recent logs
-            print("No ERROR logs found, fetching any recent logs...")
-            response = self.es_client.search(index="greenstick-logs", body={
-                "query": {"match_all": {}},
-                "size": 10,
-                "sort": [{"@timestamp": {"order": "desc"}}]
-            })
+                **newest_first
+            },
+            # Recent ERROR logs
+            {"query": {"match": {"level": "ERROR"}}, **newest_first},
+            # Any recent logs
+            {"query": {"match_all": {}}, **newest_first}
+        ]
+        
+        try:
+            searches = []
+            for body in fallbacks:
+                searches.extend([{"index": "greenstick-logs"}, body])
+            response = await self.es_client.msearch(searches=searches)
             
-            hits = response.get("hits", {}).get("hits", [])
-            print(f"Found {len(hits)} total logs")
-            return [hit["_source"] for hit in hits]
+            for step, result in enumerate(response.get("responses", [])):
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                hits = result.get("hits", {}).get("hits", [])
+                if step == 0:
+                    if hits:
+                        print(f"Found {len(hits)} logs matching trace_id: {query_term}")
+                        return [hit["_source"] for hit in hits]
+                    print(f"No exact match for {query_term}, falling back to recent errors...")
+                elif step == 1:
+                    if hits:
+                        print(f"Found {len(hits)} recent ERROR logs")
+                        return [hit["_source"] for hit in hits]
+                    print("No ERROR logs found, falling back to any recent logs...")
+                else:
+                    print(f"Found {len(hits)} total logs")
+                    return [hit["_source"] for hit in hits]
+            return []
             
         except Exception as e:
             print(f"Error fetching logs: {e}")
             return []
 
-    def _search_history(self, error_message: str) -> List[Dict[str, Any]]:
+    async def _search_history(self, error_message: str) -> List[Dict[str, Any]]:
+        """Most similar historical incidents, from the in-process vector index."""
         if not self.es_client:
             return []
 
         try:
-            response = self.es_client.search(index="greenstick-incidents", body={
+            await self.history_index.ensure_fresh(self.es_client)
+            return [incident for incident, _ in self.history_index.search(error_message, k=3)]
+        except Exception as e:
+            print(f"Vector history search unavailable, falling back to keyword match: {e}")
+
+        try:
+            response = await self.es_client.search(index="greenstick-incidents", body={
                 "query": {
                     "match": {
                         "description": error_message
@@ -200,8 +309,8 @@ class GreenStickAgent:
             print(f"Error searching history: {e}")
             return []
 
-    def _correlate_events(self, incident_id: str) -> List[Dict[str, Any]]:
-        if not self.es_client:
+    async def _correlate_events(self, incident_id: str) -> List[Dict[str, Any]]:
+        if not self.esql_backend:
             return []
 
         query = """
@@ -210,9 +319,9 @@ class GreenStickAgent:
         | SORT count DESC
         | LIMIT 10
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query)
 
-    def esql_correlated_errors(self, timeframe_minutes: int = 60) -> List[Dict[str, Any]]:
+    async def esql_correlated_errors(self, timeframe_minutes: int = 60, columnar: bool = False) -> EsqlResult:
         """
         Finds traces that have errors across multiple services (Cascading Failures).
         """
@@ -224,29 +333,29 @@ class GreenStickAgent:
         | SORT error_count DESC
         | LIMIT 20
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query, columnar)
 
-    def _execute_esql(self, query: str) -> List[Dict[str, Any]]:
-        """Execute an ES|QL query and return results as list of dicts"""
-        if not self.es_client:
-            return []
+    async def _execute_esql(self, query: str, columnar: bool = False) -> EsqlResult:
+        """
+        Execute an ES|QL query through the shared result cache. Returns a list
+        of row dicts, or the column arrays with columnar=True (see esql_results.py).
+        """
+        empty = columnar_result({}) if columnar else []
+        if not self.esql_backend:
+            return empty
         
+        if not hasattr(self.esql_backend, 'esql'):
+            print("ES|QL not available on this Elasticsearch client")
+            return empty
         try:
-            if hasattr(self.es_client, 'esql'):
-                resp = self.es_client.esql.query(query=query)
-                columns = [col['name'] for col in resp.get('columns', [])]
-                results = []
-                for row in resp.get('values', []):
-                    results.append(dict(zip(columns, row)))
-                return results
-            else:
-                print("ES|QL not available on this Elasticsearch client")
-                return []
+            return await self.query_cache.get(
+                query, lambda: run_esql(self.esql_backend, query, columnar), shape="columnar" if columnar else "rows"
+            )
         except Exception as e:
             print(f"ES|QL Query failed: {e}")
-            return []
+            return empty
 
-    def esql_error_trends(self, hours: int = 24) -> List[Dict[str, Any]]:
+    async def esql_error_trends(self, hours: int = 24, columnar: bool = False) -> EsqlResult:
         """Analyze error trends over time using ES|QL"""
         query = f"""
         FROM "greenstick-logs"
@@ -256,9 +365,9 @@ class GreenStickAgent:
         | SORT hour DESC
         | LIMIT {hours}
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query, columnar)
 
-    def esql_service_health(self) -> List[Dict[str, Any]]:
+    async def esql_service_health(self, columnar: bool = False) -> EsqlResult:
         """Get service health summary using ES|QL"""
         query = """
         FROM "greenstick-logs"
@@ -271,9 +380,9 @@ class GreenStickAgent:
         | EVAL error_rate = ROUND(errors * 100.0 / total, 2)
         | SORT error_rate DESC
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query, columnar)
 
-    def esql_trace_analysis(self, trace_id: str) -> List[Dict[str, Any]]:
+    async def esql_trace_analysis(self, trace_id: str, columnar: bool = False) -> EsqlResult:
         """Trace a request through services using ES|QL"""
         query = f"""
         FROM "greenstick-logs"
@@ -281,9 +390,9 @@ class GreenStickAgent:
         | SORT @timestamp ASC
         | KEEP @timestamp, service, level, message
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query, columnar)
 
-    def esql_anomaly_detection(self) -> List[Dict[str, Any]]:
+    async def esql_anomaly_detection(self, columnar: bool = False) -> EsqlResult:
         """Detect anomalies by finding services with unusual error rates using ES|QL"""
         query = """
         FROM "greenstick-logs"
@@ -297,24 +406,89 @@ class GreenStickAgent:
         | WHERE error_rate > 10
         | SORT error_rate DESC
         """
-        return self._execute_esql(query)
+        return await self._execute_esql(query, columnar)
 
     async def _generate_plan(self, incident: List[Dict[str, Any]], history: List[Dict[str, Any]], correlations: List[Dict[str, Any]]) -> Dict[str, Any]:
         if not self.model:
-             return {
-                "action": "MANUAL_INVESTIGATION",
-                "confidence": 0.0,
-                "reasoning": "Gemini API key not configured.",
-                "steps": ["Check backend configuration"]
-            }
+            return self._unconfigured_plan()
+
+        cache_key = plan_fingerprint(incident, history, correlations)
+        cached = self.plan_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        sections = self._plan_sections(incident, history, correlations)
+        if self.plan_batcher:
+            plan = await self.plan_batcher.plan(sections)
+        else:
+            plan = await self._generate_single_plan(sections)
+        
+        if plan.get("action") != "ERROR_GENERATING_PLAN" and not plan.get("degraded"):
+            self.plan_cache.put(cache_key, plan)
+        return plan
+
+    async def _generate_plan_stream(self, incident: List[Dict[str, Any]], history: List[Dict[str, Any]], correlations: List[Dict[str, Any]]) -> AsyncIterator[Any]:
+        """
+        Like _generate_plan, but yields the model's text chunks as they arrive
+        and then the parsed plan dict. Cached (or unconfigured) plans are
+        yielded directly; streamed requests bypass the batcher.
+        """
+        if not self.model:
+            yield self._unconfigured_plan()
+            return
+
+        cache_key = plan_fingerprint(incident, history, correlations)
+        cached = self.plan_cache.get(cache_key)
+        if cached is not None:
+            yield dict(cached, cached=True)
+            return
+
+        prompt = self._plan_prompt(self._plan_sections(incident, history, correlations))
+        chunks = []
+        try:
+            async for chunk in self.llm_guard.stream(lambda: self.model.generate_content_async(prompt, stream=True)):
+                chunks.append(chunk.text)
+                yield chunk.text
+            plan = json.loads(strip_code_fence("".join(chunks)))
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            print(f"Gemini unavailable, degrading to manual investigation: {e!r}")
+            plan = self._degraded_plan(e)
+        except Exception as e:
+            print(f"Gemini generation failed: {e}")
+            plan = self._plan_error(e)
+        else:
+            self.plan_cache.put(cache_key, plan)
+        yield plan
 
-        prompt = f"""
+    async def _generate_single_plan(self, sections: Dict[str, str]) -> Dict[str, Any]:
+        """One Gemini call for one incident."""
+        try:
+            text = await self._call_model(self._plan_prompt(sections))
+            return json.loads(strip_code_fence(text))
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            print(f"Gemini unavailable, degrading to manual investigation: {e!r}")
+            return self._degraded_plan(e)
+        except Exception as e:
+            print(f"Gemini generation failed: {e}")
+            return self._plan_error(e)
+
+    @staticmethod
+    def _plan_sections(incident: List[Dict[str, Any]], history: List[Dict[str, Any]], correlations: List[Dict[str, Any]]) -> Dict[str, str]:
+        return {
+            "Current Anomalies": json.dumps(incident),
+            "Historical Incidents": json.dumps(history),
+            "Correlations": json.dumps(correlations)
+        }
+
+    @staticmethod
+    def _plan_prompt(sections: Dict[str, str]) -> str:
+        return f"""
         You are a Site Reliability Engineer Agent.
         
         Context:
-        1. Current Anomalies: {json.dumps(incident)}
-        2. Historical Incidents: {json.dumps(history)}
-        3. Correlations: {json.dumps(correlations)}
+        1. Current Anomalies: {sections["Current Anomalies"]}
+        2. Historical Incidents: {sections["Historical Incidents"]}
+        3. Correlations: {sections["Correlations"]}
         
         Task:
         Analyze the situation and recommend a remediation plan.
@@ -327,23 +501,45 @@ class GreenStickAgent:
             "steps": ["step 1", "step 2"]
         }}
         """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            if text.startswith("```json"):
-                text = text[7:-3]
-            elif text.startswith("```"):
-                text = text[3:-3]
-            return json.loads(text)
-        except Exception as e:
-            print(f"Gemini generation failed: {e}")
-            return {
-                "action": "ERROR_GENERATING_PLAN",
-                "confidence": 0.0,
-                "reasoning": f"LLM Error: {str(e)}",
-                "steps": ["Manual intervention required"]
-            }
+
+    @staticmethod
+    def _unconfigured_plan() -> Dict[str, Any]:
+        return {
+            "action": "MANUAL_INVESTIGATION",
+            "confidence": 0.0,
+            "reasoning": "Gemini API key not configured.",
+            "steps": ["Check backend configuration"]
+        }
+
+    @staticmethod
+    def _plan_error(error: Exception) -> Dict[str, Any]:
+        return {
+            "action": "ERROR_GENERATING_PLAN",
+            "confidence": 0.0,
+            "reasoning": f"LLM Error: {str(error)}",
+            "steps": ["Manual intervention required"]
+        }
+
+    def _degraded_plan(self, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, CircuitOpenError):
+            reason = "circuit breaker open after repeated failures"
+        else:
+            reason = f"no response within {self.llm_guard.deadline:g}s"
+        return {
+            "action": "MANUAL_INVESTIGATION",
+            "confidence": 0.0,
+            "reasoning": f"Gemini unavailable ({reason}); manual investigation required.",
+            "steps": ["Review the detected anomalies and correlations", "Check Gemini API status"],
+            "degraded": True
+        }
+
+    async def _call_model(self, prompt: str) -> str:
+        """One model call through the deadline / breaker / hedging guard."""
+        return await self.llm_guard.call(lambda: self._model_text(prompt))
+
+    async def _model_text(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
 
     async def _execute_action(self, plan: Dict[str, Any]) -> Dict[str, Any]:
         """
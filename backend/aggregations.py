@@ -0,0 +1,243 @@
+"""
+Aggregation Detector - Server-side variant of the scanner's detection passes.
+
+Instead of pulling raw documents, one search request (size 0) asks
+Elasticsearch for compact buckets:
+  - terms on service, with an ERROR filter + top_hits samples (error spikes)
+  - a composite (service, 1-minute) aggregation (baseline counts), paged with
+    after_key in AGG_MINUTES_PAGE buckets so long ranges never hit
+    search.max_buckets; follow-up pages request only this aggregation
+  - categorize_text on ERROR messages + top_hits (repeated failures)
+  - a filters aggregation with one match_phrase per keyword rule (critical keywords)
+Python only turns those buckets into the same anomaly dicts BatchDetector
+produces, so transfer and CPU per scan stay flat as log volume grows.
+
+Keyword rules match as phrases on the analyzed `message` field (whole
+tokens rather than arbitrary substrings); regex rules are not pushed down.
+
+The range is on ingest time (see bootstrap.ingest_time_range) and the request
+also returns the newest ingest time it covered, which becomes the scanner's
+watermark.
+"""
+from typing import Dict, Any, List, Optional, Tuple, Union
+from detector import BatchDetector
+from bootstrap import SCAN_TIME, SCAN_TIME_FIELD, ingest_time_range
+
+AGG_MAX_SERVICES = 500
+AGG_MAX_PATTERNS = 100
+AGG_SAMPLES = 3
+AGG_MINUTES_PAGE = 1000  # composite (service, minute) buckets per request
+AGG_MAX_MINUTE_PAGES = 100  # per scan; minutes beyond this are left out of the baselines
+
+
+class AggregationDetector:
+    """Builds the detection aggregation request and interprets its response."""
+
+    def __init__(self, detector: BatchDetector):
+        self.detector = detector
+
+    async def run(self, es_client, index: str, since_ms: int,
+                  until: Union[int, str]) -> Tuple[List[Dict[str, Any]], int, Optional[int]]:
+        """
+        Search (since_ms, until], page the minute counts, and detect().
+        Returns (anomalies, logs covered, newest ingest time covered or None).
+        """
+        response = await es_client.search(index=index, ignore_unavailable=True, body=self.build_request(since_ms, until))
+        minutes = response.get("aggregations", {}).get("minutes", {})
+        buckets = list(minutes.get("buckets", []))
+        page, after_key = buckets, minutes.get("after_key")
+        pages = 1
+        while after_key and len(page) >= AGG_MINUTES_PAGE:
+            if pages >= AGG_MAX_MINUTE_PAGES:
+                print(f"[Aggregations] Stopped after {pages} pages of minute counts; the rest is not in the baselines")
+                break
+            follow_up = await es_client.search(
+                index=index, ignore_unavailable=True, body=self.build_request(since_ms, until, after_key)
+            )
+            minutes = follow_up.get("aggregations", {}).get("minutes", {})
+            page, after_key = minutes.get("buckets", []), minutes.get("after_key")
+            buckets.extend(page)
+            pages += 1
+        anomalies, logs_scanned = self.detect(response, buckets)
+        newest = response.get("aggregations", {}).get("newest", {}).get("value")
+        return anomalies, logs_scanned, None if newest is None else int(newest)
+
+    def build_request(self, since_ms: int, until: Union[int, str],
+                      minutes_after: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Search body covering logs ingested in (since_ms, until]; `until` may
+        be date math such as "now-5000ms". With minutes_after, only the next
+        page of the minute counts.
+        """
+        query = ingest_time_range({"gt": since_ms, "lte": until})
+        error_filter = {"term": {"level": "ERROR"}}
+        minutes: Dict[str, Any] = {
+            "composite": {
+                "size": AGG_MINUTES_PAGE,
+                # Sorted by service, then minute: the order update_counts() expects
+                "sources": [
+                    {"service": {"terms": {"field": "service", "missing_bucket": True}}},
+                    {"minute": {"date_histogram": {"field": "@timestamp", "fixed_interval": "1m"}}}
+                ]
+            },
+            "aggs": {"errors": {"filter": error_filter}}
+        }
+        if minutes_after is not None:
+            minutes["composite"]["after"] = minutes_after
+            return {"size": 0, "track_total_hits": False, "query": query, "aggs": {"minutes": minutes}}
+
+        samples = {
+            "top_hits": {"size": AGG_SAMPLES, "sort": [{"@timestamp": {"order": "asc"}}]}
+        }
+
+        keyword_filters = {
+            str(index): {"match_phrase": {"message": rule.pattern}}
+            for index, rule in enumerate(self.detector.rules.rules)
+            if rule.kind == "keyword"
+        }
+
+        aggs: Dict[str, Any] = {
+            "services": {
+                "terms": {"field": "service", "size": AGG_MAX_SERVICES, "missing": "unknown"},
+                "aggs": {
+                    "errors": {"filter": error_filter, "aggs": {"samples": samples}}
+                }
+            },
+            "minutes": minutes,
+            "newest": {"max": {"field": SCAN_TIME_FIELD}},
+            "repeated": {
+                "filter": error_filter,
+                "aggs": {
+                    "patterns": {
+                        "categorize_text": {
+                            "field": "message",
+                            "size": AGG_MAX_PATTERNS,
+                            "min_doc_count": self.detector.repeat_failure_threshold
+                        },
+                        "aggs": {"samples": samples}
+                    }
+                }
+            }
+        }
+        if keyword_filters:
+            aggs["critical"] = {"filters": {"filters": keyword_filters}, "aggs": {"samples": samples}}
+
+        return {
+            "size": 0,
+            "track_total_hits": True,
+            "query": query,
+            "runtime_mappings": SCAN_TIME,
+            "aggs": aggs
+        }
+
+    def detect(self, response: Dict[str, Any],
+               minute_buckets: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Return (anomalies, number of logs covered) for a build_request()
+        response; minute_buckets are all pages of its minute counts (by
+        default the response's own page).
+        """
+        detector = self.detector
+        aggregations = response.get("aggregations", {})
+        logs_scanned = response.get("hits", {}).get("total", {}).get("value", 0)
+        candidates: List[Dict[str, Any]] = []
+
+        # 1. Error spikes (baseline deviation once warmed up, fixed thresholds before)
+        service_buckets = aggregations.get("services", {}).get("buckets", [])
+        if minute_buckets is None:
+            minute_buckets = aggregations.get("minutes", {}).get("buckets", [])
+        deviations = {}
+        if detector.baseline is not None:
+            deviations = detector.baseline.update_counts(
+                (
+                    "unknown" if minute["key"]["service"] is None else minute["key"]["service"],
+                    minute["key"]["minute"] // 60000,
+                    minute["errors"]["doc_count"],
+                    minute["doc_count"]
+                )
+                for minute in minute_buckets
+            )
+
+        total_errors = aggregations.get("repeated", {}).get("doc_count", 0)
+        spikes = []
+        for bucket in service_buckets:
+            service, count = bucket["key"], bucket["errors"]["doc_count"]
+            if count == 0:
+                continue
+            deviation = deviations.get(service)
+            if deviation and deviation["warmed_up"]:
+                if not deviation["anomalous"]:
+                    continue
+            elif not (total_errors >= detector.error_rate_threshold and count >= detector.repeat_failure_threshold):
+                continue
+
+            samples = _sample_sources(bucket["errors"])
+            anomaly = {
+                "type": "error_spike",
+                "service": service,
+                "error_count": count,
+                "trace_id": samples[0].get("trace_id", f"spike-{service}"),
+                "message": f"Error spike detected: {count} errors in {service}",
+                "samples": samples
+            }
+            if deviation and deviation["warmed_up"]:
+                anomaly["baseline"] = deviation
+            spikes.append(anomaly)
+        # First-appearance order, as in document mode
+        spikes.sort(key=lambda anomaly: anomaly["samples"][0].get("@timestamp", ""))
+        candidates.extend(spikes)
+
+        # 2. Critical keywords, one anomaly per rule
+        rules = detector.rules.rules
+        critical_buckets = aggregations.get("critical", {}).get("buckets", {})
+        for index in sorted(int(key) for key, bucket in critical_buckets.items() if bucket["doc_count"]):
+            bucket = critical_buckets[str(index)]
+            log = _sample_sources(bucket)[0]
+            keyword = rules[index].id
+            matched = detector.rules.match_ids(log.get("message", "") or "")
+            anomaly = {
+                "type": "critical_keyword",
+                "keyword": keyword,
+                "matched_rules": matched if keyword in matched else [keyword] + matched,
+                "service": log.get("service", "unknown"),
+                "trace_id": log.get("trace_id", f"critical-{keyword}"),
+                "message": f"Critical keyword '{keyword}' detected in {log.get('service', 'unknown')}",
+                "log": log,
+                "occurrences": bucket["doc_count"]
+            }
+            if detector.miner is not None:
+                anomaly["template_id"] = detector.miner.add(log.get("message", "") or "")
+            candidates.append(anomaly)
+
+        # 3. Repeated failures, one anomaly per message category
+        for bucket in aggregations.get("repeated", {}).get("patterns", {}).get("buckets", []):
+            samples = _sample_sources(bucket)
+            first_log, count = samples[0], bucket["doc_count"]
+            if count < detector.repeat_threshold(first_log.get("service", "unknown")):
+                continue
+            anomaly = {
+                "type": "repeated_failure",
+                "service": first_log.get("service", "unknown"),
+                "repeat_count": count,
+                "trace_id": first_log.get("trace_id", "repeated"),
+                "message": f"Repeated failure ({count}x): {bucket['key']}",
+                "logs": samples,
+                "template": bucket["key"]
+            }
+            if detector.miner is not None:
+                anomaly["template_id"] = detector.miner.add(first_log.get("message", "") or "")
+            candidates.append(anomaly)
+
+        # Deduplicate anomalies (same trace_id) - first occurrence wins
+        seen_traces = set()
+        anomalies = []
+        for anomaly in candidates:
+            if anomaly["trace_id"] not in seen_traces:
+                seen_traces.add(anomaly["trace_id"])
+                anomalies.append(anomaly)
+
+        return anomalies, logs_scanned
+
+
+def _sample_sources(bucket: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [hit["_source"] for hit in bucket.get("samples", {}).get("hits", {}).get("hits", [])]
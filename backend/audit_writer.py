@@ -0,0 +1,182 @@
+"""
+Audit Writer - Write-behind buffer for agent audit entries.
+
+Entries get a pre-generated id and are queued; a background task bulk-writes
+the queue (op type "create", so a retried item can never be written twice)
+once AUDIT_FLUSH_SIZE entries are waiting or AUDIT_FLUSH_INTERVAL_SECONDS
+have passed. Callers that need the entry to be durable and searchable before
+continuing pass wait=True; their batch is written with refresh="wait_for"
+and the call returns only after Elasticsearch acknowledged it. Failed items
+are retried up to AUDIT_MAX_RETRIES times, and close() stops the loop after
+its current write and flushes whatever is left on shutdown.
+
+An id is returned before its document exists. settle(id) waits for a queued
+or in-flight entry and refreshes the index if needed, so that a search or
+update by that id right afterwards finds it.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import asyncio
+import os
+import uuid
+from bootstrap import AUDIT_STREAM
+
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_MAX_RETRIES = 3
+AUDIT_UNREFRESHED_MAX = 10000  # ids written without a refresh that settle() still refreshes for
+
+
+class _Item:
+    __slots__ = ("id", "doc", "future", "attempts")
+
+    def __init__(self, doc_id: str, doc: Dict[str, Any], future: Optional[asyncio.Future]):
+        self.id = doc_id
+        self.doc = doc
+        self.future = future
+        self.attempts = 0
+
+
+class AuditWriter:
+    """Buffers audit documents and bulk-writes them in the background."""
+
+    def __init__(self, es_client, index: str = AUDIT_STREAM, flush_size: int = AUDIT_FLUSH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.es_client = es_client
+        self.index = index
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._buffer: List[_Item] = []
+        self._pending: Dict[str, _Item] = {}  # queued or in flight, by id
+        self._unrefreshed: "OrderedDict[str, None]" = OrderedDict()  # written, maybe not searchable yet
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.flushes = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "flushes": self.flushes
+        }
+
+    async def write(self, doc: Dict[str, Any], wait: bool = False) -> str:
+        """
+        Queue an audit document and return its id. With wait=True, return only
+        once the document is written and searchable (raises if it could not be).
+        """
+        self._ensure_running()
+        item = _Item(uuid.uuid4().hex, doc, asyncio.get_running_loop().create_future() if wait else None)
+        self._buffer.append(item)
+        self._pending[item.id] = item
+        if wait or len(self._buffer) >= self.flush_size:
+            self._wake.set()
+        if item.future is not None:
+            await item.future
+        return item.id
+
+    async def settle(self, doc_id: str):
+        """
+        Wait until the entry with this id, if it was queued here, is written
+        and searchable. Returns quietly if the entry could not be written.
+        """
+        item = self._pending.get(doc_id)
+        if item is not None:
+            if item.future is None:
+                item.future = asyncio.get_running_loop().create_future()
+            self._ensure_running()
+            self._wake.set()
+            try:
+                await item.future
+            except RuntimeError:
+                return
+        if doc_id in self._unrefreshed:
+            await self.es_client.indices.refresh(index=self.index)
+            self._unrefreshed.clear()
+
+    async def close(self):
+        """Stop the background loop after its current write and flush everything still buffered."""
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        while self._buffer:
+            await self.flush()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._buffer:
+                await self.flush()
+
+    async def flush(self):
+        """Bulk-write the current buffer; failed items go back on it for a retry."""
+        batch, self._buffer = self._buffer[:self.flush_size], self._buffer[self.flush_size:]
+        if not batch:
+            return
+        self.flushes += 1
+
+        operations: List[Dict[str, Any]] = []
+        for item in batch:
+            operations.append({"create": {"_index": self.index, "_id": item.id}})
+            operations.append(item.doc)
+        waiting = any(item.future is not None for item in batch)
+
+        try:
+            response = await self.es_client.bulk(
+                operations=operations, refresh="wait_for" if waiting else False
+            )
+            results = [entry.get("create", {}) for entry in response.get("items", [])]
+        except asyncio.CancelledError:
+            # Not written as far as we know; "create" makes a later retry safe
+            self._buffer[:0] = batch
+            raise
+        except Exception as e:
+            print(f"[AuditWriter] Bulk write of {len(batch)} entries failed: {e}")
+            results = [{"error": str(e)}] * len(batch)
+
+        if waiting:
+            self._unrefreshed.clear()  # refresh="wait_for" made earlier writes searchable too
+
+        for item, result in zip(batch, results):
+            # 409: created by an earlier attempt whose response was lost
+            if "error" not in result or result.get("status") == 409:
+                self.written += 1
+                self._pending.pop(item.id, None)
+                if not waiting:
+                    self._unrefreshed[item.id] = None
+                    if len(self._unrefreshed) > AUDIT_UNREFRESHED_MAX:
+                        self._unrefreshed.popitem(last=False)
+                if item.future is not None and not item.future.done():
+                    item.future.set_result(item.id)
+                continue
+
+            item.attempts += 1
+            if item.attempts <= AUDIT_MAX_RETRIES:
+                self.retries += 1
+                self._buffer.append(item)
+            else:
+                self.failed += 1
+                self._pending.pop(item.id, None)
+                print(f"[AuditWriter] Dropping audit entry {item.id} after {item.attempts} attempts: {result['error']}")
+                if item.future is not None and not item.future.done():
+                    item.future.set_exception(RuntimeError(f"Audit write failed: {result['error']}"))
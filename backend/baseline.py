@@ -0,0 +1,231 @@
+"""
+Service Baselines - Streaming per-service error statistics for the scanner.
+
+Each service keeps O(1)-update state: an EWMA mean and variance of its
+per-minute error rate (errors / logs), an EWMA of its per-minute log volume,
+and fixed-size ring buffers of recent per-minute error/total counts (for a
+rolling quantile of the rate, computed once per change to the closed minutes
+and cached). Judging the rate rather than the count keeps traffic spikes
+from looking like error spikes. Minutes without logs say nothing about the
+rate and are not folded, so a service only warms up on minutes it actually
+logged. Counts for minutes more than BASELINE_MAX_FUTURE_MINUTES ahead of
+the wall clock are rejected, so a bad timestamp cannot move a service's
+window into the future.
+
+State is updated incrementally from each scan batch and never recomputed
+from history; the number of tracked services is capped with LRU eviction,
+so memory stays bounded regardless of log volume.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+import math
+import os
+import time
+import numpy as np
+
+BASELINE_WINDOW_MINUTES = 60  # ring buffer length (rolling quantile window)
+BASELINE_ALPHA = float(os.getenv("BASELINE_ALPHA", "0.1"))  # EWMA smoothing factor
+BASELINE_Z_THRESHOLD = float(os.getenv("BASELINE_Z_THRESHOLD", "3.0"))  # std devs above expected
+BASELINE_QUANTILE = 0.95  # the error rate must also exceed this rolling quantile
+BASELINE_WARMUP_MINUTES = int(os.getenv("BASELINE_WARMUP_MINUTES", "15"))  # before this, fixed thresholds apply
+BASELINE_MIN_ERRORS = 3  # never flag a minute with fewer errors than this
+BASELINE_MIN_STD = 0.02  # floor for the error-rate std dev so steady services don't flag on noise
+BASELINE_MAX_FUTURE_MINUTES = 5  # clock skew tolerated before a minute is rejected
+BASELINE_MAX_SERVICES = 1000
+
+
+class ServiceBaseline:
+    """Streaming error-rate statistics for one service, bucketed by minute."""
+
+    __slots__ = ("window", "errors", "totals", "current_minute", "mean", "var", "volume", "minutes_seen", "_quantile")
+
+    def __init__(self, window: int = BASELINE_WINDOW_MINUTES):
+        self.window = window
+        self.errors = np.zeros(window, dtype=np.int64)
+        self.totals = np.zeros(window, dtype=np.int64)
+        self.current_minute: Optional[int] = None  # open (not yet folded) minute
+        self.mean = 0.0  # EWMA error rate
+        self.var = 0.0
+        self.volume = 0.0  # EWMA logs per minute
+        self.minutes_seen = 0  # closed minutes with logs folded into the EWMA
+        self._quantile: Optional[float] = None  # BASELINE_QUANTILE of the closed minutes' rates, until they change
+
+    @property
+    def std(self) -> float:
+        return max(math.sqrt(self.var), BASELINE_MIN_STD)
+
+    @property
+    def warmed_up(self) -> bool:
+        return self.minutes_seen >= BASELINE_WARMUP_MINUTES
+
+    def observe(self, minute: int, errors: int, total: int) -> bool:
+        """
+        Add counts for an epoch minute. Minutes after the open one close it
+        (folding it into the EWMA). Late minutes still in the ring only update
+        the ring. Returns False if the minute was too old.
+        """
+        if self.current_minute is None:
+            self.current_minute = minute
+        elif minute > self.current_minute:
+            self._advance(minute)
+        elif minute <= self.current_minute - self.window:
+            return False
+        elif minute < self.current_minute:
+            self._quantile = None  # a late count changes a closed minute
+
+        slot = minute % self.window
+        self.errors[slot] += errors
+        self.totals[slot] += total
+        return True
+
+    def _advance(self, minute: int):
+        self._quantile = None
+        slot = self.current_minute % self.window
+        if self.totals[slot]:
+            self._fold(float(self.errors[slot] / self.totals[slot]), float(self.totals[slot]))
+
+        gap = minute - self.current_minute - 1
+        if gap + 1 >= self.window:
+            self.errors[:] = 0
+            self.totals[:] = 0
+        else:
+            for m in range(self.current_minute + 1, minute + 1):
+                self.errors[m % self.window] = 0
+                self.totals[m % self.window] = 0
+        self.current_minute = minute
+
+    def _fold(self, rate: float, volume: float):
+        if self.minutes_seen == 0:
+            # Seed with the first observation instead of decaying up from zero
+            self.mean = rate
+            self.volume = volume
+            self.minutes_seen = 1
+            return
+        diff = rate - self.mean
+        increment = BASELINE_ALPHA * diff
+        self.mean += increment
+        self.var = (1 - BASELINE_ALPHA) * (self.var + diff * increment)
+        self.volume += BASELINE_ALPHA * (volume - self.volume)
+        self.minutes_seen += 1
+
+    def quantile(self, q: float = BASELINE_QUANTILE) -> float:
+        """Rolling quantile of the per-minute error rate over the closed minutes with logs in the ring."""
+        cached = q == BASELINE_QUANTILE
+        if cached and self._quantile is not None:
+            return self._quantile
+        if self.current_minute is None:
+            return 0.0
+        slots = (self.current_minute - 1 - np.arange(self.window - 1)) % self.window
+        totals = self.totals[slots]
+        logged = totals > 0
+        value = float(np.quantile(self.errors[slots][logged] / totals[logged], q)) if logged.any() else 0.0
+        if cached:
+            self._quantile = value
+        return value
+
+    def evaluate(self, minute: int) -> Dict[str, Any]:
+        """Score a minute's error rate against the baseline."""
+        slot = minute % self.window
+        errors, total = int(self.errors[slot]), int(self.totals[slot])
+        rate = errors / total if total else 0.0
+        zscore = (rate - self.mean) / self.std
+        quantile = self.quantile()
+        return {
+            "errors": errors,
+            "total": total,
+            "rate": round(rate, 4),
+            "expected": round(self.mean, 4),
+            "std": round(self.std, 4),
+            "zscore": round(zscore, 2),
+            "quantile": round(quantile, 4),
+            "warmed_up": self.warmed_up,
+            "anomalous": (
+                self.warmed_up
+                and errors >= BASELINE_MIN_ERRORS
+                and zscore >= BASELINE_Z_THRESHOLD
+                and rate > quantile
+            )
+        }
+
+    def repeat_threshold(self, floor: int) -> int:
+        """Repeated-failure threshold: errors expected in a normal minute at normal volume, plus margin."""
+        if not self.warmed_up:
+            return floor
+        return max(floor, math.ceil((self.mean + BASELINE_Z_THRESHOLD * self.std) * self.volume))
+
+
+class BaselineModel:
+    """Per-service baselines with LRU eviction past BASELINE_MAX_SERVICES."""
+
+    def __init__(self, max_services: int = BASELINE_MAX_SERVICES):
+        self.max_services = max_services
+        self.services: "OrderedDict[Any, ServiceBaseline]" = OrderedDict()
+
+    def get(self, service: Any) -> Optional[ServiceBaseline]:
+        return self.services.get(service)
+
+    def _baseline(self, service: Any) -> ServiceBaseline:
+        baseline = self.services.get(service)
+        if baseline is None:
+            baseline = self.services[service] = ServiceBaseline()
+            if len(self.services) > self.max_services:
+                self.services.popitem(last=False)
+        else:
+            self.services.move_to_end(service)
+        return baseline
+
+    def update(self, batch) -> Dict[Any, Dict[str, Any]]:
+        """
+        Fold a LogBatch into the baselines and return, per service with errors
+        in the batch, the evaluation of its worst minute in this batch.
+        """
+        if batch.size == 0:
+            return {}
+
+        timestamps = batch.timestamps
+        valid = ~np.isnat(timestamps)
+        if not valid.any():
+            return {}
+
+        minutes = timestamps[valid].astype("datetime64[m]").astype(np.int64)
+        services = batch.service_codes[valid]
+        is_error = batch.level_mask("ERROR")[valid]
+
+        # Group rows by (service, minute); keys sort by service, then minute
+        base = minutes.min()
+        span = int(minutes.max() - base) + 1
+        keys, inverse = np.unique(services * span + (minutes - base), return_inverse=True)
+        totals = np.bincount(inverse)
+        errors = np.bincount(inverse, weights=is_error).astype(np.int64)
+
+        return self.update_counts(
+            (batch.services[key // span], int(base) + key % span, error_count, total_count)
+            for key, error_count, total_count in zip(keys.tolist(), errors.tolist(), totals.tolist())
+        )
+
+    def update_counts(self, counts: Iterable[Tuple[Any, int, int, int]]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Fold pre-aggregated (service, epoch minute, errors, total) counts into
+        the baselines; minutes must be ascending per service. Returns the
+        evaluation of each service's worst minute that had errors.
+        """
+        latest = int(time.time() // 60) + BASELINE_MAX_FUTURE_MINUTES
+        deviations: Dict[Any, Dict[str, Any]] = {}
+        for service, minute, error_count, total_count in counts:
+            if minute > latest:
+                continue
+            baseline = self._baseline(service)
+            if not baseline.observe(minute, error_count, total_count) or error_count == 0:
+                continue
+            evaluation = baseline.evaluate(minute)
+            worst = deviations.get(service)
+            if worst is None or evaluation["zscore"] > worst["zscore"]:
+                deviations[service] = evaluation
+
+        return deviations
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "services_tracked": len(self.services),
+            "warmed_up": sum(1 for baseline in self.services.values() if baseline.warmed_up)
+        }
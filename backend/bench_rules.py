@@ -0,0 +1,78 @@
+"""
+Benchmark: compiled RuleEngine vs. the legacy per-keyword substring loop.
+
+Usage: python bench_rules.py [num_messages]
+"""
+import random
+import sys
+import time
+from rules import RuleEngine, Rule
+from scanner import CRITICAL_KEYWORDS, CRITICAL_RULES_FILE
+
+MESSAGES = [
+    "Connection timeout after 30000ms",
+    "Database connection pool exhausted",
+    "Memory allocation failed: OOM killer invoked",
+    "SSL certificate verification failed",
+    "Rate limit exceeded: 429 Too Many Requests",
+    "Kafka consumer lag critical: 50000 messages",
+    "Redis cluster node unreachable",
+    "gRPC deadline exceeded",
+    "Health check passed",
+    "Scheduled job completed",
+    "Response latency above threshold: 500ms",
+    "java.lang.OutOfMemoryError: Java heap space",
+]
+
+
+def legacy_match(messages, keywords):
+    """The scanner's original nested loop (reports the first keyword per message)."""
+    matches = 0
+    for message in messages:
+        for keyword in keywords:
+            if keyword.lower() in message.lower():
+                matches += 1
+                break
+    return matches
+
+
+def engine_match(messages, engine):
+    return sum(1 for message in messages if engine.match(message))
+
+
+def synthetic_keywords(count):
+    return CRITICAL_KEYWORDS + [f"signature-{i:04d} failure" for i in range(count - len(CRITICAL_KEYWORDS))]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    messages = [f"{random.choice(MESSAGES)} [req={random.randint(0, 10**6)}]" for _ in range(num_messages)]
+
+    print("=" * 60)
+    print(f"Critical rule matching benchmark ({num_messages} messages)")
+    print("=" * 60)
+    print(f"{'rules':>8} {'legacy loop':>14} {'RuleEngine':>14} {'speedup':>9}")
+
+    for count in (len(CRITICAL_KEYWORDS), 50, 200, 500):
+        keywords = synthetic_keywords(count)
+        engine = RuleEngine([Rule(id=k, pattern=k) for k in keywords])
+        legacy_hits, legacy_time = timed(legacy_match, messages, keywords)
+        engine_hits, engine_time = timed(engine_match, messages, engine)
+        assert legacy_hits == engine_hits, "matchers disagree"
+        print(f"{count:>8} {legacy_time:>13.3f}s {engine_time:>13.3f}s {legacy_time / engine_time:>8.1f}x")
+
+    engine = RuleEngine.from_file(CRITICAL_RULES_FILE)
+    hits, elapsed = timed(engine_match, messages, engine)
+    print(f"\n{CRITICAL_RULES_FILE}: {len(engine.rules)} rules, {hits} matching messages in {elapsed:.3f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Index Bootstrap - Installs GreenStick's Elasticsearch layout once at startup.
+
+greenstick-logs and greenstick-audit are data streams backed by index
+templates and an ILM policy that rolls the write index over by age/size and
+deletes backing indices past their retention. Time-bounded queries (the
+scanner's ingest-time ranges, ES|QL `NOW() - ...` filters) then skip whole
+backing indices outside the range during the can-match phase. On deployments
+without ILM (serverless), the templates carry a data stream lifecycle with
+the same retention instead. greenstick-incidents stays a regular index.
+
+Every log document gets an ingest timestamp (event.ingested) from the
+greenstick-logs-ingested pipeline, installed as the stream's final pipeline.
+The scanner pages by that time rather than @timestamp, so documents that
+arrive late or carry back-dated timestamps are still scanned. Documents
+without it (indexed before the pipeline existed, or by a shipper that
+bypasses it) fall back to @timestamp: ingest_time_range() selects both, and
+the SCAN_TIME runtime field gives one sortable time for either.
+
+All mappings live here; request handlers no longer check or create indices.
+An existing plain index with a stream's name is left as is (it keeps
+working, just without rollover) and reported as "legacy_index".
+"""
+from typing import Dict, Any
+import os
+
+LOGS_STREAM = "greenstick-logs"
+AUDIT_STREAM = "greenstick-audit"
+INCIDENTS_INDEX = "greenstick-incidents"
+
+LOGS_ROLLOVER_MAX_AGE = os.getenv("LOGS_ROLLOVER_MAX_AGE", "1d")
+LOGS_RETENTION = os.getenv("LOGS_RETENTION", "30d")
+AUDIT_ROLLOVER_MAX_AGE = os.getenv("AUDIT_ROLLOVER_MAX_AGE", "7d")
+AUDIT_RETENTION = os.getenv("AUDIT_RETENTION", "365d")
+ROLLOVER_MAX_PRIMARY_SHARD_SIZE = "50gb"
+TEMPLATE_PRIORITY = 200  # above the built-in logs-*-* templates
+LOGS_PIPELINE = f"{LOGS_STREAM}-ingested"
+INGESTED_FIELD = "event.ingested"
+SCAN_TIME_FIELD = "scan_time"
+SCAN_TIME = {
+    SCAN_TIME_FIELD: {
+        "type": "date",
+        "script": {
+            "source": (
+                f"if (doc.containsKey('{INGESTED_FIELD}') && doc['{INGESTED_FIELD}'].size() > 0) "
+                f"{{ emit(doc['{INGESTED_FIELD}'].value.toInstant().toEpochMilli()); }} "
+                "else if (doc['@timestamp'].size() > 0) "
+                "{ emit(doc['@timestamp'].value.toInstant().toEpochMilli()); }"
+            )
+        }
+    }
+}
+
+LOGS_MAPPINGS = {
+    "properties": {
+        "@timestamp": {"type": "date"},
+        "service": {"type": "keyword"},
+        "level": {"type": "keyword"},
+        "message": {"type": "text"},
+        "trace_id": {"type": "keyword"},
+        INGESTED_FIELD: {"type": "date"}
+    }
+}
+
+AUDIT_MAPPINGS = {
+    "properties": {
+        "@timestamp": {"type": "date"},
+        "trace_id": {"type": "keyword"},
+        "action_type": {"type": "keyword"},
+        "description": {"type": "text"},
+        "confidence": {"type": "float"},
+        "status": {"type": "keyword"},
+        "metadata": {"type": "object", "enabled": True}
+    }
+}
+
+INCIDENTS_MAPPINGS = {
+    "properties": {
+        "incident_id": {"type": "keyword"},
+        "description": {"type": "text"},
+        "root_cause": {"type": "text"},
+        "resolution": {"type": "text"},
+        "severity": {"type": "keyword"},
+        "created_at": {"type": "date"},
+        "resolved_at": {"type": "date"}
+    }
+}
+
+STREAMS = [
+    (LOGS_STREAM, LOGS_MAPPINGS, LOGS_ROLLOVER_MAX_AGE, LOGS_RETENTION, {"index.final_pipeline": LOGS_PIPELINE}),
+    (AUDIT_STREAM, AUDIT_MAPPINGS, AUDIT_ROLLOVER_MAX_AGE, AUDIT_RETENTION, {}),
+]
+
+
+def ingest_time_range(bounds: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Query for logs whose ingest time is within `bounds` (range parameters in
+    epoch ms or date math); logs without event.ingested match on @timestamp.
+    """
+    bounds = dict(bounds, format="epoch_millis")
+    return {
+        "bool": {
+            "should": [
+                {"range": {INGESTED_FIELD: bounds}},
+                {
+                    "bool": {
+                        "must_not": {"exists": {"field": INGESTED_FIELD}},
+                        "filter": {"range": {"@timestamp": bounds}}
+                    }
+                }
+            ],
+            "minimum_should_match": 1
+        }
+    }
+
+
+def has_ingest_time(doc: Dict[str, Any]) -> bool:
+    """Whether a log _source went through the ingest pipeline."""
+    event = doc.get("event")
+    return doc.get(INGESTED_FIELD) is not None or (isinstance(event, dict) and event.get("ingested") is not None)
+
+
+async def bootstrap_indices(es_client) -> Dict[str, str]:
+    """
+    Install policies, templates, data streams and the incidents index.
+    Idempotent. Returns a status per target; failures are reported, not raised.
+    """
+    status: Dict[str, str] = {}
+    try:
+        await es_client.ingest.put_pipeline(
+            id=LOGS_PIPELINE,
+            description="Stamp greenstick-logs documents with their ingest time",
+            processors=[{"set": {"field": INGESTED_FIELD, "value": "{{{_ingest.timestamp}}}"}}]
+        )
+        status[LOGS_PIPELINE] = "installed"
+    except Exception as e:
+        status[LOGS_PIPELINE] = f"error: {e}"
+
+    for name, mappings, max_age, retention, settings in STREAMS:
+        try:
+            status[name] = await _bootstrap_stream(es_client, name, mappings, max_age, retention, settings)
+        except Exception as e:
+            status[name] = f"error: {e}"
+
+    try:
+        if await es_client.indices.exists(index=INCIDENTS_INDEX):
+            status[INCIDENTS_INDEX] = "exists"
+        else:
+            await es_client.indices.create(index=INCIDENTS_INDEX, mappings=INCIDENTS_MAPPINGS)
+            status[INCIDENTS_INDEX] = "created"
+    except Exception as e:
+        status[INCIDENTS_INDEX] = f"error: {e}"
+
+    for name, result in status.items():
+        print(f"[Bootstrap] {name}: {result}")
+    return status
+
+
+async def _bootstrap_stream(es_client, name: str, mappings: Dict[str, Any], max_age: str, retention: str,
+                            settings: Dict[str, Any]) -> str:
+    policy = f"{name}-policy"
+    template: Dict[str, Any] = {"mappings": mappings, "settings": dict(settings)}
+    try:
+        await es_client.ilm.put_lifecycle(name=policy, policy={
+            "phases": {
+                "hot": {
+                    "actions": {
+                        "rollover": {"max_age": max_age, "max_primary_shard_size": ROLLOVER_MAX_PRIMARY_SHARD_SIZE}
+                    }
+                },
+                "delete": {"min_age": retention, "actions": {"delete": {}}}
+            }
+        })
+        template["settings"]["index.lifecycle.name"] = policy
+    except Exception as e:
+        # No ILM (e.g. serverless): rollover is automatic, keep the retention
+        print(f"[Bootstrap] ILM unavailable for {name}, using data stream lifecycle: {e}")
+        template["lifecycle"] = {"data_retention": retention}
+
+    await es_client.indices.put_index_template(
+        name=f"{name}-template",
+        index_patterns=[f"{name}*"],
+        data_stream={},
+        priority=TEMPLATE_PRIORITY,
+        template=template
+    )
+
+    if not await es_client.indices.exists(index=name):
+        await es_client.indices.create_data_stream(name=name)
+        return "created"
+    if settings:
+        # Templates only apply to new backing indices; the current ones need it too
+        await es_client.indices.put_settings(index=name, settings=settings)
+    try:
+        await es_client.indices.get_data_stream(name=name)
+    except Exception:
+        return "legacy_index"
+    return "exists"
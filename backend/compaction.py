@@ -0,0 +1,109 @@
+"""
+Prompt Compaction - Shrinks the planner's context to a token budget.
+
+Before the incident, historical matches and correlations are embedded in the
+Gemini prompt:
+  - log lines are deduplicated by message template, keeping one example
+    message, a count and the first/last timestamps
+  - fields are trimmed to what the planner uses and long strings are cut
+  - logs (most frequent first), history (relevance order) and correlations
+    (largest count first) are admitted in that order while they fit in
+    PROMPT_TOKEN_BUDGET, as measured by a local token estimate
+"""
+from typing import Dict, Any, List, Tuple
+import json
+import os
+from templates import mask_message
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+PROMPT_MAX_FIELD_CHARS = 500
+
+LOG_FIELDS = ["service", "level", "message"]
+HISTORY_FIELDS = ["incident_id", "description", "root_cause", "resolution", "severity"]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _tokens(value: Any) -> int:
+    return estimate_tokens(json.dumps(value, default=str))
+
+
+def _trim(doc: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    trimmed = {}
+    for field in fields:
+        value = doc.get(field)
+        if value is None:
+            continue
+        if isinstance(value, str) and len(value) > PROMPT_MAX_FIELD_CHARS:
+            value = value[:PROMPT_MAX_FIELD_CHARS] + "..."
+        trimmed[field] = value
+    return trimmed
+
+
+def dedupe_logs(logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One entry per (service, level, template), most frequent first."""
+    groups: Dict[Tuple[Any, Any, str], Dict[str, Any]] = {}
+    for log in logs:
+        key = (log.get("service"), log.get("level"), mask_message(str(log.get("message", ""))))
+        group = groups.get(key)
+        timestamp = log.get("@timestamp")
+        if group is None:
+            group = groups[key] = _trim(log, LOG_FIELDS)
+            group["count"] = 0
+            if timestamp:
+                group["first_seen"] = group["last_seen"] = timestamp
+        group["count"] += 1
+        if timestamp:
+            # ISO-8601 strings order chronologically
+            group["first_seen"] = min(group.get("first_seen", timestamp), timestamp)
+            group["last_seen"] = max(group.get("last_seen", timestamp), timestamp)
+    # Stable sort keeps first-appearance order among equal counts
+    return sorted(groups.values(), key=lambda group: -group["count"])
+
+
+def _correlation_rank(row: Dict[str, Any]) -> float:
+    numbers = [value for value in row.values() if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    return -max(numbers) if numbers else 0.0
+
+
+def _fit(items: List[Dict[str, Any]], budget: int, keep_one: bool = False) -> Tuple[List[Dict[str, Any]], int]:
+    kept, used = [], 0
+    for item in items:
+        cost = _tokens(item) + 1
+        if used + cost > budget and not (keep_one and not kept):
+            break
+        kept.append(item)
+        used += cost
+    return kept, used
+
+
+def compact_context(incident: List[Dict[str, Any]], history: List[Dict[str, Any]],
+                    correlations: List[Dict[str, Any]], budget: int = PROMPT_TOKEN_BUDGET
+                    ) -> Tuple[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Return ((incident, history, correlations) compacted to the budget, stats).
+    At least one log group is always kept, even if it alone exceeds the budget.
+    """
+    tokens_before = _tokens(incident) + _tokens(history) + _tokens(correlations)
+
+    logs, used = _fit(dedupe_logs(incident), budget, keep_one=True)
+    kept_history, history_used = _fit([_trim(doc, HISTORY_FIELDS) for doc in history], budget - used)
+    used += history_used
+    kept_correlations, _ = _fit(sorted(correlations, key=_correlation_rank), budget - used)
+
+    tokens_after = _tokens(logs) + _tokens(kept_history) + _tokens(kept_correlations)
+    stats = {
+        "token_budget": budget,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "logs_before": len(incident),
+        "log_groups_after": len(logs),
+        "history_before": len(history),
+        "history_after": len(kept_history),
+        "correlations_before": len(correlations),
+        "correlations_after": len(kept_correlations)
+    }
+    return (logs, kept_history, kept_correlations), stats
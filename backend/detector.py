@@ -0,0 +1,331 @@
+"""
+Batch Anomaly Detector - Columnar, NumPy-based detection passes for the scanner.
+
+A window of logs is converted once into integer-coded columns (service,
+level, message key, message fingerprint) and the error-spike, critical-keyword,
+repeated-failure and dedup passes run as group-by / bincount operations over
+those arrays. Messages are factorized by their digit key (every digit read
+as 0, see rules.digit_key), so messages that differ only in ids, counts or
+durations share one code. Keyword matching and template mining then run once
+per distinct key instead of once per log; only keys that a rule with digits
+may match are matched message by message.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Callable
+import itertools
+import numpy as np
+from rules import RuleEngine, DIGIT_KEY, digit_key
+from baseline import BaselineModel
+from templates import TemplateMiner
+
+_KEY_SEPARATOR = "\x00"
+
+
+def factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """
+    Encode values as integer codes in order of first appearance.
+    Returns (codes, uniques) so that uniques[codes[i]] == values[i].
+    """
+    n = len(values)
+    table: Dict[Any, int] = {}
+    # setdefault keeps the row index of each value's first occurrence; those
+    # indexes are then remapped to dense codes (already in appearance order).
+    first_rows = np.fromiter(map(table.setdefault, values, itertools.count()), dtype=np.int64, count=n)
+    remap = np.empty(n, dtype=np.int64)
+    remap[np.fromiter(table.values(), dtype=np.int64, count=len(table))] = np.arange(len(table))
+    return remap[first_rows], list(table)
+
+
+class LogBatch:
+    """Columnar view over a window of log documents."""
+
+    def __init__(self, logs: List[Dict[str, Any]], miner: Optional[TemplateMiner] = None):
+        self.logs = logs
+        self.size = len(logs)
+
+        self.service_codes, self.services = factorize(_column(logs, "service", "unknown"))
+        self.level_codes, self.levels = factorize(_column(logs, "level"))
+        messages = _column(logs, "message", "")
+        self.message_key_codes, self.message_keys = factorize(_digit_keys(messages))
+
+        # Fingerprints are computed per distinct key, then broadcast to rows:
+        # mined template ids when a miner is given (a key masks to the same
+        # tokens as its messages), else the first 50 chars of the message.
+        if miner is not None:
+            fp_of_key, self.fingerprints = factorize([miner.add(key) for key in self.message_keys])
+            self.fingerprint_codes = fp_of_key[self.message_key_codes] if self.size else fp_of_key
+        else:
+            self.fingerprint_codes, self.fingerprints = _prefix_fingerprints(messages, self.message_keys, self.message_key_codes)
+
+        self._timestamps: Optional[np.ndarray] = None
+
+    def level_mask(self, level: str) -> np.ndarray:
+        """Boolean row mask for an exact level match."""
+        if level not in self.levels:
+            return np.zeros(self.size, dtype=bool)
+        return self.level_codes == self.levels.index(level)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Row timestamps as datetime64[ms] (parsed lazily, NaT when missing)."""
+        if self._timestamps is None:
+            raw = [(value or "NaT").rstrip("Z") for value in _column(self.logs, "@timestamp")]
+            try:
+                self._timestamps = np.array(raw, dtype="datetime64[ms]")
+            except ValueError:
+                self._timestamps = np.array([_parse_timestamp(ts) for ts in raw], dtype="datetime64[ms]")
+        return self._timestamps
+
+
+def _column(logs: List[Dict[str, Any]], field: str, default: Any = None) -> List[Any]:
+    # map() over dict.get keeps the per-row loop in C
+    return list(map(dict.get, logs, itertools.repeat(field), itertools.repeat(default)))
+
+
+def _digit_keys(messages: List[Any]) -> List[str]:
+    """digit_key of every message, translated as one joined string."""
+    messages = [message or "" for message in messages]
+    keys = _KEY_SEPARATOR.join(messages).translate(DIGIT_KEY).split(_KEY_SEPARATOR)
+    if len(keys) != len(messages):  # a message contained the separator
+        keys = [digit_key(message) for message in messages]
+    return keys
+
+
+def _prefix_fingerprints(messages: List[Any], keys: List[str], key_codes: np.ndarray,
+                         length: int = 50) -> Tuple[np.ndarray, List[str]]:
+    """
+    Codes for message[:length]. A key without a digit in its prefix shares it
+    with all its messages; only messages whose prefix has digits are sliced.
+    """
+    table: Dict[str, int] = {}
+    prefixes = [key[:length] for key in keys]
+    fp_of_key = np.fromiter(
+        (-1 if "0" in prefix else table.setdefault(prefix, len(table)) for prefix in prefixes),
+        dtype=np.int64,
+        count=len(prefixes)
+    )
+    codes = fp_of_key[key_codes] if len(key_codes) else np.zeros(0, dtype=np.int64)
+    raw_rows = np.flatnonzero(codes < 0)
+    for row in raw_rows.tolist():
+        prefix = (messages[row] or "")[:length]
+        codes[row] = table.setdefault(prefix, len(table))
+    return codes, list(table)
+
+
+def _parse_timestamp(value: str) -> np.datetime64:
+    try:
+        return np.datetime64(value, "ms")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def group_first_rows(codes: np.ndarray, rows: np.ndarray, min_count: int, samples: int = 3) -> List[Tuple[int, int, np.ndarray]]:
+    """
+    Group `rows` by `codes` (aligned arrays) and return, for every group with at
+    least `min_count` members, (code, count, first `samples` rows) ordered by the
+    group's first appearance.
+    """
+    if rows.size == 0:
+        return []
+
+    counts = np.bincount(codes)
+    order = np.argsort(codes, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    present, first_pos = np.unique(codes, return_index=True)
+    qualifying = counts[present] >= min_count
+    present, first_pos = present[qualifying], first_pos[qualifying]
+
+    groups = []
+    for code in present[np.argsort(first_pos, kind="stable")]:
+        start, count = starts[code], counts[code]
+        groups.append((int(code), int(count), rows[order[start:start + min(count, samples)]]))
+    return groups
+
+
+class BatchDetector:
+    """
+    Runs the scanner's detection passes over a LogBatch.
+    Output matches AnomalyScanner's error_spike / critical_keyword /
+    repeated_failure anomaly dicts, deduplicated by trace_id.
+
+    With a TemplateMiner, repeated failures are grouped by mined message
+    template instead of message prefix. With a BaselineModel, each batch also
+    updates the per-service baselines, and services whose baseline has warmed
+    up are judged by deviation from it instead of the fixed thresholds (which
+    still apply during warm-up).
+    """
+
+    def __init__(self, error_rate_threshold: int, repeat_failure_threshold: int, rules: RuleEngine,
+                 baseline: Optional[BaselineModel] = None, miner: Optional[TemplateMiner] = None):
+        self.error_rate_threshold = error_rate_threshold
+        self.repeat_failure_threshold = repeat_failure_threshold
+        self.rules = rules
+        self.baseline = baseline
+        self.miner = miner
+
+    def detect(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.detect_batch(LogBatch(logs, self.miner))
+
+    def detect_batch(self, batch: LogBatch) -> List[Dict[str, Any]]:
+        logs = batch.logs
+        candidates: List[Tuple[Any, Dict[str, Any]]] = []
+
+        error_rows = np.flatnonzero(batch.level_mask("ERROR"))
+        deviations = self.baseline.update(batch) if self.baseline else {}
+
+        # 1. Error Rate Spike Detection (per service)
+        fixed_threshold_hit = error_rows.size >= self.error_rate_threshold
+        for code, count, sample_rows in group_first_rows(batch.service_codes[error_rows], error_rows, 1):
+            service = batch.services[code]
+            deviation = deviations.get(service)
+            if deviation and deviation["warmed_up"]:
+                if not deviation["anomalous"]:
+                    continue
+            elif not (fixed_threshold_hit and count >= self.repeat_failure_threshold):
+                continue
+
+            samples = [logs[row] for row in sample_rows]
+            anomaly = {
+                "type": "error_spike",
+                "service": service,
+                "error_count": count,
+                "trace_id": samples[0].get("trace_id", f"spike-{service}"),
+                "message": f"Error spike detected: {count} errors in {service}",
+                "samples": samples
+            }
+            if deviation and deviation["warmed_up"]:
+                anomaly["baseline"] = deviation
+            candidates.append((anomaly["trace_id"], anomaly))
+
+        # 2. Critical Keyword Detection (matched once per distinct message key)
+        rule_ids = [rule.id for rule in self.rules.rules]
+        keyword_rows, keyword_ids, matched_rules = self._match_keywords(batch)
+        keyword_counts = None
+        if self.miner is not None and keyword_rows.size:
+            # One anomaly per (rule, template) rather than one per log line
+            keys = keyword_ids * len(batch.fingerprints) + batch.fingerprint_codes[keyword_rows]
+            _, first, keyword_counts = np.unique(keys, return_index=True, return_counts=True)
+            order = np.argsort(first)
+            first, keyword_counts = first[order], keyword_counts[order]
+            keyword_rows, keyword_ids = keyword_rows[first], keyword_ids[first]
+
+        # 3. Repeated Failures (same message fingerprint)
+        repeated = []
+        for code, count, sample_rows in group_first_rows(
+            batch.fingerprint_codes[error_rows], error_rows, self.repeat_failure_threshold
+        ):
+            first_log = logs[sample_rows[0]]
+            if count < self.repeat_threshold(first_log.get("service", "unknown")):
+                continue
+            repeated.append((first_log.get("trace_id", "repeated"), code, count, sample_rows))
+
+        # Deduplicate anomalies (same trace_id) - first occurrence wins.
+        # Trace ids are compared as integer codes; only the candidates' ids
+        # (and defaults like "spike-<service>") are coded, not the batch's.
+        trace_index: Dict[Any, int] = {}
+
+        def trace_code(tid: Any) -> int:
+            return trace_index.setdefault(tid, len(trace_index))
+
+        keyword_codes = np.fromiter(
+            (trace_code(logs[row].get("trace_id", f"critical-{rule_ids[rule]}"))
+             for row, rule in zip(keyword_rows.tolist(), keyword_ids.tolist())),
+            dtype=np.int64,
+            count=keyword_rows.size
+        )
+
+        all_codes = np.concatenate((
+            np.array([trace_code(tid) for tid, _ in candidates], dtype=np.int64),
+            keyword_codes,
+            np.array([trace_code(r[0]) for r in repeated], dtype=np.int64)
+        ))
+        if all_codes.size == 0:
+            return []
+        _, first_index = np.unique(all_codes, return_index=True)
+        keep = np.zeros(all_codes.size, dtype=bool)
+        keep[first_index] = True
+
+        anomalies = [anomaly for (_, anomaly), kept in zip(candidates, keep) if kept]
+
+        offset = len(candidates)
+        for i in np.flatnonzero(keep[offset:offset + keyword_rows.size]).tolist():
+            row = keyword_rows[i]
+            log = logs[row]
+            keyword = rule_ids[keyword_ids[i]]
+            anomaly = {
+                "type": "critical_keyword",
+                "keyword": keyword,
+                "matched_rules": [rule_ids[index] for index in matched_rules(row)],
+                "service": log.get("service", "unknown"),
+                "trace_id": log.get("trace_id", f"critical-{keyword}"),
+                "message": f"Critical keyword '{keyword}' detected in {log.get('service', 'unknown')}",
+                "log": log
+            }
+            if self.miner is not None:
+                anomaly["template_id"] = batch.fingerprints[batch.fingerprint_codes[row]]
+                anomaly["occurrences"] = int(keyword_counts[i])
+            anomalies.append(anomaly)
+
+        offset += keyword_rows.size
+        for (trace_id, code, count, sample_rows), kept in zip(repeated, keep[offset:]):
+            if not kept:
+                continue
+            first_log = logs[sample_rows[0]]
+            if self.miner is not None:
+                template_id = batch.fingerprints[code]
+                template = self.miner.template(template_id) or first_log.get("message", "")
+                summary = template
+            else:
+                summary = f"{batch.fingerprints[code]}..."
+            anomaly = {
+                "type": "repeated_failure",
+                "service": first_log.get("service", "unknown"),
+                "repeat_count": count,
+                "trace_id": trace_id,
+                "message": f"Repeated failure ({count}x): {summary}",
+                "logs": [logs[row] for row in sample_rows]
+            }
+            if self.miner is not None:
+                anomaly["template_id"] = template_id
+                anomaly["template"] = template
+            anomalies.append(anomaly)
+
+        return anomalies
+
+    def repeat_threshold(self, service: Any) -> int:
+        baseline = self.baseline.get(service) if self.baseline else None
+        if baseline is None:
+            return self.repeat_failure_threshold
+        return baseline.repeat_threshold(self.repeat_failure_threshold)
+
+    def _match_keywords(self, batch: LogBatch) -> Tuple[np.ndarray, np.ndarray, Callable[[int], List[int]]]:
+        """
+        Return (rows, first rule indexes, row -> all matching rule indexes) for
+        every log whose message matches a critical rule. Rules run once per
+        distinct message key, and message by message only for keys a rule with
+        digits may match; the highest-priority (first) rule names the anomaly.
+        """
+        key_matches = [self.rules.match_key(key) for key in batch.message_keys]
+        first_rule = np.fromiter(
+            (-2 if matches is None else matches[0] if matches else -1 for matches in key_matches),
+            dtype=np.int64,
+            count=len(key_matches)
+        )
+        per_row = first_rule[batch.message_key_codes]
+
+        row_matches: Dict[int, List[int]] = {}
+        by_message: Dict[str, List[int]] = {}
+        for row in np.flatnonzero(per_row == -2).tolist():
+            message = batch.logs[row].get("message", "") or ""
+            matches = by_message.get(message)
+            if matches is None:
+                matches = by_message[message] = self.rules.match(message)
+            row_matches[row] = matches
+            per_row[row] = matches[0] if matches else -1
+
+        def matched_rules(row: int) -> List[int]:
+            matches = row_matches.get(row)
+            return matches if matches is not None else key_matches[batch.message_key_codes[row]]
+
+        rows = np.flatnonzero(per_row >= 0)
+        return rows, per_row[rows], matched_rules
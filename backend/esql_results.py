@@ -0,0 +1,42 @@
+"""
+ES|QL Results - Row and columnar shapes of ES|QL query responses.
+
+The row shape (one dict per row) is the default everywhere. The columnar
+shape asks Elasticsearch for `columnar=true` and passes its column arrays
+through untouched:
+
+    {"columns": ["service", "count"], "types": ["keyword", "long"],
+     "values": [["api", "db"], [12, 3]], "row_count": 2}
+
+No per-row objects are built and each column name is sent once, which keeps
+large trend/correlation results small in memory and fast to serialize.
+"""
+from typing import Dict, Any, List, Union
+
+EsqlResult = Union[List[Dict[str, Any]], Dict[str, Any]]
+
+
+async def run_esql(es_client, query: str, columnar: bool = False) -> EsqlResult:
+    """Run an ES|QL query and return it in the row or columnar shape."""
+    if columnar:
+        resp = await es_client.esql.query(query=query, columnar=True)
+        return columnar_result(resp)
+    resp = await es_client.esql.query(query=query)
+    return row_result(resp)
+
+
+def row_result(resp) -> List[Dict[str, Any]]:
+    columns = [col['name'] for col in resp.get('columns', [])]
+    return [dict(zip(columns, row)) for row in resp.get('values', [])]
+
+
+def columnar_result(resp) -> Dict[str, Any]:
+    columns = resp.get('columns', [])
+    # An empty result may come back without any column arrays
+    values = resp.get('values') or [[] for _ in columns]
+    return {
+        "columns": [col['name'] for col in columns],
+        "types": [col.get('type') for col in columns],
+        "values": values,
+        "row_count": len(values[0]) if values else 0
+    }
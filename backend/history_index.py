@@ -0,0 +1,259 @@
+"""
+History Index - In-process similarity search over historical incidents.
+
+Each incident (description + root cause) is embedded as a hashed TF vector:
+words, word bigrams and character 4-grams are hashed into HISTORY_DIMENSIONS
+signed buckets, so paraphrases that share stems ("timeout" / "timed out",
+"pool exhausted" / "pool exhaustion") still overlap. IDF weights are applied
+on the query side only, so adding an incident updates the document
+frequencies without re-embedding anything already indexed.
+
+Up to HISTORY_EXACT_LIMIT incidents every row is scored (one small matrix
+product). Past that, a random-hyperplane LSH index (HISTORY_LSH_TABLES
+tables of HISTORY_LSH_BITS bits) narrows scoring to rows sharing a bucket
+with the query, falling back to every row when too few candidates remain.
+
+The index is loaded from greenstick-incidents on first use (concurrent
+callers share one load) and refreshed incrementally by created_at in the
+background. Incidents without created_at cannot be placed against that
+watermark, so every refresh re-reads them and indexes the new or changed ones. With HISTORY_VECTOR_MIRROR=true the vectors are also written to
+a dense_vector field on the incident documents.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import math
+import os
+import re
+import time
+import zlib
+import numpy as np
+
+HISTORY_DIMENSIONS = int(os.getenv("HISTORY_DIMENSIONS", "1024"))
+HISTORY_EXACT_LIMIT = 2000  # below this many incidents every row is scored
+HISTORY_LSH_TABLES = 16
+HISTORY_LSH_BITS = 6
+HISTORY_MIN_SIMILARITY = float(os.getenv("HISTORY_MIN_SIMILARITY", "0.1"))
+HISTORY_REFRESH_SECONDS = float(os.getenv("HISTORY_REFRESH_SECONDS", "60"))
+HISTORY_VECTOR_MIRROR = os.getenv("HISTORY_VECTOR_MIRROR", "false").lower() == "true"
+HISTORY_VECTOR_FIELD = "description_vector"
+HISTORY_PAGE_SIZE = 500
+
+INCIDENTS_INDEX = "greenstick-incidents"
+
+# Feature weights: whole words dominate, sub-word grams add fuzziness
+_WORD_WEIGHT = 1.0
+_BIGRAM_WEIGHT = 0.5
+_CHARGRAM_WEIGHT = 0.3
+_CHARGRAM_SIZE = 4
+
+_WORD = re.compile(r"[a-z][a-z0-9_]+")
+
+
+def _features(text: str) -> Dict[int, float]:
+    """Hashed feature -> signed weight for a piece of text."""
+    words = _WORD.findall(text.lower())
+    features: Dict[int, float] = {}
+
+    def add(feature: str, weight: float):
+        hashed = zlib.crc32(feature.encode())
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        bucket = hashed % HISTORY_DIMENSIONS
+        features[bucket] = features.get(bucket, 0.0) + sign * weight
+
+    for word in words:
+        add(word, _WORD_WEIGHT)
+        padded = f"<{word}>"
+        for start in range(max(1, len(padded) - _CHARGRAM_SIZE + 1)):
+            add("#" + padded[start:start + _CHARGRAM_SIZE], _CHARGRAM_WEIGHT)
+    for first, second in zip(words, words[1:]):
+        add(f"{first} {second}", _BIGRAM_WEIGHT)
+    return features
+
+
+def embed(text: str) -> np.ndarray:
+    """L2-normalized hashed TF vector (sublinear term frequency)."""
+    vector = np.zeros(HISTORY_DIMENSIONS, dtype=np.float32)
+    for bucket, weight in _features(text).items():
+        vector[bucket] = math.copysign(1.0 + math.log(abs(weight)), weight) if abs(weight) >= 1.0 else weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def incident_text(doc: Dict[str, Any]) -> str:
+    return " ".join(str(doc.get(field, "")) for field in ("description", "root_cause"))
+
+
+class HistoryIndex:
+    """Hashed TF-IDF vectors in a random-hyperplane LSH index."""
+
+    def __init__(self, dimensions: int = HISTORY_DIMENSIONS, tables: int = HISTORY_LSH_TABLES,
+                 bits: int = HISTORY_LSH_BITS, seed: int = 7):
+        self.dimensions = dimensions
+        self.tables = tables
+        self.bits = bits
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables * bits, dimensions)).astype(np.float32)
+        self._powers = 1 << np.arange(bits, dtype=np.int64)
+
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._sources: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}  # document id -> row
+        self._keys = np.zeros((0, tables), dtype=np.int64)  # row -> its bucket key per table
+        self._df = np.zeros(dimensions, dtype=np.float32)  # rows with a non-zero bucket
+        self._count = 0
+
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self._watermark: Optional[int] = None  # newest created_at indexed, epoch ms
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._mirror_ready = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "incidents": self._count,
+            "loaded": self.loaded,
+            "last_refresh_age_seconds": round(time.monotonic() - self.last_refresh, 1) if self.last_refresh else None,
+            "vector_mirror": HISTORY_VECTOR_MIRROR
+        }
+
+    def _hash_keys(self, vector: np.ndarray) -> np.ndarray:
+        bits = (self._planes @ vector > 0).reshape(self.tables, self.bits)
+        return bits.astype(np.int64) @ self._powers
+
+    def add(self, doc_id: str, source: Dict[str, Any]) -> np.ndarray:
+        """Insert or replace an incident; returns its (unweighted) vector."""
+        vector = embed(incident_text(source))
+        keys = self._hash_keys(vector)
+
+        row = self._rows.get(doc_id)
+        if row is None:
+            row = self._count
+            if row == len(self._vectors):
+                capacity = max(16, 2 * row)
+                self._vectors = np.resize(self._vectors, (capacity, self.dimensions))
+                self._keys = np.resize(self._keys, (capacity, self.tables))
+            self._rows[doc_id] = row
+            self._sources.append(source)
+            self._count += 1
+        else:
+            self._df -= self._vectors[row] != 0
+            self._sources[row] = source
+
+        self._vectors[row] = vector
+        self._keys[row] = keys
+        self._df += vector != 0
+        return vector
+
+    def search(self, text: str, k: int = 3, min_similarity: float = HISTORY_MIN_SIMILARITY) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k (incident, similarity) for the text, most similar first."""
+        if self._count == 0:
+            return []
+        query = embed(text)
+        if not query.any():
+            return []
+
+        # Query-side IDF keeps stored vectors valid as document frequencies change
+        idf = np.log((1 + self._count) / (1 + self._df)) + 1
+        weighted = query * idf
+        weighted /= np.linalg.norm(weighted)
+
+        rows = None
+        if self._count > HISTORY_EXACT_LIMIT:
+            # Rows sharing a bucket with the query in any table
+            candidates = np.flatnonzero((self._keys[:self._count] == self._hash_keys(query)).any(axis=1))
+            if len(candidates) >= k:
+                rows = candidates
+        scores = (self._vectors[:self._count] if rows is None else self._vectors[rows]) @ weighted
+
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self._sources[i if rows is None else rows[i]], float(scores[i]))
+            for i in top if scores[i] >= min_similarity
+        ]
+
+    async def ensure_fresh(self, es_client):
+        """Load on first use; afterwards refresh in the background once stale."""
+        idle = self._refresh_task is None or self._refresh_task.done()
+        if not self.loaded:
+            # Concurrent first callers wait on the same load instead of each starting one
+            if idle:
+                self._refresh_task = asyncio.create_task(self.refresh(es_client))
+            await asyncio.shield(self._refresh_task)
+            return
+        stale = self.last_refresh is None or time.monotonic() - self.last_refresh > HISTORY_REFRESH_SECONDS
+        if stale and idle:
+            self._refresh_task = asyncio.create_task(self.refresh(es_client))
+
+    async def refresh(self, es_client):
+        """
+        Index incidents created since the last refresh (all of them the first
+        time), plus any without created_at that are new or changed.
+        """
+        query: Dict[str, Any] = {"match_all": {}}
+        if self._watermark is not None:
+            # gte: documents sharing the boundary timestamp are simply re-added
+            query = {
+                "bool": {
+                    "should": [
+                        {"range": {"created_at": {"gte": self._watermark, "format": "epoch_millis"}}},
+                        {"bool": {"must_not": {"exists": {"field": "created_at"}}}}
+                    ],
+                    "minimum_should_match": 1
+                }
+            }
+
+        added: List[Tuple[str, np.ndarray]] = []
+        search_after = None
+        while True:
+            body: Dict[str, Any] = {
+                "query": query,
+                "size": HISTORY_PAGE_SIZE,
+                "sort": [{"created_at": {"order": "asc", "missing": "_first"}}, {"incident_id": "asc"}],
+                "_source": {"excludes": [HISTORY_VECTOR_FIELD]}
+            }
+            if search_after:
+                body["search_after"] = search_after
+            response = await es_client.search(index=INCIDENTS_INDEX, ignore_unavailable=True, body=body)
+            hits = response.get("hits", {}).get("hits", [])
+            for hit in hits:
+                source = hit["_source"]
+                undated = not source.get("created_at")
+                row = self._rows.get(hit["_id"])
+                if undated and row is not None and self._sources[row] == source:
+                    continue  # re-read on every refresh, unchanged
+                added.append((hit["_id"], self.add(hit["_id"], source)))
+                # The sort value is created_at as epoch ms, whatever format the document used
+                created = hit["sort"][0]
+                if not undated and (self._watermark is None or created > self._watermark):
+                    self._watermark = created
+            if len(hits) < HISTORY_PAGE_SIZE:
+                break
+            search_after = hits[-1]["sort"]
+
+        self.loaded = True
+        self.last_refresh = time.monotonic()
+        if HISTORY_VECTOR_MIRROR and added:
+            await self._mirror(es_client, added)
+
+    async def _mirror(self, es_client, added: List[Tuple[str, np.ndarray]]):
+        try:
+            if not self._mirror_ready:
+                await es_client.indices.put_mapping(index=INCIDENTS_INDEX, properties={
+                    HISTORY_VECTOR_FIELD: {
+                        "type": "dense_vector", "dims": self.dimensions, "index": True, "similarity": "cosine"
+                    }
+                })
+                self._mirror_ready = True
+            operations: List[Dict[str, Any]] = []
+            for doc_id, vector in added:
+                if vector.any():  # cosine similarity rejects zero vectors
+                    operations.append({"update": {"_index": INCIDENTS_INDEX, "_id": doc_id}})
+                    operations.append({"doc": {HISTORY_VECTOR_FIELD: vector.tolist()}})
+            if operations:
+                await es_client.bulk(operations=operations)
+        except Exception as e:
+            print(f"[HistoryIndex] Failed to mirror vectors: {e}")
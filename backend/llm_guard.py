@@ -0,0 +1,225 @@
+"""
+LLM Guard - Deadlines, a circuit breaker and hedging around Gemini calls.
+
+Every model call goes through LLMGuard:
+- At most LLM_MAX_CONCURRENCY calls are in flight; the rest queue.
+- Each call, including its time in the queue, must finish within
+  LLM_DEADLINE_SECONDS, which bounds how long a plan can take.
+- Once at least LLM_BREAKER_MIN_CALLS calls have been recorded, the breaker
+  trips when LLM_BREAKER_ERROR_RATE of the last LLM_BREAKER_WINDOW calls
+  failed or timed out. While it is open every call is rejected right away
+  with CircuitOpenError, and the caller falls back to a rule-based plan.
+- After LLM_BREAKER_COOLDOWN_SECONDS, a single probe call is let through.
+  If it succeeds the breaker closes; if it fails the breaker opens again.
+- With LLM_HEDGE_ENABLED, a call that is still running after the
+  LLM_HEDGE_PERCENTILE latency of recent calls gets a second, identical
+  request. The first response wins and the loser is cancelled. A hedge
+  shares its original's concurrency slot and deadline.
+"""
+from collections import deque
+from typing import Dict, Any, List, Callable, Awaitable, AsyncIterator, Optional, TypeVar
+import asyncio
+import os
+import time
+
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))  # per call, queueing included
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_BREAKER_WINDOW = 20  # most recent calls considered
+LLM_BREAKER_MIN_CALLS = 5  # never trip on fewer recorded calls
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging starts
+LLM_LATENCY_WINDOW = 200
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the model while the breaker is open."""
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class LLMGuard:
+    """Resilience layer for model calls; see the module docstring."""
+
+    def __init__(self, deadline: float = LLM_DEADLINE_SECONDS, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 hedge: bool = LLM_HEDGE_ENABLED):
+        self.deadline = deadline
+        self.hedge = hedge
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.state = "closed"  # "closed", "open" or "half_open"
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._outcomes = deque(maxlen=LLM_BREAKER_WINDOW)  # True for a failed call
+        self._latencies = deque(maxlen=LLM_LATENCY_WINDOW)  # seconds, successful calls
+
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.breaker_trips = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        latencies = list(self._latencies)
+        p50, p95 = _percentile(latencies, 50), _percentile(latencies, 95)
+        return {
+            "breaker": self.state,
+            "recent_error_rate": round(sum(self._outcomes) / len(self._outcomes), 3) if self._outcomes else 0.0,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "breaker_trips": self.breaker_trips,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "deadline_seconds": self.deadline
+        }
+
+    async def call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run make_call() under the deadline, breaker and concurrency limit.
+        Raises CircuitOpenError, asyncio.TimeoutError or the call's own error.
+        """
+        probe = self._admit()
+        deadline_at = time.monotonic() + self.deadline
+        try:
+            await self._acquire(deadline_at)
+            try:
+                started = time.monotonic()
+                result = await asyncio.wait_for(self._hedged(make_call), deadline_at - started)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._record(False)
+                raise
+            except Exception:
+                self._record(False)
+                raise
+            finally:
+                self._semaphore.release()
+            self._record(True, time.monotonic() - started)
+            return result
+        finally:
+            if probe:
+                self._probe_in_flight = False
+
+    async def stream(self, make_stream: Callable[[], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """
+        Like call(), for a streamed response: yields its chunks, with the
+        deadline covering the whole stream. Streams are never hedged.
+        """
+        probe = self._admit()
+        deadline_at = time.monotonic() + self.deadline
+        try:
+            await self._acquire(deadline_at)
+            try:
+                started = time.monotonic()
+                try:
+                    iterator = (await asyncio.wait_for(make_stream(), deadline_at - time.monotonic())).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), deadline_at - time.monotonic())
+                        except StopAsyncIteration:
+                            break
+                        yield chunk
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._record(False)
+                    raise
+                except Exception:
+                    self._record(False)
+                    raise
+            finally:
+                self._semaphore.release()
+            self._record(True, time.monotonic() - started)
+        finally:
+            if probe:
+                self._probe_in_flight = False
+
+    def _admit(self) -> bool:
+        """Raise CircuitOpenError if the call may not proceed; True for a probe call."""
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < LLM_BREAKER_COOLDOWN_SECONDS:
+                self.rejected += 1
+                raise CircuitOpenError("Gemini circuit breaker is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError("Gemini circuit breaker is half-open, probe in flight")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    async def _acquire(self, deadline_at: float):
+        # Queueing counts against the deadline but is not the model's fault,
+        # so it never feeds the breaker.
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _record(self, ok: bool, latency: Optional[float] = None):
+        self.calls += 1
+        if ok:
+            self._latencies.append(latency)
+        else:
+            self.failures += 1
+        self._outcomes.append(not ok)
+
+        if self.state == "half_open":
+            if ok:
+                self.state = "closed"
+                self._outcomes.clear()
+                print("[LLMGuard] Probe succeeded, circuit closed")
+            else:
+                self._open()
+        elif self.state == "closed" and len(self._outcomes) >= LLM_BREAKER_MIN_CALLS:
+            if sum(self._outcomes) / len(self._outcomes) >= LLM_BREAKER_ERROR_RATE:
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.breaker_trips += 1
+        print(f"[LLMGuard] Circuit opened for {LLM_BREAKER_COOLDOWN_SECONDS:g}s "
+              f"({sum(self._outcomes)}/{len(self._outcomes)} recent calls failed)")
+
+    async def _hedged(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        delay = _percentile(list(self._latencies), LLM_HEDGE_PERCENTILE) if self.hedge else None
+        if delay is None or len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return await make_call()
+
+        first = asyncio.ensure_future(make_call())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(make_call()))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
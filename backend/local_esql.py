@@ -0,0 +1,853 @@
+"""
+Local ES|QL - In-process engine for the ES|QL subset GreenStick's queries use.
+
+With ESQL_BACKEND=local, the agent and the ES|QL tools run their queries here,
+against the columnar log store (log_store.py), instead of on the cluster.
+LocalEsql stands in for `es_client.esql.query`, so responses have the shape
+Elasticsearch returns (rows, or column arrays with columnar=True) and go
+through the same result shaping and query cache.
+
+Supported:
+- Commands: FROM greenstick-logs, WHERE, EVAL, STATS ... [BY column, ...],
+  SORT, LIMIT, KEEP and DROP.
+- Aggregates: COUNT(*), COUNT, COUNT_DISTINCT, SUM, AVG, MIN and MAX. Each
+  can carry its own `WHERE` filter.
+- Expressions: comparisons, AND/OR/NOT, + - * / %, IN, LIKE/RLIKE,
+  IS [NOT] NULL, NOW(), time spans ("15 minutes"), DATE_TRUNC, ROUND and ABS.
+
+Columns are evaluated whole with numpy, and only the columns a query
+references are read. String predicates are evaluated once per distinct
+value and then mapped onto the codes. Anything outside the subset raises
+EsqlError, which callers treat like a failed query.
+"""
+from typing import Dict, Any, List, Optional, Tuple, Callable
+import asyncio
+import fnmatch
+import json
+import operator
+import os
+import re
+import time
+import numpy as np
+from bootstrap import LOGS_STREAM
+from log_store import LogStore, _parse_date
+
+ESQL_BACKEND = os.getenv("ESQL_BACKEND", "elasticsearch")  # "elasticsearch" or "local"
+ESQL_DEFAULT_LIMIT = 1000  # rows returned when a query has no LIMIT, as in Elasticsearch
+
+_SPAN_UNITS = {
+    "ms": "millisecond", "millisecond": "millisecond", "milliseconds": "millisecond",
+    "s": "second", "sec": "second", "second": "second", "seconds": "second",
+    "min": "minute", "minute": "minute", "minutes": "minute",
+    "h": "hour", "hour": "hour", "hours": "hour",
+    "d": "day", "day": "day", "days": "day",
+    "w": "week", "week": "week", "weeks": "week",
+    "mo": "month", "month": "month", "months": "month",
+    "y": "year", "yr": "year", "year": "year", "years": "year",
+}
+_FIXED_MS = {
+    "millisecond": 1, "second": 1000, "minute": 60000, "hour": 3600000,
+    "day": 86400000, "week": 7 * 86400000,
+}
+_WEEK_OFFSET_MS = 3 * 86400000  # 1970-01-01 is a Thursday; weeks start on Monday
+_AGGREGATES = {"COUNT", "COUNT_DISTINCT", "SUM", "AVG", "MIN", "MAX"}
+_INTEGRAL = {"long", "integer"}
+_NUMERIC = {"long", "integer", "double", "float", "null"}
+_COMPARISONS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<op>==|!=|<=|>=|[<>+\-*/%(),=])
+  | (?P<name>`[^`]+`)
+  | (?P<ident>[A-Za-z_@][A-Za-z0-9_@.]*)
+)""", re.VERBOSE)
+
+
+class EsqlError(ValueError):
+    """The query is invalid or outside the supported subset."""
+
+
+class _Span:
+    __slots__ = ("amount", "unit")
+
+    def __init__(self, amount: float, unit: str):
+        self.amount = amount
+        self.unit = unit
+
+
+class _Vec:
+    """
+    An evaluated column (or 0-d scalar): float64 data for numbers and dates
+    (NaN is null), int32 codes into `dictionary` for strings (-1 is null), or
+    bool data plus an optional null mask for booleans.
+    """
+    __slots__ = ("type", "data", "dictionary", "index", "nulls")
+
+    def __init__(self, vec_type: str, data: np.ndarray, dictionary: Optional[List[str]] = None,
+                 index: Optional[Dict[str, int]] = None, nulls: Optional[np.ndarray] = None):
+        self.type = vec_type
+        self.data = data
+        self.dictionary = dictionary
+        self.index = index
+        self.nulls = nulls
+
+    @property
+    def is_string(self) -> bool:
+        return self.dictionary is not None
+
+    def null_mask(self) -> np.ndarray:
+        if self.is_string:
+            return self.data < 0
+        if self.type == "boolean":
+            return self.nulls if self.nulls is not None else np.zeros(self.data.shape, dtype=bool)
+        return np.isnan(self.data)
+
+    def take(self, rows: np.ndarray) -> "_Vec":
+        if self.data.ndim == 0:
+            return self
+        nulls = None if self.nulls is None else self.nulls[rows]
+        return _Vec(self.type, self.data[rows], self.dictionary, self.index, nulls)
+
+    def broadcast(self, rows: int) -> "_Vec":
+        if self.data.ndim:
+            return self
+        nulls = None if self.nulls is None else np.full(rows, bool(self.nulls))
+        return _Vec(self.type, np.full(rows, self.data[()], dtype=self.data.dtype), self.dictionary, self.index, nulls)
+
+
+def _string_literal(value: str) -> _Vec:
+    return _Vec("keyword", np.array(0, dtype=np.int32), [value], {value: 0})
+
+
+def _number_literal(text: str) -> _Vec:
+    is_integral = re.fullmatch(r"\d+", text) is not None
+    return _Vec("long" if is_integral else "double", np.array(float(text)))
+
+
+def _truthy(vec: _Vec, rows: int) -> np.ndarray:
+    """Rows where a boolean expression is true (null counts as false)."""
+    if vec.type not in ("boolean", "null"):
+        raise EsqlError(f"Condition must be boolean, got {vec.type}")
+    vec = vec.broadcast(rows)
+    if vec.type == "null":
+        return np.zeros(rows, dtype=bool)
+    return vec.data & ~vec.null_mask()
+
+
+# ---------------------------------------------------------------- parsing
+
+def _tokenize(text: str) -> List[Tuple[str, str, int, int]]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise EsqlError(f"Cannot parse near '{text[position:position + 20].strip()}'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = value[1:-1]
+        elif kind == "name":
+            value = value[1:-1]
+        tokens.append((kind, value, match.start(kind), match.end()))
+        position = match.end()
+    return tokens
+
+
+def _split_commands(query: str) -> List[Tuple[str, str]]:
+    """Split on top-level pipes into (COMMAND, body) pairs."""
+    commands, current, quote = [], [], None
+    for char in query:
+        if quote:
+            current.append(char)
+            if char == quote and (char != '"' or current[-2:-1] != ["\\"]):
+                quote = None
+        elif char in ('"', "`"):
+            quote = char
+            current.append(char)
+        elif char == "|":
+            commands.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    commands.append("".join(current))
+
+    parsed = []
+    for command in commands:
+        match = re.match(r"\s*([A-Za-z_]+)\s*(.*)", command, re.DOTALL)
+        if not match:
+            raise EsqlError(f"Empty or invalid command: '{command.strip()}'")
+        parsed.append((match.group(1).upper(), match.group(2).strip()))
+    return parsed
+
+
+def _split_list(body: str) -> List[str]:
+    items = [item.strip() for item in body.split(",")]
+    if not all(items):
+        raise EsqlError(f"Invalid list: '{body}'")
+    return items
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1] if len(name) > 1 and name[0] == name[-1] and name[0] in "`\"" else name
+
+
+class _Parser:
+    """Recursive-descent expression parser over one command's body."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[Tuple[str, str, int, int]]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> Tuple[str, str, int, int]:
+        token = self.peek()
+        if token is None:
+            raise EsqlError(f"Unexpected end of '{self.text}'")
+        self.pos += 1
+        return token
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def at_word(self, *words: str, offset: int = 0) -> bool:
+        token = self.peek(offset)
+        return token is not None and token[0] == "ident" and token[1].upper() in words
+
+    def at_op(self, op: str) -> bool:
+        token = self.peek()
+        return token is not None and token[0] == "op" and token[1] == op
+
+    def accept_op(self, op: str) -> bool:
+        if self.at_op(op):
+            self.pos += 1
+            return True
+        return False
+
+    def expect_op(self, op: str):
+        if not self.accept_op(op):
+            token = self.peek()
+            raise EsqlError(f"Expected '{op}' but found '{token[1] if token else 'end of input'}'")
+
+    def expect_end(self):
+        if not self.done():
+            raise EsqlError(f"Unexpected '{self.peek()[1]}' in '{self.text}'")
+
+    def source_since(self, start: int) -> str:
+        return self.text[start:self.tokens[self.pos - 1][3]].strip()
+
+    def assignment(self) -> Tuple[str, Any, int]:
+        """[name =] expression; unnamed expressions are named after their text."""
+        token = self.peek()
+        if token is not None and token[0] in ("ident", "name") and self.peek(1) is not None \
+                and self.peek(1)[:2] == ("op", "="):
+            self.pos += 2
+            return token[1], self.expression(), token[2]
+        start = token[2] if token else len(self.text)
+        expression = self.expression()
+        return self.source_since(start), expression, start
+
+    def expression(self):
+        node = self.and_expression()
+        while self.at_word("OR"):
+            self.pos += 1
+            node = ("or", node, self.and_expression())
+        return node
+
+    def and_expression(self):
+        node = self.not_expression()
+        while self.at_word("AND"):
+            self.pos += 1
+            node = ("and", node, self.not_expression())
+        return node
+
+    def not_expression(self):
+        if self.at_word("NOT"):
+            self.pos += 1
+            return ("not", self.not_expression())
+        return self.predicate()
+
+    def predicate(self):
+        left = self.additive()
+        token = self.peek()
+        if token is not None and token[0] == "op" and token[1] in _COMPARISONS:
+            self.pos += 1
+            return ("cmp", token[1], left, self.additive())
+
+        negate = self.at_word("NOT") and self.at_word("LIKE", "RLIKE", "IN", offset=1)
+        if negate:
+            self.pos += 1
+        if self.at_word("LIKE", "RLIKE"):
+            regex = self.next()[1].upper() == "RLIKE"
+            pattern = self.next()
+            if pattern[0] != "string":
+                raise EsqlError("LIKE/RLIKE need a string pattern")
+            return ("like", left, pattern[1], regex, negate)
+        if self.at_word("IN"):
+            self.pos += 1
+            self.expect_op("(")
+            items = [self.additive()]
+            while self.accept_op(","):
+                items.append(self.additive())
+            self.expect_op(")")
+            return ("in", left, items, negate)
+        if self.at_word("IS"):
+            self.pos += 1
+            is_not = self.at_word("NOT")
+            if is_not:
+                self.pos += 1
+            if not self.at_word("NULL"):
+                raise EsqlError("Expected NULL after IS")
+            self.pos += 1
+            return ("isnull", left, is_not)
+        return left
+
+    def additive(self):
+        node = self.term()
+        while self.at_op("+") or self.at_op("-"):
+            node = ("arith", self.next()[1], node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.at_op("*") or self.at_op("/") or self.at_op("%"):
+            node = ("arith", self.next()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.accept_op("-"):
+            return ("neg", self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value, _, _ = self.next()
+        if kind == "number":
+            unit = self.peek()
+            if unit is not None and unit[0] == "ident" and unit[1].lower() in _SPAN_UNITS:
+                self.pos += 1
+                return ("span", float(value), _SPAN_UNITS[unit[1].lower()])
+            return ("lit", _number_literal(value))
+        if kind == "string":
+            return ("lit", _string_literal(value))
+        if kind == "op" and value == "(":
+            node = self.expression()
+            self.expect_op(")")
+            return node
+        if kind == "op" and value == "*":
+            return ("star",)
+        if kind == "ident" and value.upper() in ("TRUE", "FALSE"):
+            return ("lit", _Vec("boolean", np.array(value.upper() == "TRUE")))
+        if kind == "ident" and value.upper() == "NULL":
+            return ("lit", _Vec("null", np.array(np.nan)))
+        if kind in ("ident", "name"):
+            if kind == "ident" and self.accept_op("("):
+                args = []
+                if not self.accept_op(")"):
+                    args.append(self.expression())
+                    while self.accept_op(","):
+                        args.append(self.expression())
+                    self.expect_op(")")
+                return ("call", value.upper(), args)
+            return ("field", value)
+        raise EsqlError(f"Unexpected '{value}'")
+
+
+# ---------------------------------------------------------------- tables
+
+class _Table:
+    """Named columns over a row selection; base columns are loaded on first use."""
+
+    def __init__(self, names: List[str], rows: int, vectors: Optional[Dict[str, _Vec]] = None,
+                 source: Optional[Callable[[str], _Vec]] = None, selection: Optional[np.ndarray] = None):
+        self.names = list(names)
+        self.rows = rows
+        self._vectors = dict(vectors or {})
+        self._source = source
+        self._selection = selection
+
+    def column(self, name: str) -> _Vec:
+        vec = self._vectors.get(name)
+        if vec is None:
+            if self._source is None or name not in self.names:
+                raise EsqlError(f"Unknown column [{name}]")
+            vec = self._source(name)
+            if self._selection is not None:
+                vec = vec.take(self._selection)
+            self._vectors[name] = vec
+        return vec
+
+    def take(self, rows: np.ndarray) -> "_Table":
+        selection = rows if self._selection is None else self._selection[rows]
+        vectors = {name: vec.take(rows) for name, vec in self._vectors.items()}
+        return _Table(self.names, len(rows), vectors, self._source, selection)
+
+    def with_column(self, name: str, vec: _Vec) -> "_Table":
+        table = _Table([n for n in self.names if n != name] + [name], self.rows,
+                       self._vectors, self._source, self._selection)
+        table._vectors[name] = vec.broadcast(self.rows)
+        return table
+
+    def project(self, names: List[str]) -> "_Table":
+        vectors = {name: vec for name, vec in self._vectors.items() if name in names}
+        return _Table(names, self.rows, vectors, self._source, self._selection)
+
+
+# ---------------------------------------------------------------- engine
+
+class LocalEsql:
+    """
+    Runs ES|QL queries over a LogStore. Exposes the `esql.query(query=...,
+    columnar=...)` call of the Elasticsearch client, so it can be passed
+    wherever an ES|QL-capable client is expected.
+    """
+
+    def __init__(self, store: LogStore):
+        self.store = store
+        self.esql = self
+        self.queries = 0
+        self.failures = 0
+        self.total_ms = 0.0
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "backend": "local",
+            "queries": self.queries,
+            "failures": self.failures,
+            "avg_query_ms": round(self.total_ms / self.queries, 2) if self.queries else None,
+            "store": self.store.get_status()
+        }
+
+    async def query(self, query: str, columnar: bool = False, **kwargs) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.execute, query, columnar)
+
+    def execute(self, query: str, columnar: bool = False) -> Dict[str, Any]:
+        """Run a query synchronously; returns an Elasticsearch-shaped ES|QL response."""
+        started = time.perf_counter()
+        self.queries += 1
+        try:
+            return self._execute(query, columnar)
+        except EsqlError:
+            self.failures += 1
+            raise
+        finally:
+            self.total_ms += (time.perf_counter() - started) * 1000
+
+    def _execute(self, query: str, columnar: bool) -> Dict[str, Any]:
+        commands = _split_commands(query)
+        if commands[0][0] != "FROM":
+            raise EsqlError("Query must start with FROM")
+
+        table = self._from(commands[0][1])
+        limited = False
+        for command, body in commands[1:]:
+            if command == "WHERE":
+                parser = _Parser(body)
+                condition = parser.expression()
+                parser.expect_end()
+                table = table.take(np.flatnonzero(_truthy(self._eval(condition, table), table.rows)))
+            elif command == "EVAL":
+                parser = _Parser(body)
+                while True:
+                    name, expression, _ = parser.assignment()
+                    table = table.with_column(name, self._value(expression, table))
+                    if not parser.accept_op(","):
+                        break
+                parser.expect_end()
+            elif command == "STATS":
+                table = self._stats(body, table)
+            elif command == "SORT":
+                table = self._sort(body, table)
+            elif command == "LIMIT":
+                if not body.isdigit():
+                    raise EsqlError(f"LIMIT needs a non-negative integer, got '{body}'")
+                table = table.take(np.arange(min(table.rows, int(body))))
+                limited = True
+            elif command in ("KEEP", "DROP"):
+                patterns = [_unquote(item) for item in _split_list(body)]
+                if command == "KEEP":
+                    names = []
+                    for pattern in patterns:
+                        matched = [name for name in table.names if fnmatch.fnmatchcase(name, pattern) and name not in names]
+                        if not matched:
+                            raise EsqlError(f"Unknown column [{pattern}]")
+                        names.extend(matched)
+                else:
+                    names = [name for name in table.names
+                             if not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+                table = table.project(names)
+            else:
+                raise EsqlError(f"Unsupported command {command}")
+
+        if not limited:
+            table = table.take(np.arange(min(table.rows, ESQL_DEFAULT_LIMIT)))
+        return self._response(table, columnar)
+
+    def _from(self, body: str) -> _Table:
+        for index in _split_list(body):
+            if not fnmatch.fnmatchcase(LOGS_STREAM, _unquote(index)):
+                raise EsqlError(f"Unknown index [{_unquote(index)}]; the local backend only holds {LOGS_STREAM}")
+        rows = self.store.rows  # snapshot: rows appended while the query runs are ignored
+
+        def load(name: str) -> _Vec:
+            column = self.store.column(name)
+            return _Vec(column.type, column.data[:rows], column.dictionary, column.index)
+
+        return _Table(self.store.columns(), rows, source=load)
+
+    # ------------------------------------------------------------ expressions
+
+    def _value(self, node, table: _Table) -> _Vec:
+        value = self._eval(node, table)
+        if isinstance(value, _Span):
+            raise EsqlError("A time span is not a value")
+        return value
+
+    def _eval(self, node, table: _Table):
+        kind = node[0]
+        if kind == "lit":
+            return node[1]
+        if kind == "field":
+            return table.column(node[1])
+        if kind == "span":
+            return _Span(node[1], node[2])
+        if kind == "star":
+            raise EsqlError("'*' is only valid in COUNT(*)")
+        if kind == "call":
+            return self._call(node[1], node[2], table)
+        if kind == "neg":
+            vec = self._value(node[1], table)
+            if vec.type not in _NUMERIC:
+                raise EsqlError(f"Cannot negate {vec.type}")
+            return _Vec(vec.type, -vec.data)
+        if kind == "arith":
+            return self._arith(node[1], self._eval(node[2], table), self._eval(node[3], table))
+        if kind == "cmp":
+            return self._compare(node[1], self._value(node[2], table), self._value(node[3], table))
+        if kind in ("and", "or"):
+            return self._logic(kind, self._value(node[1], table), self._value(node[2], table))
+        if kind == "not":
+            vec = self._value(node[1], table)
+            if vec.type != "boolean":
+                raise EsqlError("NOT needs a boolean")
+            return _Vec("boolean", ~vec.data, nulls=vec.nulls)
+        if kind == "like":
+            return self._like(self._value(node[1], table), node[2], node[3], node[4])
+        if kind == "in":
+            left = self._value(node[1], table)
+            result = None
+            for item in node[2]:
+                match = self._compare("==", left, self._value(item, table))
+                result = match if result is None else self._logic("or", result, match)
+            if node[3]:
+                result = _Vec("boolean", ~result.data, nulls=result.nulls)
+            return result
+        if kind == "isnull":
+            nulls = self._value(node[1], table).null_mask()
+            return _Vec("boolean", ~nulls if node[2] else nulls)
+        raise EsqlError(f"Unsupported expression {kind}")
+
+    def _call(self, name: str, args: List[Any], table: _Table) -> _Vec:
+        if name in _AGGREGATES:
+            raise EsqlError(f"{name} is only valid in STATS")
+        if name == "NOW":
+            return _Vec("date", np.array(time.time() * 1000))
+        if name == "ABS" and len(args) == 1:
+            vec = self._value(args[0], table)
+            if vec.type not in _NUMERIC:
+                raise EsqlError(f"ABS needs a number, got {vec.type}")
+            return _Vec(vec.type, np.abs(vec.data))
+        if name == "ROUND" and len(args) in (1, 2):
+            vec = self._value(args[0], table)
+            decimals = int(self._value(args[1], table).data) if len(args) == 2 else 0
+            if vec.type not in _NUMERIC:
+                raise EsqlError(f"ROUND needs a number, got {vec.type}")
+            if vec.type in _INTEGRAL and decimals >= 0:
+                return vec
+            scale = 10.0 ** decimals
+            # Half away from zero, like Elasticsearch (numpy rounds half to even)
+            return _Vec(vec.type, np.sign(vec.data) * np.floor(np.abs(vec.data) * scale + 0.5) / scale)
+        if name == "DATE_TRUNC" and len(args) == 2:
+            span, vec = self._eval(args[0], table), self._value(args[1], table)
+            if not isinstance(span, _Span) or vec.type != "date":
+                raise EsqlError("DATE_TRUNC needs a time span and a date")
+            return _Vec("date", _truncate(vec.data, span))
+        raise EsqlError(f"Unsupported function {name}({len(args)} arguments)")
+
+    @staticmethod
+    def _arith(op: str, left, right) -> _Vec:
+        if isinstance(left, _Span) or isinstance(right, _Span):
+            span, date = (right, left) if isinstance(right, _Span) else (left, right)
+            if isinstance(date, _Span) or date.type != "date" or (op == "-" and date is right) or op not in "+-":
+                raise EsqlError("Time spans can only be added to or subtracted from a date")
+            return _Vec("date", _shift(date.data, span, 1 if op == "+" else -1))
+        if left.type not in _NUMERIC or right.type not in _NUMERIC:
+            raise EsqlError(f"Cannot apply {op} to {left.type} and {right.type}")
+
+        integral = left.type in _INTEGRAL and right.type in _INTEGRAL
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if op == "+":
+                data = left.data + right.data
+            elif op == "-":
+                data = left.data - right.data
+            elif op == "*":
+                data = left.data * right.data
+            else:
+                divisor = np.where(right.data == 0, np.nan, right.data)  # division by zero is null
+                data = np.fmod(left.data, divisor) if op == "%" else left.data / divisor
+                if integral and op == "/":
+                    data = np.trunc(data)
+        return _Vec("long" if integral else "double", data)
+
+    @staticmethod
+    def _compare(op: str, left: _Vec, right: _Vec) -> _Vec:
+        nulls = left.null_mask() | right.null_mask()
+        compare = _COMPARISONS[op]
+
+        if left.is_string and right.is_string:
+            scalar, column = (right, left) if right.data.ndim == 0 else (left, right)
+            if op in ("==", "!=") and scalar.data.ndim == 0 and column.index is not None:
+                # Look the literal up once instead of comparing every row's string
+                code = column.index.get(scalar.dictionary[int(scalar.data)], -2)
+                data = compare(column.data, code)
+            elif op in ("==", "!=") and left.dictionary is right.dictionary:
+                data = compare(left.data, right.data)
+            else:
+                data = compare(_decode(left), _decode(right)).astype(bool)
+        elif left.type == "date" and right.is_string or right.type == "date" and left.is_string:
+            date, text = (left, right) if left.type == "date" else (right, left)
+            if text.data.ndim:
+                raise EsqlError("Dates can only be compared with string literals")
+            other = _Vec("date", np.array(_parse_date(text.dictionary[int(text.data)])))
+            data = compare(left.data, other.data) if date is left else compare(other.data, right.data)
+            nulls = nulls | np.isnan(other.data)
+        elif (left.type in _NUMERIC or left.type == "date") and (right.type in _NUMERIC or right.type == "date") \
+                or left.type == right.type == "boolean":
+            with np.errstate(invalid="ignore"):
+                data = compare(left.data, right.data)
+        else:
+            raise EsqlError(f"Cannot compare {left.type} with {right.type}")
+        return _Vec("boolean", np.asarray(data, dtype=bool), nulls=nulls)
+
+    @staticmethod
+    def _logic(kind: str, left: _Vec, right: _Vec) -> _Vec:
+        if {left.type, right.type} - {"boolean", "null"}:
+            raise EsqlError(f"{kind.upper()} needs booleans")
+        left_null, right_null = left.null_mask(), right.null_mask()
+        left_true, right_true = left.data.astype(bool) & ~left_null, right.data.astype(bool) & ~right_null
+        left_false, right_false = ~left.data.astype(bool) & ~left_null, ~right.data.astype(bool) & ~right_null
+        # Three-valued logic: unknown only when the known side does not decide
+        if kind == "and":
+            true, false = left_true & right_true, left_false | right_false
+        else:
+            true, false = left_true | right_true, left_false & right_false
+        return _Vec("boolean", true, nulls=~(true | false))
+
+    @staticmethod
+    def _like(vec: _Vec, pattern: str, regex: bool, negate: bool) -> _Vec:
+        if not vec.is_string:
+            raise EsqlError(f"LIKE/RLIKE need a string, got {vec.type}")
+        if regex:
+            compiled = re.compile(pattern, re.DOTALL)
+        else:
+            compiled = re.compile("".join(
+                ".*" if char == "*" else "." if char == "?" else re.escape(char) for char in pattern
+            ), re.DOTALL)
+        # One match per distinct value, then mapped onto the rows' codes
+        matches = np.fromiter((compiled.fullmatch(value) is not None for value in vec.dictionary),
+                              dtype=bool, count=len(vec.dictionary))
+        nulls = vec.data < 0
+        data = matches[np.where(nulls, 0, vec.data)] if len(matches) else np.zeros(vec.data.shape, dtype=bool)
+        return _Vec("boolean", ~data if negate else data, nulls=nulls)
+
+    # ------------------------------------------------------------ STATS
+
+    def _stats(self, body: str, table: _Table) -> _Table:
+        parser = _Parser(body)
+        aggregates = []
+        if not parser.at_word("BY"):
+            while True:
+                name, expression, _ = parser.assignment()
+                condition = None
+                if parser.at_word("WHERE"):
+                    parser.pos += 1
+                    condition = parser.expression()
+                if expression[0] != "call" or expression[1] not in _AGGREGATES or len(expression[2]) != 1:
+                    raise EsqlError(f"Unsupported aggregation [{name}]")
+                aggregates.append((name, expression[1], expression[2][0], condition))
+                if not parser.accept_op(","):
+                    break
+        by = []
+        if parser.at_word("BY"):
+            parser.pos += 1
+            while True:
+                token = parser.next()
+                if token[0] not in ("ident", "name"):
+                    raise EsqlError(f"Unsupported grouping [{token[1]}]")
+                by.append(token[1])
+                if not parser.accept_op(","):
+                    break
+        parser.expect_end()
+        if not aggregates and not by:
+            raise EsqlError("STATS needs an aggregation or BY")
+
+        rows = table.rows
+        if by:
+            keys = np.stack([_group_codes(table.column(name).broadcast(rows)) for name in by], axis=1)
+            if rows:
+                _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+                inverse = inverse.reshape(-1)
+            else:
+                first, inverse = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            groups = len(first)
+        else:
+            first, inverse, groups = None, np.zeros(rows, dtype=np.int64), 1
+
+        vectors: Dict[str, _Vec] = {}
+        for name, function, argument, condition in aggregates:
+            vectors[name] = self._aggregate(function, argument, condition, table, inverse, groups)
+        for name in by:
+            vectors[name] = table.column(name).broadcast(rows).take(first)
+        names = [name for name, _, _, _ in aggregates if name not in by] + by
+        return _Table(list(dict.fromkeys(names)), groups, vectors)
+
+    def _aggregate(self, function: str, argument, condition, table: _Table,
+                   inverse: np.ndarray, groups: int) -> _Vec:
+        rows = table.rows
+        mask = _truthy(self._value(condition, table), rows) if condition is not None else None
+        if function == "COUNT" and argument[0] == "star":
+            weights = None if mask is None else mask.astype(np.float64)
+            return _Vec("long", np.bincount(inverse, weights=weights, minlength=groups).astype(np.float64))
+
+        vec = self._value(argument, table).broadcast(rows)
+        valid = ~vec.null_mask()
+        if mask is not None:
+            valid &= mask
+        members = inverse[valid]
+        counts = np.bincount(members, minlength=groups)
+
+        if function == "COUNT":
+            return _Vec("long", counts.astype(np.float64))
+        if function == "COUNT_DISTINCT":
+            values = _group_codes(vec)[valid]
+            width = int(values.max()) + 1 if len(values) else 1
+            pairs = np.unique(members * width + values)
+            return _Vec("long", np.bincount(pairs // width, minlength=groups).astype(np.float64))
+
+        if vec.type not in _NUMERIC and vec.type != "date":
+            raise EsqlError(f"{function} needs a number, got {vec.type}")
+        values = vec.data[valid]
+        empty = counts == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if function == "SUM":
+                result = np.bincount(members, weights=values, minlength=groups)
+                result_type = "long" if vec.type in _INTEGRAL else "double"
+            elif function == "AVG":
+                result = np.bincount(members, weights=values, minlength=groups) / counts
+                result_type = "double"
+            else:
+                result = np.full(groups, np.inf if function == "MIN" else -np.inf)
+                (np.minimum if function == "MIN" else np.maximum).at(result, members, values)
+                result_type = vec.type
+        result[empty] = np.nan
+        return _Vec(result_type, result)
+
+    # ------------------------------------------------------------ SORT / output
+
+    def _sort(self, body: str, table: _Table) -> _Table:
+        keys = []
+        for item in reversed(_split_list(body)):
+            words = item.split()
+            name = _unquote(words[0])
+            options = [word.upper() for word in words[1:]]
+            descending = "DESC" in options
+            nulls_first = ("FIRST" in options) if "NULLS" in options else descending
+            if set(options) - {"ASC", "DESC", "NULLS", "FIRST", "LAST"}:
+                raise EsqlError(f"Unsupported sort [{item}]")
+
+            vec = table.column(name).broadcast(table.rows)
+            if vec.is_string:
+                ranks = np.empty(len(vec.dictionary) + 1)
+                ranks[np.argsort(np.asarray(vec.dictionary, dtype=object), kind="stable")] = np.arange(len(vec.dictionary))
+                values = ranks[vec.data]  # the null code -1 lands on the spare slot; replaced below
+            else:
+                values = vec.data.astype(np.float64)
+            values = -values if descending else values.copy()
+            values[vec.null_mask()] = -np.inf if nulls_first else np.inf
+            keys.append(values)
+        return table.take(np.lexsort(keys)) if table.rows else table
+
+    @staticmethod
+    def _response(table: _Table, columnar: bool) -> Dict[str, Any]:
+        columns, data = [], []
+        for name in table.names:
+            vec = table.column(name).broadcast(table.rows)
+            columns.append({"name": name, "type": _output_type(vec.type)})
+            data.append(_to_python(vec))
+        return {"columns": columns, "values": data if columnar else [list(row) for row in zip(*data)]}
+
+
+def _group_codes(vec: _Vec) -> np.ndarray:
+    """Integer code per row such that equal values (and nulls) share a code."""
+    if vec.is_string:
+        return vec.data.astype(np.int64)
+    if vec.type == "boolean":
+        return np.where(vec.null_mask(), 2, vec.data.astype(np.int64))
+    _, codes = np.unique(vec.data, return_inverse=True)  # NaNs collapse into one code
+    return codes.reshape(-1).astype(np.int64)
+
+
+def _decode(vec: _Vec) -> np.ndarray:
+    values = np.asarray(vec.dictionary + [None], dtype=object)
+    return values[vec.data]  # -1 picks the trailing None
+
+
+def _shift(data: np.ndarray, span: _Span, sign: int) -> np.ndarray:
+    if span.unit in _FIXED_MS:
+        return data + sign * span.amount * _FIXED_MS[span.unit]
+    months = int(span.amount) * (12 if span.unit == "year" else 1) * sign
+    dates = np.where(np.isnan(data), 0, data).astype(np.int64).astype("datetime64[ms]")
+    month_start = dates.astype("datetime64[M]")
+    shifted = (month_start + months).astype("datetime64[ms]") + (dates - month_start.astype("datetime64[ms]"))
+    return np.where(np.isnan(data), np.nan, shifted.astype(np.int64).astype(np.float64))
+
+
+def _truncate(data: np.ndarray, span: _Span) -> np.ndarray:
+    if span.unit in _FIXED_MS:
+        step = span.amount * _FIXED_MS[span.unit]
+        offset = _WEEK_OFFSET_MS if span.unit == "week" else 0
+        return np.floor((data + offset) / step) * step - offset
+    step = int(span.amount) * (12 if span.unit == "year" else 1)
+    months = np.where(np.isnan(data), 0, data).astype(np.int64).astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+    truncated = (months // step * step).astype("datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+    return np.where(np.isnan(data), np.nan, truncated.astype(np.float64))
+
+
+def _output_type(vec_type: str) -> str:
+    return {"integer": "long", "float": "double"}.get(vec_type, vec_type)
+
+
+def _to_python(vec: _Vec) -> List[Any]:
+    nulls = vec.null_mask()
+    if vec.is_string:
+        dictionary = vec.dictionary
+        return [dictionary[code] if code >= 0 else None for code in vec.data.tolist()]
+    if vec.type == "date":
+        millis = np.where(nulls, 0, vec.data).astype(np.int64).astype("datetime64[ms]")
+        text = np.datetime_as_string(millis, unit="ms")
+        return [None if null else f"{value}Z" for value, null in zip(text.tolist(), nulls.tolist())]
+    if vec.type == "boolean":
+        return [None if null else value for value, null in zip(vec.data.tolist(), nulls.tolist())]
+    convert = int if vec.type in _INTEGRAL else float
+    return [None if null else convert(value) for value, null in zip(vec.data.tolist(), nulls.tolist())]
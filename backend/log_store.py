@@ -0,0 +1,345 @@
+"""
+Columnar Log Store - Memory-mapped columnar copy of greenstick-logs.
+
+Log documents are appended in memory and flushed as immutable segments of up
+to LOCAL_STORE_SEGMENT_ROWS rows, one .npy file per column, which readers open
+with mmap. Date fields are stored as float64 epoch milliseconds and numeric
+fields as float64 (NaN is null). Every other field is dictionary-encoded as
+int32 codes (-1 is null) into a store-wide, append-only dictionary, so
+segments concatenate without re-coding and equality/LIKE filters only look
+at each distinct value once. A manifest lists the committed segments; it is
+replaced atomically after a segment is written, so a crash mid-flush never
+exposes a partial segment. Buffered documents are also written to a
+per-segment append log (wal-seg-NNNNNN.jsonl) before they are buffered; it is
+deleted once its segment is in the manifest and replayed when the store is
+reopened, so a crash loses no appended rows. Readers get each column as one
+array that grows with the store: only rows appended since the last read are
+copied in, not every segment again. The store backs the local ES|QL engine
+(local_esql.py). It only holds what is appended to it: logs seeded by
+seed_data.py and logs reported through POST /incidents. Logs that other
+shippers write straight to Elasticsearch never reach it, so get_status()
+reports the newest @timestamp to make a stale copy visible. Appended logs
+without event.ingested are stamped with the append time, as the ingest
+pipeline would stamp them in Elasticsearch.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+import threading
+import numpy as np
+from bootstrap import LOGS_MAPPINGS, INGESTED_FIELD, has_ingest_time
+
+LOCAL_STORE_DIR = os.getenv(
+    "LOCAL_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".logstore")
+)
+LOCAL_STORE_SEGMENT_ROWS = int(os.getenv("LOCAL_STORE_SEGMENT_ROWS", "50000"))
+LOCAL_STORE_MIRROR = os.getenv("LOCAL_STORE_MIRROR", "false").lower() == "true"  # keep a local copy while querying Elasticsearch
+
+_MANIFEST = "manifest.json"
+_WAL_PREFIX = "wal-"
+_NUMERIC_TYPES = {"date", "double", "long", "integer", "float"}
+
+
+def _parse_date(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp() * 1000
+
+
+class Column:
+    """A column snapshot: float64 values, or int32 codes into `dictionary` for strings."""
+    __slots__ = ("type", "data", "dictionary", "index")
+
+    def __init__(self, column_type: str, data: np.ndarray, dictionary: Optional[List[str]] = None,
+                 index: Optional[Dict[str, int]] = None):
+        self.type = column_type
+        self.data = data
+        self.dictionary = dictionary
+        self.index = index  # value -> code
+
+    @property
+    def encoded(self) -> bool:
+        return self.dictionary is not None
+
+
+class LogStore:
+    """Append-only columnar store; see the module docstring."""
+
+    def __init__(self, path: str = LOCAL_STORE_DIR, segment_rows: int = LOCAL_STORE_SEGMENT_ROWS,
+                 mappings: Dict[str, Any] = LOGS_MAPPINGS):
+        self.path = path
+        self.segment_rows = segment_rows
+        self._lock = threading.Lock()
+
+        self._types: Dict[str, str] = {}  # column -> mapping type
+        self._files: Dict[str, str] = {}  # column -> file stem
+        self._dictionaries: Dict[str, List[str]] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._persisted_codes: Dict[str, int] = {}  # dictionary entries already on disk
+        self._segments: List[Tuple[str, int, Dict[str, np.ndarray]]] = []  # (name, rows, columns)
+
+        self._buffer: Dict[str, List[Any]] = {}
+        self._buffer_rows = 0
+        self._cache: Dict[str, Tuple[np.ndarray, int]] = {}  # column -> (array, rows filled)
+        self._latest_ms = np.nan  # newest @timestamp in the store
+
+        os.makedirs(os.path.join(path, "dict"), exist_ok=True)
+        self._load()
+        for name, field in mappings.get("properties", {}).items():
+            if name not in self._types:
+                self._add_column(name, field.get("type", "keyword"))
+        self._replay()
+
+    @property
+    def rows(self) -> int:
+        with self._lock:
+            return sum(rows for _, rows, _ in self._segments) + self._buffer_rows
+
+    def columns(self) -> List[str]:
+        return sorted(self._types)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "segments": len(self._segments),
+            "buffered": self._buffer_rows,
+            "columns": len(self._types),
+            "latest_timestamp": (
+                None if np.isnan(self._latest_ms)
+                else datetime.fromtimestamp(self._latest_ms / 1000, timezone.utc).isoformat()
+            ),
+            "path": self.path
+        }
+
+    def append(self, docs: List[Dict[str, Any]]):
+        """Add log documents; every time the buffer fills it is flushed as a new segment."""
+        ingested = datetime.now(timezone.utc).isoformat()
+        docs = [doc if has_ingest_time(doc) else dict(doc, **{INGESTED_FIELD: ingested}) for doc in docs]
+        with self._lock:
+            start = 0
+            while start < len(docs):
+                chunk = docs[start:start + self.segment_rows - self._buffer_rows]
+                start += len(chunk)
+                with open(self._wal_path(len(self._segments)), "a") as f:
+                    f.writelines(json.dumps(doc, default=str) + "\n" for doc in chunk)
+                self._buffer_docs(chunk)
+                if self._buffer_rows >= self.segment_rows:
+                    self._flush()
+
+    def _buffer_docs(self, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            for name, value in doc.items():
+                if name not in self._types:
+                    self._add_column(name, self._infer_type(name, value))
+            for name, column_type in self._types.items():
+                self._buffer[name].append(self._encode(name, column_type, doc.get(name)))
+            self._buffer_rows += 1
+        if docs and self._types.get("@timestamp") == "date":
+            self._note_latest(np.array(self._buffer["@timestamp"][-len(docs):], dtype=np.float64))
+
+    def _note_latest(self, timestamps: np.ndarray):
+        timestamps = timestamps[~np.isnan(timestamps)]
+        if timestamps.size:
+            self._latest_ms = float(np.fmax(self._latest_ms, timestamps.max()))
+
+    def column(self, name: str) -> Column:
+        """All rows of a column, committed segments and buffer alike."""
+        with self._lock:
+            column_type = self._types.get(name)
+            if column_type is None:
+                raise KeyError(name)
+            encoded = column_type not in _NUMERIC_TYPES
+            dtype, null = (np.int32, -1) if encoded else (np.float64, np.nan)
+
+            if len(self._segments) == 1 and not self._buffer_rows and name in self._segments[0][2]:
+                data = self._segments[0][2][name]  # a lone segment stays memory-mapped
+            else:
+                data = self._materialize(name, dtype, null)
+            return Column(column_type, data, self._dictionaries[name], self._codes[name]) if encoded else Column(column_type, data)
+
+    def _materialize(self, name: str, dtype, null) -> np.ndarray:
+        # Rows keep their position when the buffer becomes a segment, so the
+        # filled prefix stays valid and only newer rows are copied in. Earlier
+        # views are never written to: growing replaces the array.
+        total = sum(rows for _, rows, _ in self._segments) + self._buffer_rows
+        array, filled = self._cache.get(name, (None, 0))
+        if array is None or len(array) < total:
+            grown = np.empty(max(total, 2 * filled), dtype=dtype)
+            if filled:
+                grown[:filled] = array[:filled]
+            array = grown
+
+        offset = 0
+        for _, rows, columns in self._segments:
+            end = offset + rows
+            if end > filled:
+                begin = max(filled, offset)
+                array[begin:end] = columns[name][begin - offset:] if name in columns else null
+            offset = end
+        if total > filled:
+            begin = max(filled, offset)
+            array[begin:total] = np.array(self._buffer[name][begin - offset:], dtype=dtype)
+
+        self._cache[name] = (array, total)
+        return array[:total]
+
+    def flush(self):
+        """Write the buffer as a new segment."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer_rows:
+            return
+        # Dictionaries first: a segment must never reference unsaved codes
+        for name, dictionary in self._dictionaries.items():
+            start = self._persisted_codes.get(name, 0)
+            if len(dictionary) > start:
+                with open(os.path.join(self.path, "dict", f"{self._files[name]}.jsonl"), "a") as f:
+                    f.writelines(json.dumps(value) + "\n" for value in dictionary[start:])
+                self._persisted_codes[name] = len(dictionary)
+
+        segment = f"seg-{len(self._segments):06d}"
+        tmp_dir = os.path.join(self.path, segment + ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, column_type in self._types.items():
+            dtype = np.float64 if column_type in _NUMERIC_TYPES else np.int32
+            np.save(os.path.join(tmp_dir, f"{self._files[name]}.npy"), np.array(self._buffer[name], dtype=dtype))
+        target = os.path.join(self.path, segment)
+        if os.path.exists(target):
+            shutil.rmtree(target)  # left over by a flush that crashed before the manifest update
+        os.replace(tmp_dir, target)
+
+        self._segments.append((segment, self._buffer_rows, self._open_segment(segment, list(self._types))))
+        self._buffer = {name: [] for name in self._types}
+        self._buffer_rows = 0
+        self._write_manifest()
+        # The segment is committed; its append log is no longer needed
+        try:
+            os.remove(self._wal_path(len(self._segments) - 1))
+        except FileNotFoundError:
+            pass
+
+    def _wal_path(self, segment_index: int) -> str:
+        return os.path.join(self.path, f"{_WAL_PREFIX}seg-{segment_index:06d}.jsonl")
+
+    def _replay(self):
+        """Re-buffer documents appended after the last committed segment."""
+        current = os.path.basename(self._wal_path(len(self._segments)))
+        for entry in os.listdir(self.path):
+            if entry.startswith(_WAL_PREFIX) and entry != current:
+                # Left by a flush that crashed after the manifest update
+                os.remove(os.path.join(self.path, entry))
+
+        path = os.path.join(self.path, current)
+        docs, torn = [], False
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        docs.append(json.loads(line))
+                    except ValueError:
+                        torn = True  # a write cut short by the crash
+        except FileNotFoundError:
+            return
+        if torn:
+            # Rewrite without the fragment so later appends start on a clean line
+            with open(path + ".tmp", "w") as f:
+                f.writelines(json.dumps(doc) + "\n" for doc in docs)
+            os.replace(path + ".tmp", path)
+        self._buffer_docs(docs)
+        if docs:
+            print(f"[LogStore] Replayed {len(docs)} buffered logs from {current}")
+        if self._buffer_rows >= self.segment_rows:
+            self._flush()
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, _MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+
+        for name, info in manifest["columns"].items():
+            self._types[name] = info["type"]
+            self._files[name] = info["file"]
+            self._buffer[name] = []
+            dictionary: List[str] = []
+            if info["type"] not in _NUMERIC_TYPES:
+                try:
+                    with open(os.path.join(self.path, "dict", f"{info['file']}.jsonl")) as f:
+                        dictionary = [json.loads(line) for line in f if line.strip()]
+                except FileNotFoundError:
+                    pass
+                self._dictionaries[name] = dictionary
+                self._codes[name] = {value: code for code, value in enumerate(dictionary)}
+                self._persisted_codes[name] = len(dictionary)
+
+        for segment in manifest["segments"]:
+            columns = self._open_segment(segment["name"], segment["columns"])
+            self._segments.append((segment["name"], segment["rows"], columns))
+            if "@timestamp" in columns and self._types.get("@timestamp") == "date":
+                self._note_latest(np.asarray(columns["@timestamp"]))
+
+    def _open_segment(self, segment: str, names: List[str]) -> Dict[str, np.ndarray]:
+        return {
+            name: np.load(os.path.join(self.path, segment, f"{self._files[name]}.npy"), mmap_mode="r")
+            for name in names
+        }
+
+    def _write_manifest(self):
+        manifest = {
+            "columns": {name: {"type": self._types[name], "file": self._files[name]} for name in self._types},
+            "segments": [
+                {"name": segment, "rows": rows, "columns": list(columns)}
+                for segment, rows, columns in self._segments
+            ]
+        }
+        tmp_path = os.path.join(self.path, _MANIFEST + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.path, _MANIFEST))
+
+    def _add_column(self, name: str, column_type: str):
+        self._types[name] = column_type
+        self._files[name] = f"c{len(self._files)}"
+        null = np.nan if column_type in _NUMERIC_TYPES else -1
+        self._buffer[name] = [null] * self._buffer_rows
+        if column_type not in _NUMERIC_TYPES:
+            self._dictionaries[name] = []
+            self._codes[name] = {}
+
+    @staticmethod
+    def _infer_type(name: str, value: Any) -> str:
+        if name == "@timestamp":
+            return "date"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return "double"
+        return "keyword"
+
+    def _encode(self, name: str, column_type: str, value: Any):
+        if column_type == "date":
+            return np.nan if value is None else _parse_date(value)
+        if column_type in _NUMERIC_TYPES:
+            try:
+                return np.nan if value is None else float(value)
+            except (TypeError, ValueError):
+                return np.nan
+        if value is None:
+            return -1
+        value = value if isinstance(value, str) else json.dumps(value)
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._dictionaries[name])
+            self._dictionaries[name].append(value)
+        return code
@@ -1,14 +1,20 @@
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+import json
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from agent import GreenStickAgent
 from scanner import AnomalyScanner, init_scanner, get_scanner
-from tools import get_tool_definitions, execute_tool
-from elasticsearch import Elasticsearch
+from scheduler import ScanScheduler, SCAN_SCHEDULER_ENABLED
+from tools import get_tool_definitions, execute_tool, execute_tools, validate_params, TOOL_BATCH_MAX_TOOLS
+from bootstrap import bootstrap_indices
+from elasticsearch import AsyncElasticsearch
 
 # Load .env from the backend directory
 env_path = Path(__file__).parent / ".env"
@@ -18,7 +24,27 @@ load_dotenv(dotenv_path=env_path)
 print(f"ELASTIC_ENDPOINT: {os.getenv('ELASTIC_ENDPOINT', 'NOT SET')[:30]}...")
 print(f"ELASTIC_API_KEY: {'SET' if os.getenv('ELASTIC_API_KEY') else 'NOT SET'}")
 
-app = FastAPI(title="GreenStick Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Install the index layout, then run the background anomaly scan loop for the lifetime of the app."""
+    if es_client:
+        await bootstrap_indices(es_client)
+    
+    scheduler = None
+    if scanner and es_client and SCAN_SCHEDULER_ENABLED:
+        scheduler = ScanScheduler(scanner)
+        scanner.scheduler = scheduler
+        scheduler.start()
+    
+    yield
+    
+    if scheduler:
+        await scheduler.stop()
+    if es_client:
+        await es_client.close()
+    await agent.close()
+
+app = FastAPI(title="GreenStick Backend", version="0.1.0", lifespan=lifespan)
 
 # API Key for authentication
 GREENSTICK_API_KEY = os.getenv("GREENSTICK_API_KEY", "")
@@ -37,7 +63,7 @@ es_endpoint = os.getenv("ELASTIC_ENDPOINT")
 es_api_key = os.getenv("ELASTIC_API_KEY")
 
 if es_endpoint and es_api_key:
-    es_client = Elasticsearch(
+    es_client = AsyncElasticsearch(
         hosts=[es_endpoint],
         api_key=es_api_key
     )
@@ -109,15 +135,15 @@ async def get_stats(authorized: bool = Depends(verify_api_key)):
     """
     try:
         # Count active incidents (ERROR level logs)
-        error_count = es_client.count(index="greenstick-logs", body={
+        error_count = await es_client.count(index="greenstick-logs", body={
             "query": {"match": {"level": "ERROR"}}
         })
         
         # Count all anomalies (all logs)
-        total_logs = es_client.count(index="greenstick-logs")
+        total_logs = await es_client.count(index="greenstick-logs")
         
         # Count historical incidents
-        incidents_count = es_client.count(index="greenstick-incidents")
+        incidents_count = await es_client.count(index="greenstick-incidents")
         
         return {
             "active_incidents": error_count.get("count", 0),
@@ -141,7 +167,7 @@ async def get_incidents(authorized: bool = Depends(verify_api_key)):
     Get recent incidents/logs from Elasticsearch.
     """
     try:
-        response = es_client.search(index="greenstick-logs", body={
+        response = await es_client.search(index="greenstick-logs", body={
             "query": {"match_all": {}},
             "size": 20,
             "sort": [{"@timestamp": {"order": "desc"}}]
@@ -178,6 +204,28 @@ async def analyze_incident(incident_id: str, authorized: bool = Depends(verify_a
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/agent/analyze/stream")
+async def analyze_incident_stream(incident_id: str, authorized: bool = Depends(verify_api_key)):
+    """
+    Server-Sent Events variant of /agent/analyze. Emits each stage as soon as
+    it completes: anomalies, history, correlations, plan_token (streamed
+    Gemini output), plan, execution, audit and finally result (or error).
+    """
+    async def events():
+        # Sent immediately so clients see the stream open before any ES query runs
+        yield ": analysis started\n\n"
+        try:
+            async for event, data in agent.analyze_incident_events(incident_id, stream_plan=True):
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/agent/history")
 async def get_history(authorized: bool = Depends(verify_api_key)):
     """
@@ -191,8 +239,18 @@ async def get_agent_status(authorized: bool = Depends(verify_api_key)):
     Get current scanner/agent status.
     """
     if scanner:
-        return scanner.get_status()
-    return {"status": "not_initialized", "is_scanning": False}
+        status = scanner.get_status()
+    else:
+        status = {"status": "not_initialized", "is_scanning": False}
+    status["history_index"] = agent.history_index.get_status()
+    status["plan_cache"] = agent.plan_cache.get_status()
+    status["playbooks"] = agent.playbooks.get_status()
+    status["llm"] = agent.llm_guard.get_status()
+    status["query_cache"] = agent.query_cache.get_status()
+    status["log_store"] = agent.log_store.get_status() if agent.log_store else None
+    status["plan_batcher"] = agent.plan_batcher.get_status() if agent.plan_batcher else None
+    status["audit_writer"] = agent.audit_writer.get_status() if agent.audit_writer else None
+    return status
 
 @app.post("/agent/scan")
 async def trigger_scan(authorized: bool = Depends(verify_api_key)):
@@ -220,12 +278,13 @@ async def report_incident(incident: NewIncident, authorized: bool = Depends(veri
     """
     Report a new incident/log entry.
     """
-    if not es_client:
+    if not es_client and not agent.log_store:
         raise HTTPException(status_code=503, detail="Elasticsearch not configured")
     
     try:
         from datetime import datetime
         import random
+        import uuid
         
         trace_id = incident.trace_id or f"trace-{random.choice(['hq', 'us', 'eu'])}-{random.randint(100, 999)}"
         
@@ -237,11 +296,16 @@ async def report_incident(incident: NewIncident, authorized: bool = Depends(veri
             "trace_id": trace_id
         }
         
-        result = es_client.index(index="greenstick-logs", document=doc, refresh=True)
+        doc_id = uuid.uuid4().hex
+        if es_client:
+            result = await es_client.index(index="greenstick-logs", document=doc, op_type="create", refresh=True)
+            doc_id = result["_id"]
+        if agent.log_store:
+            agent.log_store.append([doc])
         
         return {
             "success": True,
-            "id": result["_id"],
+            "id": doc_id,
             "trace_id": trace_id,
             "message": f"Incident reported for {incident.service}"
         }
@@ -260,56 +324,56 @@ async def list_esql_tools(authorized: bool = Depends(verify_api_key)):
     return {"tools": get_tool_definitions()}
 
 @app.get("/esql/error-trends")
-async def get_error_trends(hours: int = 24, authorized: bool = Depends(verify_api_key)):
+async def get_error_trends(hours: int = 24, columnar: bool = False, authorized: bool = Depends(verify_api_key)):
     """
     Get error trends over time using ES|QL.
     """
     try:
-        results = agent.esql_error_trends(hours)
+        results = await agent.esql_error_trends(hours, columnar)
         return {"hours": hours, "trends": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/esql/service-health")
-async def get_service_health(authorized: bool = Depends(verify_api_key)):
+async def get_service_health(columnar: bool = False, authorized: bool = Depends(verify_api_key)):
     """
     Get service health summary using ES|QL.
     """
     try:
-        results = agent.esql_service_health()
+        results = await agent.esql_service_health(columnar)
         return {"services": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/esql/trace/{trace_id}")
-async def trace_request(trace_id: str, authorized: bool = Depends(verify_api_key)):
+async def trace_request(trace_id: str, columnar: bool = False, authorized: bool = Depends(verify_api_key)):
     """
     Trace a request through services using ES|QL.
     """
     try:
-        results = agent.esql_trace_analysis(trace_id)
+        results = await agent.esql_trace_analysis(trace_id, columnar)
         return {"trace_id": trace_id, "events": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/esql/anomalies")
-async def detect_anomalies(authorized: bool = Depends(verify_api_key)):
+async def detect_anomalies(columnar: bool = False, authorized: bool = Depends(verify_api_key)):
     """
     Detect services with unusual error rates using ES|QL.
     """
     try:
-        results = agent.esql_anomaly_detection()
+        results = await agent.esql_anomaly_detection(columnar)
         return {"anomalies": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/esql/correlations")
-async def get_correlations(timeframe_minutes: int = 60, authorized: bool = Depends(verify_api_key)):
+async def get_correlations(timeframe_minutes: int = 60, columnar: bool = False, authorized: bool = Depends(verify_api_key)):
     """
     Find correlated errors across multiple services (Cascading Failures).
     """
     try:
-        results = agent.esql_correlated_errors(timeframe_minutes)
+        results = await agent.esql_correlated_errors(timeframe_minutes, columnar)
         return {"timeframe_minutes": timeframe_minutes, "correlations": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -317,23 +381,64 @@ async def get_correlations(timeframe_minutes: int = 60, authorized: bool = Depen
 class ToolExecutionRequest(BaseModel):
     tool_id: str
     params: Dict[str, Any]
+    columnar: bool = False  # column arrays instead of one object per row
 
 @app.post("/esql/execute-tool")
 async def execute_esql_tool(request: ToolExecutionRequest, authorized: bool = Depends(verify_api_key)):
     """
     Execute a specific ES|QL-powered tool with parameters.
     """
-    if not es_client:
+    if not agent.esql_backend:
         raise HTTPException(status_code=503, detail="Elasticsearch not configured")
     
     try:
-        results = execute_tool(request.tool_id, request.params, es_client)
+        results = await execute_tool(
+            request.tool_id, request.params, agent.esql_backend, cache=agent.query_cache, columnar=request.columnar
+        )
         return {"tool_id": request.tool_id, "results": results}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class ToolInvocation(BaseModel):
+    tool_id: str
+    params: Dict[str, Any] = {}
+
+class ToolBatchRequest(BaseModel):
+    tools: List[ToolInvocation]
+    columnar: bool = False
+
+@app.post("/esql/execute-tools")
+async def execute_esql_tools(request: ToolBatchRequest, authorized: bool = Depends(verify_api_key)):
+    """
+    Execute several ES|QL tools concurrently in one request.
+    Every parameter set is validated before anything runs; the response has
+    per-tool results or errors and timings, in request order.
+    """
+    if not agent.esql_backend:
+        raise HTTPException(status_code=503, detail="Elasticsearch not configured")
+    if not request.tools or len(request.tools) > TOOL_BATCH_MAX_TOOLS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {TOOL_BATCH_MAX_TOOLS} tools")
+    
+    invocations = []
+    errors = []
+    for index, invocation in enumerate(request.tools):
+        try:
+            invocations.append((invocation.tool_id, validate_params(invocation.tool_id, invocation.params)))
+        except ValueError as e:
+            errors.append({"index": index, "tool_id": invocation.tool_id, "error": str(e)})
+    if errors:
+        raise HTTPException(status_code=400, detail={"errors": errors})
+    
+    started = time.perf_counter()
+    results = await execute_tools(invocations, agent.esql_backend, cache=agent.query_cache, columnar=request.columnar)
+    return {
+        "results": results,
+        "failed": sum(1 for entry in results if entry["status"] == "error"),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
 # ============ End ES|QL Endpoints ============
 
 
@@ -354,11 +459,7 @@ async def get_audit_logs(authorized: bool = Depends(verify_api_key)):
         return {"total": 0, "logs": [], "error": "Elasticsearch not configured"}
     
     try:
-        # Check if index exists, create if not
-        if not es_client.indices.exists(index="greenstick-audit"):
-            return {"total": 0, "logs": []}
-        
-        response = es_client.search(index="greenstick-audit", body={
+        response = await es_client.search(index="greenstick-audit", ignore_unavailable=True, body={
             "query": {"match_all": {}},
             "size": 50,
             "sort": [{"@timestamp": {"order": "desc"}}]
@@ -387,32 +488,17 @@ async def get_audit_logs(authorized: bool = Depends(verify_api_key)):
         return {"total": 0, "logs": [], "error": str(e)}
 
 @app.post("/audit-logs")
-async def create_audit_log(entry: AuditLogEntry, authorized: bool = Depends(verify_api_key)):
+async def create_audit_log(entry: AuditLogEntry, wait: bool = True, authorized: bool = Depends(verify_api_key)):
     """
-    Create a new audit log entry.
+    Create a new audit log entry. With wait=false the entry is only queued for
+    the next bulk write instead of being written (and searchable) on return.
     """
-    if not es_client:
+    if not es_client or not agent.audit_writer:
         raise HTTPException(status_code=503, detail="Elasticsearch not configured")
     
     try:
         from datetime import datetime
         
-        # Create index if not exists
-        if not es_client.indices.exists(index="greenstick-audit"):
-            es_client.indices.create(index="greenstick-audit", body={
-                "mappings": {
-                    "properties": {
-                        "@timestamp": {"type": "date"},
-                        "trace_id": {"type": "keyword"},
-                        "action_type": {"type": "keyword"},
-                        "description": {"type": "text"},
-                        "confidence": {"type": "float"},
-                        "status": {"type": "keyword"},
-                        "metadata": {"type": "object", "enabled": True}
-                    }
-                }
-            })
-        
         doc = {
             "@timestamp": datetime.utcnow().isoformat() + "Z",
             "trace_id": entry.trace_id,
@@ -423,11 +509,11 @@ async def create_audit_log(entry: AuditLogEntry, authorized: bool = Depends(veri
             "metadata": entry.metadata or {}
         }
         
-        result = es_client.index(index="greenstick-audit", document=doc, refresh=True)
+        log_id = await agent.audit_writer.write(doc, wait=wait)
         
         return {
             "success": True,
-            "id": result["_id"]
+            "id": log_id
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -447,18 +533,26 @@ async def update_audit_log_status(log_id: str, update: UpdateAuditStatus, author
         raise HTTPException(status_code=400, detail="Status must be 'approved', 'rejected', or 'pending'")
     
     try:
-        es_client.update(
+        if agent.audit_writer:
+            # Entries are written behind; make sure this one is indexed and searchable first
+            await agent.audit_writer.settle(log_id)
+        # Documents live in the data stream's backing indices, so update by id via query
+        result = await es_client.update_by_query(
             index="greenstick-audit",
-            id=log_id,
-            body={"doc": {"status": update.status}},
+            query={"ids": {"values": [log_id]}},
+            script={"source": "ctx._source.status = params.status", "params": {"status": update.status}},
             refresh=True
         )
+        if result.get("updated", 0) == 0:
+            raise HTTPException(status_code=404, detail=f"Audit log {log_id} not found")
         
         return {
             "success": True,
             "id": log_id,
             "status": update.status
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,223 @@
+"""
+Plan Batcher - Coalesces concurrent remediation-plan requests into one Gemini call.
+
+While a scan analyzes several anomalies at once, each _generate_plan call
+submits its prompt sections here instead of calling the model directly.
+Submissions arriving within PLAN_BATCH_WINDOW_MS are packed into a single
+structured prompt (instructions once, shared sections once, incidents
+numbered) until PLAN_BATCH_MAX_INCIDENTS or PLAN_BATCH_TOKEN_BUDGET would be
+exceeded. The model answers with one plan per incident number; any incident
+missing or malformed in that answer falls back to its own single call. If
+the batched call itself times out or the circuit is open, every incident gets
+the degraded plan instead: retrying each one would only double the wait and
+send N calls to a model that is already unavailable.
+
+A batch only forms from requests that are waiting at the same time. The
+scanner runs at most SCAN_ANALYSIS_CONCURRENCY analyses at once, so scan
+batches hold at most that many incidents whatever PLAN_BATCH_MAX_INCIDENTS
+says. The batched call takes a single LLMGuard slot, whereas unbatched plans
+queue for LLM_MAX_CONCURRENCY slots and wait one model round trip per
+LLM_MAX_CONCURRENCY incidents. Per-incident fallbacks go back through the
+guard and queue for those slots under the same deadline.
+"""
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+import asyncio
+import json
+import os
+from compaction import estimate_tokens
+from llm_guard import CircuitOpenError
+
+PLAN_BATCH_ENABLED = os.getenv("PLAN_BATCH_ENABLED", "false").lower() == "true"
+PLAN_BATCH_WINDOW_MS = float(os.getenv("PLAN_BATCH_WINDOW_MS", "50"))  # wait for more incidents to join a batch
+PLAN_BATCH_MAX_INCIDENTS = int(os.getenv("PLAN_BATCH_MAX_INCIDENTS", "10"))
+PLAN_BATCH_TOKEN_BUDGET = int(os.getenv("PLAN_BATCH_TOKEN_BUDGET", "24000"))  # prompt tokens per batch
+
+PLAN_ACTIONS = ["ROLLBACK", "SCALE_UP", "RESTART_SERVICE", "CREATE_TICKET", "MANUAL_INVESTIGATION"]
+
+Sections = Dict[str, str]  # prompt section title -> JSON text
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove a ```json ... ``` wrapper around a model response."""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:-3]
+    elif text.startswith("```"):
+        text = text[3:-3]
+    return text
+
+
+def parse_batch_plans(text: str, count: int) -> Dict[int, Dict[str, Any]]:
+    """Map incident number -> plan for every well-formed plan in a batch response."""
+    data = json.loads(strip_code_fence(text))
+    entries = data.get("plans", []) if isinstance(data, dict) else data
+    plans: Dict[int, Dict[str, Any]] = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        number = entry.pop("incident", None)
+        if (
+            isinstance(number, int) and 0 <= number < count and number not in plans
+            and isinstance(entry.get("action"), str)
+            and isinstance(entry.get("confidence"), (int, float))
+        ):
+            plans[number] = entry
+    return plans
+
+
+class _Pending:
+    __slots__ = ("sections", "tokens", "future")
+
+    def __init__(self, sections: Sections, tokens: int, future: asyncio.Future):
+        self.sections = sections
+        self.tokens = tokens
+        self.future = future
+
+
+class PlanBatcher:
+    """Micro-batches plan requests; see the module docstring."""
+
+    def __init__(self, call_model: Callable[[str], Awaitable[str]],
+                 plan_single: Callable[[Sections], Awaitable[Dict[str, Any]]],
+                 degraded_plan: Callable[[Exception], Dict[str, Any]],
+                 window_ms: float = PLAN_BATCH_WINDOW_MS, max_incidents: int = PLAN_BATCH_MAX_INCIDENTS,
+                 token_budget: int = PLAN_BATCH_TOKEN_BUDGET):
+        self.call_model = call_model
+        self.plan_single = plan_single
+        self.degraded_plan = degraded_plan
+        self.window = window_ms / 1000
+        self.max_incidents = max_incidents
+        self.token_budget = token_budget
+
+        self._pending: List[_Pending] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+        self.batches = 0
+        self.batched_incidents = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+        self.degraded = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "batched_incidents": self.batched_incidents,
+            "single_calls": self.single_calls,
+            "fallbacks": self.fallbacks,
+            "degraded": self.degraded,
+            "pending": len(self._pending)
+        }
+
+    async def plan(self, sections: Sections) -> Dict[str, Any]:
+        """Plan for one incident, possibly answered as part of a batch."""
+        tokens = sum(estimate_tokens(text) for text in sections.values())
+        if tokens > self.token_budget:
+            self.single_calls += 1
+            return await self.plan_single(sections)
+
+        loop = asyncio.get_running_loop()
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+
+        item = _Pending(sections, tokens, loop.create_future())
+        self._pending.append(item)
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_incidents:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await item.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Pending]):
+        if len(batch) == 1:
+            self.single_calls += 1
+            await self._resolve_single(batch[0])
+            return
+
+        plans: Dict[int, Dict[str, Any]] = {}
+        try:
+            text = await self.call_model(self._batch_prompt([item.sections for item in batch]))
+            plans = parse_batch_plans(text, len(batch))
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            print(f"[PlanBatcher] Model unavailable, degrading batch of {len(batch)}: {e!r}")
+            self.degraded += len(batch)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_result(self.degraded_plan(e))
+            return
+        except Exception as e:
+            print(f"[PlanBatcher] Batch of {len(batch)} failed, falling back to single calls: {e}")
+        self.batches += 1
+        self.batched_incidents += len(plans)
+
+        retry = []
+        for number, item in enumerate(batch):
+            if number in plans:
+                if not item.future.done():
+                    item.future.set_result(plans[number])
+            else:
+                retry.append(item)
+        self.fallbacks += len(retry)
+        await asyncio.gather(*(self._resolve_single(item) for item in retry))
+
+    async def _resolve_single(self, item: _Pending):
+        if item.future.done():  # the caller gave up (e.g. analysis timeout)
+            return
+        try:
+            plan = await self.plan_single(item.sections)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(plan)
+
+    @staticmethod
+    def _batch_prompt(batch: List[Sections]) -> str:
+        # Sections identical across every incident (typically the global
+        # correlations) are sent once instead of per incident.
+        titles = list(batch[0])
+        shared = [title for title in titles if all(sections.get(title) == batch[0][title] for sections in batch)]
+
+        lines = [
+            "You are a Site Reliability Engineer Agent.",
+            "",
+            f"Analyze each of the {len(batch)} incidents below independently and recommend a remediation plan for each.",
+            ""
+        ]
+        if shared:
+            lines.append("Context shared by all incidents:")
+            lines.extend(f"- {title}: {batch[0][title]}" for title in shared)
+            lines.append("")
+        for number, sections in enumerate(batch):
+            lines.append(f"Incident {number}:")
+            lines.extend(f"- {title}: {text}" for title, text in sections.items() if title not in shared)
+            lines.append("")
+        lines.extend([
+            "Output JSON format, one entry per incident:",
+            "{",
+            '    "plans": [',
+            "        {",
+            '            "incident": <incident number>,',
+            '            "action": ' + " | ".join(f'"{action}"' for action in PLAN_ACTIONS) + ",",
+            '            "confidence": 0.0-1.0,',
+            '            "reasoning": "Brief explanation",',
+            '            "steps": ["step 1", "step 2"]',
+            "        }",
+            "    ]",
+            "}"
+        ])
+        return "\n".join(lines)
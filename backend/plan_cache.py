@@ -0,0 +1,143 @@
+"""
+Plan Cache - Reuses Gemini remediation plans for effectively identical incidents.
+
+Plans are keyed on a canonical fingerprint of the prompt inputs: messages are
+reduced to their templates (ids, counts, addresses masked), timestamps and
+trace/document ids are dropped, and numbers are bucketed by magnitude, so
+the same incident seen minutes later hashes to the same key. Entries live in
+an in-memory LRU with a TTL and, when PLAN_CACHE_DB is set, in a SQLite file
+that survives restarts.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from templates import mask_message
+
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "3600"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "512"))
+PLAN_CACHE_DB = os.getenv("PLAN_CACHE_DB", "")  # SQLite path; empty keeps the cache in memory only
+
+# Fields that differ between otherwise identical incidents
+_VOLATILE_KEYS = {"@timestamp", "timestamp", "trace_id", "id", "_id"}
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items() if key not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    if isinstance(value, str):
+        return mask_message(value)
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        # Order of magnitude only: 40 and 45 errors plan the same way
+        return f"~2^{int(math.log2(abs(value) + 1))}"
+    return str(value)
+
+
+def plan_fingerprint(incident: List[Dict[str, Any]], history: List[Dict[str, Any]],
+                     correlations: List[Dict[str, Any]]) -> str:
+    """Stable key for a set of prompt inputs."""
+    # Distinct log shapes, so ten copies of one error match three copies
+    logs = sorted({json.dumps(_canonical(log), sort_keys=True) for log in incident})
+    canonical = {
+        "incident": logs,
+        "history": [_canonical(doc) for doc in history],
+        "correlations": [_canonical(row) for row in correlations]
+    }
+    encoded = json.dumps(canonical, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PlanCache:
+    """Fingerprint -> plan, as an LRU with TTL plus an optional SQLite store."""
+
+    def __init__(self, ttl: float = PLAN_CACHE_TTL_SECONDS, max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+                 db_path: str = PLAN_CACHE_DB):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                self._db = self._open(db_path)
+            except sqlite3.Error as e:
+                print(f"[PlanCache] Persistent store disabled, failed to open {db_path}: {e}")
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, created REAL NOT NULL)")
+        db.execute("DELETE FROM plans WHERE created < ?", (time.time() - self.ttl,))
+        db.commit()
+        return db
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached plan for the fingerprint, or None if missing or expired."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            plan, created = entry
+            if now - created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return plan
+            del self._entries[key]
+
+        if self._db is not None:
+            try:
+                row = self._db.execute(
+                    "SELECT plan, created FROM plans WHERE key = ? AND created >= ?", (key, now - self.ttl)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"[PlanCache] Lookup failed: {e}")
+                row = None
+            if row is not None:
+                plan = json.loads(row[0])
+                self._remember(key, plan, row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return plan
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, plan: Dict[str, Any]):
+        """Store a plan under its fingerprint."""
+        created = time.time()
+        self._remember(key, plan, created)
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO plans (key, plan, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(plan), created)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[PlanCache] Failed to persist plan: {e}")
+
+    def _remember(self, key: str, plan: Dict[str, Any], created: float):
+        self._entries[key] = (plan, created)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_status(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None,
+            "ttl_seconds": self.ttl
+        }
@@ -0,0 +1,195 @@
+"""
+Remediation Playbooks - Deterministic plans for well-known incident signatures.
+
+Each playbook is a signature rule (keyword or regex, compiled together into
+one RuleEngine) plus the plan it maps to: action, confidence, reasoning and
+steps, in the same schema the model produces. Signatures are matched against
+the masked templates of the incident's distinct messages, so variable parts
+(ids, counts, durations) never affect a match. Only playbooks matching the
+incident's primary template (its most frequent ERROR template, first
+occurrence breaking ties) or a majority of its messages are considered, so
+a context error logged alongside the failure cannot pick the remediation.
+A playbook can be limited to
+some services, and gains PLAYBOOK_HISTORY_BOOST confidence when a similar
+historical incident mentions one of its history_keywords. The agent uses
+the best match at or above PLAYBOOK_MIN_CONFIDENCE and only asks the model
+when nothing (confident enough) matches.
+"""
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
+import json
+import os
+import re
+from rules import Rule, RuleEngine
+from templates import mask_message
+
+PLAYBOOKS_FILE = os.getenv(
+    "PLAYBOOKS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "playbooks.json")
+)
+PLAYBOOK_MIN_CONFIDENCE = float(os.getenv("PLAYBOOK_MIN_CONFIDENCE", "0.75"))  # below this the model is asked
+PLAYBOOK_HISTORY_BOOST = 0.1  # added when a similar past incident matches the playbook
+PLAYBOOK_MAX_CONFIDENCE = 0.99
+
+
+@dataclass
+class Playbook:
+    """A signature and the remediation plan it maps to."""
+    id: str
+    pattern: str
+    action: str
+    confidence: float
+    reasoning: str
+    steps: List[str]
+    kind: str = "keyword"
+    services: List[str] = field(default_factory=list)  # empty: any service
+    history_keywords: List[str] = field(default_factory=list)
+
+    def plan(self, confidence: float) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "confidence": confidence,
+            "reasoning": self.reasoning,
+            "steps": list(self.steps)
+        }
+
+
+class PlaybookEngine:
+    """
+    Matches an incident against every playbook signature in one pass per
+    distinct message template. Reloads the playbook file when it changes.
+    """
+
+    def __init__(self, playbooks: List[Playbook], source_path: Optional[str] = None):
+        self.source_path = source_path
+        self._source_mtime = RuleEngine._mtime(source_path)
+        self._compile(playbooks)
+        self.matches = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "PlaybookEngine":
+        return cls(load_playbooks(path), source_path=path)
+
+    @property
+    def playbooks(self) -> List[Playbook]:
+        return self._state[0]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "playbooks": len(self.playbooks),
+            "min_confidence": PLAYBOOK_MIN_CONFIDENCE,
+            "matches": self.matches,
+            "misses": self.misses
+        }
+
+    def _compile(self, playbooks: List[Playbook]):
+        engine = RuleEngine([Rule(id=playbook.id, pattern=playbook.pattern, kind=playbook.kind) for playbook in playbooks])
+        self._state = (list(playbooks), engine)
+
+    def match(self, incident: List[Dict[str, Any]], history: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Best matching playbook for the incident as
+        {"playbook": id, "confidence": float, "plan": {...}}, or None.
+        A playbook qualifies if it matches the primary template or more than
+        half of the messages; the highest confidence among those wins.
+        The confidence is not checked against PLAYBOOK_MIN_CONFIDENCE here.
+        """
+        playbooks, engine = self._state
+        history_text = " ".join(
+            f"{doc.get('description', '')} {doc.get('root_cause', '')}" for doc in history or []
+        ).lower()
+
+        # Distinct (template, service) keys in first-appearance order, with counts
+        counts: Dict[tuple, int] = {}
+        error_counts: Dict[tuple, int] = {}
+        for log in incident:
+            message = log.get("message")
+            if not message:
+                continue
+            key = (mask_message(message), log.get("service"))
+            counts[key] = counts.get(key, 0) + 1
+            if log.get("level") == "ERROR":
+                error_counts[key] = error_counts.get(key, 0) + 1
+        if not counts:
+            self.misses += 1
+            return None
+
+        ranked = error_counts or counts
+        primary = max(ranked, key=ranked.get)  # first key wins ties
+        total = sum(counts.values())
+
+        coverage: Dict[int, int] = {}
+        primary_matches = set()
+        for key, count in counts.items():
+            for index in engine.match(key[0]):
+                playbook = playbooks[index]
+                if playbook.services and key[1] not in playbook.services:
+                    continue
+                coverage[index] = coverage.get(index, 0) + count
+                if key == primary:
+                    primary_matches.add(index)
+
+        best = None
+        for index, covered in coverage.items():
+            if index not in primary_matches and covered * 2 <= total:
+                continue
+            playbook = playbooks[index]
+            confidence = playbook.confidence
+            if any(keyword.lower() in history_text for keyword in playbook.history_keywords):
+                confidence = min(PLAYBOOK_MAX_CONFIDENCE, confidence + PLAYBOOK_HISTORY_BOOST)
+            if best is None or confidence > best[1]:
+                best = (playbook, confidence)
+
+        if best is None:
+            self.misses += 1
+            return None
+        self.matches += 1
+        playbook, confidence = best
+        return {"playbook": playbook.id, "confidence": round(confidence, 2), "plan": playbook.plan(round(confidence, 2))}
+
+    def reload_if_changed(self) -> bool:
+        """Reload from the source file if it changed on disk. Returns True on reload."""
+        if not self.source_path:
+            return False
+
+        mtime = RuleEngine._mtime(self.source_path)
+        if mtime is None or mtime == self._source_mtime:
+            return False
+
+        try:
+            self._compile(load_playbooks(self.source_path))
+        except (OSError, ValueError, TypeError, re.error) as e:
+            print(f"[Playbooks] Keeping previous playbooks, failed to reload {self.source_path}: {e}")
+            return False
+        self._source_mtime = mtime
+        print(f"[Playbooks] Reloaded {len(self.playbooks)} playbooks from {self.source_path}")
+        return True
+
+
+def load_playbooks(path: str) -> List[Playbook]:
+    """
+    Load playbooks from a JSON file, either a list of playbook objects or
+    {"playbooks": [...]}. Each needs a "pattern", "action" and "confidence".
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    entries: List[Dict[str, Any]] = data.get("playbooks", []) if isinstance(data, dict) else data
+    playbooks = []
+    for entry in entries:
+        missing = [key for key in ("pattern", "action", "confidence") if key not in entry]
+        if missing:
+            raise ValueError(f"Playbook missing {', '.join(missing)} in {path}: {entry}")
+        playbooks.append(Playbook(
+            id=entry.get("id", entry["pattern"]),
+            pattern=entry["pattern"],
+            action=entry["action"],
+            confidence=float(entry["confidence"]),
+            reasoning=entry.get("reasoning", f"Matched playbook {entry.get('id', entry['pattern'])}."),
+            steps=list(entry.get("steps", [])),
+            kind=entry.get("kind", "keyword"),
+            services=list(entry.get("services", [])),
+            history_keywords=list(entry.get("history_keywords", []))
+        ))
+    return playbooks
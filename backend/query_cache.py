@@ -0,0 +1,132 @@
+"""
+Query Cache - Shared ES|QL result cache for the dashboard endpoints and tools.
+
+Results are keyed on the normalized query text (whitespace collapsed) plus a
+time bucket of QUERY_CACHE_BUCKET_SECONDS, so every viewer polling the same
+panel within a bucket is answered from one Elasticsearch request:
+- A hit in the current bucket is served directly. In the last
+  QUERY_CACHE_REFRESH_AHEAD_SECONDS of the bucket, the next bucket's entry is
+  fetched in the background, so continuous polling never waits.
+- With only the previous bucket's entry present, that entry is served
+  (stale-while-revalidate) while the current one is fetched in the background.
+  Nothing older than one bucket back is ever served.
+- On a miss, concurrent identical requests share a single in-flight fetch.
+Failed fetches are never cached. QUERY_CACHE_BUCKET_SECONDS=0 disables the cache.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Awaitable, Tuple
+import asyncio
+import os
+import time
+
+QUERY_CACHE_BUCKET_SECONDS = float(os.getenv("QUERY_CACHE_BUCKET_SECONDS", "30"))
+QUERY_CACHE_REFRESH_AHEAD_SECONDS = float(os.getenv("QUERY_CACHE_REFRESH_AHEAD_SECONDS", "5"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+
+Key = Tuple[str, str, int]  # (result shape, normalized query, bucket)
+
+
+def normalize_query(query: str) -> str:
+    """Query text with insignificant whitespace collapsed."""
+    return " ".join(query.split())
+
+
+class QueryCache:
+    """Bucketed result cache with refresh-ahead and request coalescing."""
+
+    def __init__(self, bucket_seconds: float = QUERY_CACHE_BUCKET_SECONDS,
+                 refresh_ahead: float = QUERY_CACHE_REFRESH_AHEAD_SECONDS,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.bucket_seconds = bucket_seconds
+        self.refresh_ahead = refresh_ahead
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Key, Any]" = OrderedDict()
+        self._inflight: Dict[Key, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.fetch_failures = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "fetch_failures": self.fetch_failures,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            "bucket_seconds": self.bucket_seconds
+        }
+
+    async def get(self, query: str, fetch: Callable[[], Awaitable[Any]], shape: str = "rows") -> Any:
+        """
+        Cached result for the query, calling fetch() when it has to be loaded.
+        shape tells apart results of the same query in different formats.
+        Results are shared between callers and must not be mutated.
+        """
+        if self.bucket_seconds <= 0:
+            return await fetch()
+
+        now = time.time()
+        query = normalize_query(query)
+        bucket = int(now // self.bucket_seconds)
+        current = (shape, query, bucket)
+
+        if current in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(current)
+            if (bucket + 1) * self.bucket_seconds - now <= self.refresh_ahead:
+                self._refresh((shape, query, bucket + 1), fetch)
+            return self._entries[current]
+
+        previous = (shape, query, bucket - 1)
+        if previous in self._entries:
+            self.stale_hits += 1
+            self._refresh(current, fetch)
+            return self._entries[previous]
+
+        if current in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        # Shielded: a caller giving up must not cancel the fetch other callers share
+        return await asyncio.shield(self._load(current, fetch))
+
+    def _refresh(self, key: Key, fetch: Callable[[], Awaitable[Any]]):
+        if key not in self._inflight and key not in self._entries:
+            self.refreshes += 1
+            self._load(key, fetch)
+
+    def _load(self, key: Key, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            task.add_done_callback(self._fetch_done)
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: Key, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        # Entries from older buckets can never be served again
+        for stale in [entry for entry in self._entries if entry[:2] == key[:2] and entry[2] < key[2] - 1]:
+            del self._entries[stale]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def _fetch_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.fetch_failures += 1
+            print(f"[QueryCache] Fetch failed: {task.exception()}")
@@ -0,0 +1,246 @@
+"""
+Critical Signature Rules - Compiled multi-pattern matcher for log messages.
+
+All keyword rules are compiled into a single trie-shaped regex (one branch
+per distinct prefix, so the regex engine never re-tries shared prefixes and
+gets a first-character prefilter for free). One scan of the lowercased
+message finds the longest keyword at each match position; a precomputed
+containment closure expands that to every keyword it contains. Regex rules
+share one combined prefilter and are only evaluated individually when that
+prefilter hits. Rule sets can be loaded from a JSON file and reloaded
+when the file changes.
+
+For batches, match_key() matches a message's digit key (every digit read as
+0) once for all the messages sharing it. A rule without digits in its
+pattern matches a message exactly when it matches the message's key. Rules
+with digits are checked against the key with their own digits read as 0,
+which every matching message passes; only messages whose key passes need
+matching one by one.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass, replace
+import json
+import os
+import re
+
+_DIGITS = "0123456789"
+DIGIT_KEY = str.maketrans(_DIGITS, "0" * len(_DIGITS))
+# Literal digits in a regex, skipping escapes and counted repetitions ({2,3})
+_REGEX_DIGITS = re.compile(r"\\(?:x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)|\{[^}]*\}|([0-9])")
+
+
+def digit_key(message: str) -> str:
+    """The message with every digit replaced by 0; messages differing only in digit values share a key."""
+    return message.translate(DIGIT_KEY)
+
+
+@dataclass
+class Rule:
+    """A single critical signature."""
+    id: str
+    pattern: str
+    kind: str = "keyword"  # "keyword" (case-insensitive substring) or "regex"
+    description: str = ""
+
+
+class RuleEngine:
+    """
+    Matches log messages against a rule set in a single pass per message.
+    match() returns the indexes of every matching rule in rule-set order, so
+    the first entry is the highest-priority rule.
+    """
+
+    def __init__(self, rules: List[Rule], source_path: Optional[str] = None):
+        self.source_path = source_path
+        self._source_mtime = self._mtime(source_path)
+        self._compile(rules)
+
+    @classmethod
+    def from_keywords(cls, keywords: List[str]) -> "RuleEngine":
+        return cls([Rule(id=keyword, pattern=keyword) for keyword in keywords])
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleEngine":
+        return cls(load_rules(path), source_path=path)
+
+    @property
+    def rules(self) -> List[Rule]:
+        return self._state[0]
+
+    def _compile(self, rules: List[Rule]):
+        relaxed = [_digit_relaxed(rule) for rule in rules]
+        digit_bound = frozenset(index for index, rule in enumerate(rules) if relaxed[index] is not rule)
+        # Swapped in one assignment so a reload never exposes a half-built state
+        self._state = (list(rules), _build_matcher(rules), _build_matcher(relaxed), digit_bound)
+
+    def match(self, message: str) -> List[int]:
+        """Return the indexes of all rules matching the message, in rule order."""
+        return _match(self._state[1], message)
+
+    def match_key(self, key: str) -> Optional[List[int]]:
+        """
+        Match a digit key (see digit_key) on behalf of every message sharing
+        it. Returns the indexes of the rules matching all of them, or None when
+        a rule with digits may match only some, so each needs match().
+        """
+        _, _, key_matcher, digit_bound = self._state
+        matched = _match(key_matcher, key)
+        if any(index in digit_bound for index in matched):
+            return None
+        return matched
+
+    def match_ids(self, message: str) -> List[str]:
+        """Return the ids of all rules matching the message, in rule order."""
+        rules = self.rules
+        return [rules[index].id for index in self.match(message)]
+
+    def reload_if_changed(self) -> bool:
+        """Recompile from the source file if it changed on disk. Returns True on reload."""
+        if not self.source_path:
+            return False
+
+        mtime = self._mtime(self.source_path)
+        if mtime is None or mtime == self._source_mtime:
+            return False
+
+        try:
+            self._compile(load_rules(self.source_path))
+        except (OSError, ValueError, re.error) as e:
+            print(f"[Rules] Keeping previous rule set, failed to reload {self.source_path}: {e}")
+            return False
+        self._source_mtime = mtime
+        print(f"[Rules] Reloaded {len(self.rules)} rules from {self.source_path}")
+        return True
+
+    @staticmethod
+    def _mtime(path: Optional[str]) -> Optional[float]:
+        if not path:
+            return None
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+
+def _build_matcher(rules: List[Rule]) -> Tuple[Any, ...]:
+    """Compiled matching state for a rule set (see RuleEngine.match)."""
+    keyword_rules: Dict[str, List[int]] = {}
+    regex_rules: List[Tuple[int, re.Pattern]] = []
+
+    for index, rule in enumerate(rules):
+        if rule.kind == "keyword":
+            if not rule.pattern:
+                raise ValueError(f"Empty keyword for rule {rule.id}")
+            keyword_rules.setdefault(rule.pattern.lower(), []).append(index)
+        elif rule.kind == "regex":
+            regex_rules.append((index, re.compile(rule.pattern, re.IGNORECASE)))
+        else:
+            raise ValueError(f"Unknown rule kind '{rule.kind}' for rule {rule.id}")
+
+    keyword_matcher = None
+    closure: Dict[str, List[int]] = {}
+    if keyword_rules:
+        keyword_matcher = re.compile(_trie_pattern(list(keyword_rules)))
+        # The matcher reports the longest keyword at a position; closure
+        # expands it to every keyword it contains (overlaps included).
+        for literal in keyword_rules:
+            closure[literal] = sorted(
+                index
+                for other, indexes in keyword_rules.items() if other in literal
+                for index in indexes
+            )
+
+    regex_prefilter = None
+    if regex_rules:
+        try:
+            regex_prefilter = re.compile(
+                "|".join(f"(?:{rules[index].pattern})" for index, _ in regex_rules),
+                re.IGNORECASE
+            )
+        except re.error:
+            regex_prefilter = None  # e.g. numbered backreferences; check individually
+    return keyword_matcher, closure, regex_rules, regex_prefilter
+
+
+def _match(matcher: Tuple[Any, ...], message: str) -> List[int]:
+    keyword_matcher, closure, regex_rules, regex_prefilter = matcher
+    matched = set()
+
+    if keyword_matcher is not None:
+        lowered = message.lower()
+        found = set()
+        match = keyword_matcher.search(lowered)
+        while match:
+            found.add(match.group())
+            # Resume one character in, so keywords overlapping this match are seen
+            match = keyword_matcher.search(lowered, match.start() + 1)
+        for literal in found:
+            matched.update(closure[literal])
+
+    if regex_rules and (regex_prefilter is None or regex_prefilter.search(message)):
+        matched.update(index for index, pattern in regex_rules if pattern.search(message))
+
+    return sorted(matched)
+
+
+def _digit_relaxed(rule: Rule) -> Rule:
+    """
+    The rule itself if its pattern has no digits; otherwise a copy whose
+    literal digits are 0, matching the digit key of every message the rule
+    matches. Patterns where that rewrite is unsafe relax to match everything.
+    """
+    if not any(char in _DIGITS for char in rule.pattern) and "(?P=" not in rule.pattern:
+        return rule
+    if rule.kind == "keyword":
+        return replace(rule, pattern=digit_key(rule.pattern))
+    if re.search(r"\\[0-9]|\[\^[^\]]*[0-9]|\(\?P=", rule.pattern):
+        return replace(rule, pattern="")  # backreferences, negated digit classes
+    return replace(rule, pattern=_REGEX_DIGITS.sub(
+        lambda match: "0" if match.group(1) else match.group(), rule.pattern
+    ))
+
+
+def _trie_pattern(literals: List[str]) -> str:
+    """
+    Build a regex equivalent to the alternation of `literals` shaped as a trie.
+    Optional continuations are greedy, so the longest literal wins at a position.
+    """
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a literal
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return body + "?" if len(branches) > 1 else "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def load_rules(path: str) -> List[Rule]:
+    """
+    Load rules from a JSON file, either a list of rule objects or
+    {"rules": [...]}. Each rule needs a "pattern"; "id" defaults to the pattern.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    entries: List[Dict[str, Any]] = data.get("rules", []) if isinstance(data, dict) else data
+    rules = []
+    for entry in entries:
+        if "pattern" not in entry:
+            raise ValueError(f"Rule without pattern in {path}: {entry}")
+        rules.append(Rule(
+            id=entry.get("id", entry["pattern"]),
+            pattern=entry["pattern"],
+            kind=entry.get("kind", "keyword"),
+            description=entry.get("description", "")
+        ))
+    return rules
@@ -4,15 +4,51 @@ and automatically triggers the GreenStick agent when anomalies are detected.
 """
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from elasticsearch import Elasticsearch
+from typing import Dict, Any, List, Optional, Tuple
+from elasticsearch import AsyncElasticsearch
+from detector import BatchDetector
+from aggregations import AggregationDetector
+from baseline import BaselineModel
+from templates import TemplateMiner
+from rules import RuleEngine
+from suppression import SuppressionCache, Fingerprint, fingerprint, severity
+from bootstrap import LOGS_PIPELINE, SCAN_TIME, SCAN_TIME_FIELD, ingest_time_range, has_ingest_time
+import json
 import os
+import time
 
-# Detection thresholds
+# Detection thresholds (fixed fallbacks; once a service's baseline has warmed up,
+# spikes are judged by deviation from it - see baseline.py)
 ERROR_RATE_THRESHOLD = 3  # errors in time window triggers alert
 REPEAT_FAILURE_THRESHOLD = 2  # same error repeated triggers alert
 SCAN_WINDOW_MINUTES = 1440  # 24 hours - expanded for demo purposes
 CRITICAL_KEYWORDS = ['OOM', 'FATAL', 'crash', 'killed', 'OutOfMemory', 'connection refused', 'timeout']
+# Full signature set; CRITICAL_KEYWORDS is the fallback when the file is unavailable
+CRITICAL_RULES_FILE = os.getenv(
+    "CRITICAL_RULES_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "critical_rules.json")
+)
+
+# Agent analysis fan-out
+ANALYSIS_CONCURRENCY = int(os.getenv("SCAN_ANALYSIS_CONCURRENCY", "5"))  # max concurrent analyze_incident calls
+ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("SCAN_ANALYSIS_TIMEOUT_SECONDS", "60"))  # per anomaly
+
+# "documents" pulls new logs and detects in Python; "aggregate" computes the
+# detection buckets server-side in one request (see aggregations.py)
+SCAN_DETECTION_MODE = os.getenv("SCAN_DETECTION_MODE", "documents")
+
+# Incremental scanning
+SCAN_PAGE_SIZE = 1000  # docs per search_after page
+SCAN_MAX_DOCS = 50000  # per-scan cap; anything beyond is picked up by the next scan
+PIT_KEEP_ALIVE = "1m"
+# Ingest timestamps come from different nodes and documents become searchable
+# only after a refresh, so each scan re-reads this much before the watermark
+SCAN_OVERLAP_SECONDS = float(os.getenv("SCAN_OVERLAP_SECONDS", "5"))
+SCAN_MAX_SEEN_IDS = 100000  # overlap ids kept in the watermark; past this the overlap shrinks
+SCANNER_STATE_FILE = os.getenv(
+    "SCANNER_STATE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scanner_state.json")
+)
 
 
 class AnomalyScanner:
@@ -20,13 +56,31 @@ class AnomalyScanner:
     Monitors Elasticsearch logs for anomalies and triggers agent analysis.
     """
     
-    def __init__(self, es_client: Optional[Elasticsearch], agent):
+    def __init__(self, es_client: Optional[AsyncElasticsearch], agent):
         self.es_client = es_client
         self.agent = agent
         self.is_scanning = False
         self.last_scan_time = None
         self.scan_results = []
+        self.analyses_pending = 0
         self.status = "idle"
+        self.scheduler = None  # ScanScheduler, attached by main.py when enabled
+        self._scan_task: Optional[asyncio.Task] = None
+        # High-watermark of the last processed log on ingest time (event.ingested):
+        # {"timestamp_ms": int, "ids": {_id: ingest ms}, "floor_ms": int}. The ids
+        # are the documents inside the overlap window, already processed and
+        # skipped when re-read; floor_ms is where the re-read starts when the
+        # ids had to be capped.
+        self.watermark = self._load_watermark()
+        self._pending_watermark = None
+        self.rules = self._load_rules()
+        self.baseline = BaselineModel()
+        self.templates = TemplateMiner()
+        self.detector = BatchDetector(
+            ERROR_RATE_THRESHOLD, REPEAT_FAILURE_THRESHOLD, self.rules, self.baseline, self.templates
+        )
+        self.aggregation_detector = AggregationDetector(self.detector)
+        self.suppression = SuppressionCache()
         
     def get_status(self) -> Dict[str, Any]:
         """Return current scanner status."""
@@ -34,13 +88,42 @@ class AnomalyScanner:
             "status": self.status,
             "is_scanning": self.is_scanning,
             "last_scan_time": self.last_scan_time.isoformat() if self.last_scan_time else None,
-            "recent_detections": len(self.scan_results)
+            "recent_detections": len(self.scan_results),
+            "analyses_pending": self.analyses_pending,
+            "watermark": self._watermark_isoformat(),
+            "critical_rules": len(self.rules.rules),
+            "baseline": self.baseline.get_status(),
+            "templates": len(self.templates),
+            "suppression": self.suppression.get_status(),
+            "scheduler": self.scheduler.get_status() if self.scheduler else None
         }
     
     async def scan_for_anomalies(self) -> Dict[str, Any]:
         """
         Scan recent logs for anomalies and trigger agent if found.
+        Calls made while a scan is already running are coalesced into it and
+        receive the same result.
         """
+        if self._scan_task is None or self._scan_task.done():
+            self._scan_task = asyncio.create_task(self._run_scan())
+        # Shielded so one caller going away doesn't cancel a scan others await
+        return await asyncio.shield(self._scan_task)
+    
+    async def cancel_scan(self):
+        """Cancel the scan in progress, if any (used on shutdown)."""
+        task = self._scan_task
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self.status = "idle"
+        self.is_scanning = False
+        self.analyses_pending = 0
+    
+    async def _run_scan(self) -> Dict[str, Any]:
         if not self.es_client:
             return {"error": "Elasticsearch not configured", "anomalies": []}
         
@@ -48,49 +131,43 @@ class AnomalyScanner:
         self.status = "scanning"
         
         try:
-            # 1. Fetch recent logs
-            print(f"[Scanner] Starting scan...")
-            logs = self._fetch_recent_logs()
-            print(f"[Scanner] Found {len(logs)} logs in time window")
+            print(f"[Scanner] Starting scan ({SCAN_DETECTION_MODE} mode)...")
+            self.rules.reload_if_changed()
             
-            if not logs:
-                self.status = "idle"
-                self.is_scanning = False
-                self.last_scan_time = datetime.utcnow()
-                print("[Scanner] No logs found, returning early")
-                return {"anomalies": [], "message": "No recent logs to analyze"}
+            if SCAN_DETECTION_MODE == "aggregate":
+                # 1+2. Detect anomalies server-side
+                anomalies, logs_scanned = await self._detect_with_aggregations()
+                print(f"[Scanner] Aggregated {logs_scanned} new logs since last scan")
+            else:
+                # 1. Fetch recent logs
+                logs = await self._fetch_recent_logs()
+                logs_scanned = len(logs)
+                print(f"[Scanner] Found {logs_scanned} new logs since last scan")
+                
+                if not logs:
+                    self.status = "idle"
+                    self.is_scanning = False
+                    self.last_scan_time = datetime.utcnow()
+                    print("[Scanner] No logs found, returning early")
+                    return {"anomalies": [], "message": "No recent logs to analyze"}
+                
+                # 2. Detect anomalies (CPU-bound; kept off the event loop)
+                anomalies = await asyncio.to_thread(self._detect_anomalies, logs)
             
-            # 2. Detect anomalies
-            anomalies = self._detect_anomalies(logs)
             print(f"[Scanner] Detected {len(anomalies)} anomalies")
+            self._commit_watermark()
             
             if not anomalies:
                 self.status = "idle"
                 self.is_scanning = False
                 self.last_scan_time = datetime.utcnow()
                 print("[Scanner] No anomalies detected")
-                return {"anomalies": [], "message": "No anomalies detected", "logs_scanned": len(logs)}
+                return {"anomalies": [], "message": "No anomalies detected", "logs_scanned": logs_scanned}
             
-            # 3. Trigger agent for each anomaly
+            # 3. Trigger agent for each anomaly (concurrently, bounded)
             self.status = "analyzing"
-            results = []
-            
-            for anomaly in anomalies:
-                try:
-                    # Use the trace_id or generate one from the anomaly
-                    trace_id = anomaly.get("trace_id", f"auto-{datetime.utcnow().strftime('%H%M%S')}")
-                    analysis = await self.agent.analyze_incident(trace_id)
-                    results.append({
-                        "anomaly": anomaly,
-                        "analysis": analysis
-                    })
-                except Exception as e:
-                    results.append({
-                        "anomaly": anomaly,
-                        "error": str(e)
-                    })
+            results = await self._analyze_anomalies(anomalies)
             
-            self.scan_results = results
             self.last_scan_time = datetime.utcnow()
             self.status = "idle"
             self.is_scanning = False
@@ -98,6 +175,8 @@ class AnomalyScanner:
             return {
                 "anomalies_detected": len(anomalies),
                 "analyses_completed": len(results),
+                "analyses_failed": sum(1 for r in results if "error" in r),
+                "analyses_suppressed": sum(1 for r in results if "suppressed" in r),
                 "results": results
             }
             
@@ -106,121 +185,271 @@ class AnomalyScanner:
             self.is_scanning = False
             return {"error": str(e), "anomalies": []}
     
-    def _fetch_recent_logs(self) -> List[Dict[str, Any]]:
-        """Fetch logs from the last N minutes."""
+    async def _analyze_anomalies(self, anomalies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run agent analysis for every anomaly concurrently, at most
+        ANALYSIS_CONCURRENCY at a time and each bounded by ANALYSIS_TIMEOUT_SECONDS,
+        so one slow anomaly never holds up the others. Results are appended to
+        self.scan_results as they finish (completion order), which lets
+        get_status() report partial progress while the scan is running.
+        Anomalies already analyzed recently (see suppression.py) reuse the
+        cached analysis instead of calling the agent again. Within one scan,
+        anomalies sharing a fingerprint are analyzed once, for the most severe
+        of them; the others reuse that result.
+        """
+        semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+        self.scan_results = []
+        self.analyses_pending = len(anomalies)
+        
+        groups: Dict[Fingerprint, List[Dict[str, Any]]] = {}
+        for anomaly in anomalies:
+            groups.setdefault(fingerprint(anomaly), []).append(anomaly)
+        
+        async def analyze_group(group: List[Dict[str, Any]]):
+            lead = max(group, key=severity)  # first of the most severe
+            result = await analyze(lead)
+            for anomaly in group:
+                if anomaly is lead:
+                    continue
+                duplicate = {"anomaly": anomaly, "duration_ms": 0.0}
+                if "analysis" in result:
+                    duplicate["analysis"] = result["analysis"]
+                    duplicate["suppressed"] = {
+                        "fingerprint": "/".join(part for part in fingerprint(anomaly) if part),
+                        "duplicate_of": lead.get("trace_id")
+                    }
+                else:
+                    duplicate["error"] = result["error"]
+                self.scan_results.append(duplicate)
+                self.analyses_pending -= 1
+        
+        async def analyze(anomaly: Dict[str, Any]) -> Dict[str, Any]:
+            # Use the trace_id or generate one from the anomaly
+            trace_id = anomaly.get("trace_id", f"auto-{datetime.utcnow().strftime('%H%M%S')}")
+            suppressed = self.suppression.lookup(anomaly)
+            if suppressed is not None:
+                result = {
+                    "anomaly": anomaly,
+                    "analysis": suppressed.pop("analysis"),
+                    "suppressed": suppressed,
+                    "duration_ms": 0.0
+                }
+                self.scan_results.append(result)
+                self.analyses_pending -= 1
+                return result
+            
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    analysis = await asyncio.wait_for(
+                        self.agent.analyze_incident(trace_id), ANALYSIS_TIMEOUT_SECONDS
+                    )
+                    result = {"anomaly": anomaly, "analysis": analysis}
+                    if "error" not in analysis:
+                        self.suppression.store(anomaly, analysis)
+                except asyncio.TimeoutError:
+                    result = {
+                        "anomaly": anomaly,
+                        "error": f"Analysis timed out after {ANALYSIS_TIMEOUT_SECONDS:g}s"
+                    }
+                except Exception as e:
+                    result = {"anomaly": anomaly, "error": str(e)}
+                result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            
+            self.scan_results.append(result)
+            self.analyses_pending -= 1
+            return result
+        
+        try:
+            await asyncio.gather(*(analyze_group(group) for group in groups.values()))
+        finally:
+            self.analyses_pending = 0
+        return list(self.scan_results)
+    
+    async def _fetch_recent_logs(self) -> List[Dict[str, Any]]:
+        """
+        Fetch logs indexed since the last scan.
+        
+        Pages forward from the persisted watermark using a point-in-time and
+        search_after, so per-scan cost follows new log volume rather than the
+        window size. The watermark is on ingest time (event.ingested, set by
+        the bootstrap pipeline), not @timestamp, so late or back-dated logs
+        are still picked up; logs without an ingest time (indexed before the
+        pipeline existed, or bypassing it) are scanned by @timestamp instead.
+        Each scan re-reads the last SCAN_OVERLAP_SECONDS and skips the ids it
+        already processed, keeping at most SCAN_MAX_SEEN_IDS of them.
+        The first scan (no watermark yet) backfills the last
+        SCAN_WINDOW_MINUTES. The new watermark is staged and only persisted
+        once detection has run (see _commit_watermark).
+        """
         if not self.es_client:
             return []
         
+        pit_id = None
         try:
-            # Check if index exists
-            if not self.es_client.indices.exists(index="greenstick-logs"):
-                return []
+            overlap_ms = int(SCAN_OVERLAP_SECONDS * 1000)
+            if self.watermark:
+                watermark_ms = self.watermark["timestamp_ms"]
+                seen_ids = self.watermark.get("ids", {})
+                if isinstance(seen_ids, list):
+                    # Older state: ids sharing the watermark timestamp
+                    seen_ids = dict.fromkeys(seen_ids, watermark_ms)
+                since_ms = max(watermark_ms - overlap_ms, self.watermark.get("floor_ms", 0))
+            else:
+                watermark_ms = since_ms = _epoch_ms(datetime.utcnow() - timedelta(minutes=SCAN_WINDOW_MINUTES))
+                seen_ids = {}
             
-            now = datetime.utcnow()
-            time_threshold = now - timedelta(minutes=SCAN_WINDOW_MINUTES)
+            pit_id = (await self.es_client.open_point_in_time(
+                index="greenstick-logs", keep_alive=PIT_KEEP_ALIVE, ignore_unavailable=True
+            ))["id"]
             
-            response = self.es_client.search(index="greenstick-logs", body={
-                "query": {
-                    "bool": {
-                        "must": [
-                            {"range": {"@timestamp": {"gte": time_threshold.isoformat() + "Z"}}}
-                        ]
-                    }
-                },
-                "size": 100,
-                "sort": [{"@timestamp": {"order": "desc"}}]
-            })
+            logs = []
+            last_ts = watermark_ms
+            new_ids = {}
+            without_ingest_time = 0
+            search_after = None
+            
+            while len(logs) < SCAN_MAX_DOCS:
+                page_size = min(SCAN_PAGE_SIZE, SCAN_MAX_DOCS - len(logs))
+                body = {
+                    "query": ingest_time_range({"gte": since_ms}),
+                    "runtime_mappings": SCAN_TIME,
+                    "size": page_size,
+                    "sort": [{SCAN_TIME_FIELD: {"order": "asc"}}, {"_shard_doc": "asc"}],
+                    "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                    "track_total_hits": False
+                }
+                if search_after:
+                    body["search_after"] = search_after
+                
+                response = await self.es_client.search(body=body)
+                pit_id = response.get("pit_id", pit_id)
+                hits = response.get("hits", {}).get("hits", [])
+                
+                for hit in hits:
+                    # Inside the overlap and already processed by an earlier scan
+                    if hit["_id"] in seen_ids:
+                        continue
+                    ts = hit["sort"][0]
+                    logs.append(hit["_source"])
+                    if not has_ingest_time(hit["_source"]):
+                        without_ingest_time += 1
+                    new_ids[hit["_id"]] = ts
+                    last_ts = max(last_ts, ts)
+                
+                if len(hits) < page_size:
+                    break
+                search_after = hits[-1]["sort"]
             
-            hits = response.get("hits", {}).get("hits", [])
-            return [hit["_source"] for hit in hits]
+            if without_ingest_time:
+                print(f"[Scanner] {without_ingest_time} logs have no event.ingested (not written through "
+                      f"the {LOGS_PIPELINE} pipeline); scanned by @timestamp")
+            if logs:
+                horizon = last_ts - overlap_ms
+                ids = {doc_id: ts for doc_id, ts in seen_ids.items() if ts >= horizon}
+                ids.update((doc_id, ts) for doc_id, ts in new_ids.items() if ts >= horizon)
+                floor_ms = horizon
+                if len(ids) > SCAN_MAX_SEEN_IDS:
+                    # Keep the newest; the next re-read starts after the newest dropped one
+                    ordered = sorted(ids.items(), key=lambda item: item[1])
+                    floor_ms = ordered[-SCAN_MAX_SEEN_IDS - 1][1] + 1
+                    ids = {doc_id: ts for doc_id, ts in ordered[-SCAN_MAX_SEEN_IDS:] if ts >= floor_ms}
+                    print(f"[Scanner] Overlap re-read shortened to {last_ts - floor_ms} ms ({SCAN_MAX_SEEN_IDS} ids kept)")
+                self._pending_watermark = {"timestamp_ms": last_ts, "ids": ids, "floor_ms": floor_ms}
+            return logs
             
         except Exception as e:
             print(f"Error fetching logs: {e}")
             return []
+        finally:
+            if pit_id:
+                try:
+                    await self.es_client.close_point_in_time(id=pit_id)
+                except Exception as e:
+                    print(f"Failed to close point-in-time: {e}")
     
-    def _detect_anomalies(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def _detect_with_aggregations(self) -> Tuple[List[Dict[str, Any]], int]:
         """
-        Detect anomalies in the logs.
-        Returns list of detected anomalies.
+        Detect anomalies over the logs since the watermark with a single
+        aggregation request; only compact buckets and a few samples come back.
+        The range is on ingest time and ends SCAN_OVERLAP_SECONDS before the
+        cluster's own `now`, leaving recently ingested logs time to become
+        searchable; the watermark advances to the newest ingest time actually
+        aggregated, so the app's clock never meets the ingest nodes' clocks.
+        After downtime the range still starts at most SCAN_WINDOW_MINUTES back.
         """
-        anomalies = []
-        
-        # 1. Error Rate Spike Detection
-        error_logs = [log for log in logs if log.get("level") == "ERROR"]
-        
-        if len(error_logs) >= ERROR_RATE_THRESHOLD:
-            # Group by service
-            service_errors = {}
-            for log in error_logs:
-                service = log.get("service", "unknown")
-                if service not in service_errors:
-                    service_errors[service] = []
-                service_errors[service].append(log)
-            
-            # Check for service-specific spikes
-            for service, errors in service_errors.items():
-                if len(errors) >= REPEAT_FAILURE_THRESHOLD:
-                    anomalies.append({
-                        "type": "error_spike",
-                        "service": service,
-                        "error_count": len(errors),
-                        "trace_id": errors[0].get("trace_id", f"spike-{service}"),
-                        "message": f"Error spike detected: {len(errors)} errors in {service}",
-                        "samples": errors[:3]  # Include up to 3 sample errors
-                    })
-        
-        # 2. Critical Keyword Detection
-        for log in logs:
-            message = log.get("message", "")
-            for keyword in CRITICAL_KEYWORDS:
-                if keyword.lower() in message.lower():
-                    anomalies.append({
-                        "type": "critical_keyword",
-                        "keyword": keyword,
-                        "service": log.get("service", "unknown"),
-                        "trace_id": log.get("trace_id", f"critical-{keyword}"),
-                        "message": f"Critical keyword '{keyword}' detected in {log.get('service', 'unknown')}",
-                        "log": log
-                    })
-                    break  # Only report once per log
-        
-        # 3. Repeated Failures (same message pattern)
-        message_counts = {}
-        for log in error_logs:
-            msg = log.get("message", "")[:50]  # First 50 chars as key
-            if msg not in message_counts:
-                message_counts[msg] = {"count": 0, "logs": []}
-            message_counts[msg]["count"] += 1
-            message_counts[msg]["logs"].append(log)
-        
-        for msg, data in message_counts.items():
-            if data["count"] >= REPEAT_FAILURE_THRESHOLD:
-                first_log = data["logs"][0]
-                anomalies.append({
-                    "type": "repeated_failure",
-                    "service": first_log.get("service", "unknown"),
-                    "repeat_count": data["count"],
-                    "trace_id": first_log.get("trace_id", "repeated"),
-                    "message": f"Repeated failure ({data['count']}x): {msg}...",
-                    "logs": data["logs"][:3]
-                })
+        until = f"now-{int(SCAN_OVERLAP_SECONDS * 1000)}ms"
+        since_ms = _epoch_ms(datetime.utcnow() - timedelta(minutes=SCAN_WINDOW_MINUTES))
+        if self.watermark:
+            since_ms = max(since_ms, self.watermark["timestamp_ms"])
         
-        # Deduplicate anomalies (same trace_id)
-        seen_traces = set()
-        unique_anomalies = []
-        for anomaly in anomalies:
-            trace_id = anomaly.get("trace_id")
-            if trace_id not in seen_traces:
-                seen_traces.add(trace_id)
-                unique_anomalies.append(anomaly)
+        anomalies, logs_scanned, newest_ms = await self.aggregation_detector.run(
+            self.es_client, "greenstick-logs", since_ms, until
+        )
+        if newest_ms is not None:
+            self._pending_watermark = {"timestamp_ms": newest_ms, "ids": {}}
+        return anomalies, logs_scanned
+    
+    def _commit_watermark(self):
+        """Persist the watermark staged by the last fetch."""
+        if not self._pending_watermark:
+            return
         
-        return unique_anomalies
+        self.watermark = self._pending_watermark
+        self._pending_watermark = None
+        try:
+            tmp_path = SCANNER_STATE_FILE + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"watermark": self.watermark}, f)
+            os.replace(tmp_path, SCANNER_STATE_FILE)
+        except OSError as e:
+            print(f"[Scanner] Failed to persist watermark: {e}")
+    
+    def _load_rules(self) -> RuleEngine:
+        """Compile the critical signature rules, falling back to CRITICAL_KEYWORDS."""
+        try:
+            rules = RuleEngine.from_file(CRITICAL_RULES_FILE)
+            print(f"[Scanner] Loaded {len(rules.rules)} critical rules from {CRITICAL_RULES_FILE}")
+            return rules
+        except Exception as e:
+            print(f"[Scanner] Using built-in critical keywords ({e})")
+            return RuleEngine.from_keywords(CRITICAL_KEYWORDS)
+    
+    def _load_watermark(self) -> Optional[Dict[str, Any]]:
+        """Load the persisted watermark, if any."""
+        try:
+            with open(SCANNER_STATE_FILE) as f:
+                return json.load(f).get("watermark")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[Scanner] Ignoring unreadable scanner state: {e}")
+            return None
+    
+    def _watermark_isoformat(self) -> Optional[str]:
+        if not self.watermark:
+            return None
+        ts = datetime(1970, 1, 1) + timedelta(milliseconds=self.watermark["timestamp_ms"])
+        return ts.isoformat() + "Z"
+    
+    def _detect_anomalies(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Detect anomalies in the logs.
+        Returns list of detected anomalies (error spikes, critical keywords and
+        repeated failures, deduplicated by trace_id). See detector.BatchDetector.
+        """
+        return self.detector.detect(logs)
+
+
+def _epoch_ms(ts: datetime) -> int:
+    """Milliseconds since the epoch for a naive UTC datetime."""
+    return int((ts - datetime(1970, 1, 1)).total_seconds() * 1000)
 
 
 # Global scanner instance (initialized in main.py)
 scanner: Optional[AnomalyScanner] = None
 
-def init_scanner(es_client: Elasticsearch, agent) -> AnomalyScanner:
+def init_scanner(es_client: AsyncElasticsearch, agent) -> AnomalyScanner:
     """Initialize the global scanner instance."""
     global scanner
     scanner = AnomalyScanner(es_client, agent)
@@ -0,0 +1,111 @@
+"""
+Scan Scheduler - Runs AnomalyScanner.scan_for_anomalies periodically in the
+background. Started and stopped by the FastAPI lifespan in main.py.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+SCAN_SCHEDULER_ENABLED = os.getenv("SCAN_SCHEDULER_ENABLED", "true").lower() == "true"
+SCAN_INTERVAL_SECONDS = float(os.getenv("SCAN_INTERVAL_SECONDS", "60"))
+SCAN_JITTER_SECONDS = float(os.getenv("SCAN_JITTER_SECONDS", "5"))  # random delay added to each run
+SCAN_MAX_INTERVAL_SECONDS = float(os.getenv("SCAN_MAX_INTERVAL_SECONDS", "600"))  # back-off ceiling
+SCAN_BACKOFF_FACTOR = 2.0
+
+
+class ScanScheduler:
+    """
+    Periodic scan loop with jitter, no overlapping runs and adaptive back-off.
+
+    Runs never overlap: the loop awaits each scan before scheduling the next,
+    and a tick that finds a (manually triggered) scan still running is skipped.
+    When a scan takes longer than the current interval the interval backs off
+    (up to SCAN_MAX_INTERVAL_SECONDS) and decays back once scans are fast again.
+    """
+
+    def __init__(self, scanner, interval: float = SCAN_INTERVAL_SECONDS, jitter: float = SCAN_JITTER_SECONDS,
+                 max_interval: float = SCAN_MAX_INTERVAL_SECONDS):
+        self.scanner = scanner
+        self.interval = interval
+        self.jitter = jitter
+        self.max_interval = max(max_interval, interval)
+        self.current_interval = interval
+
+        self.next_run_time: Optional[datetime] = None
+        self.last_run_time: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.lag: Optional[float] = None  # how late the last run started, in seconds
+        self.runs = 0
+        self.skipped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Return scheduler timing so callers can see whether scans keep up."""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "current_interval_seconds": round(self.current_interval, 2),
+            "next_run_time": self.next_run_time.isoformat() if self.next_run_time else None,
+            "last_run_time": self.last_run_time.isoformat() if self.last_run_time else None,
+            "last_duration_seconds": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "lag_seconds": round(self.lag, 3) if self.lag is not None else None,
+            "runs": self.runs,
+            "skipped": self.skipped
+        }
+
+    def start(self):
+        """Start the background loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            print(f"[Scheduler] Scanning every {self.interval:g}s (+ up to {self.jitter:g}s jitter)")
+
+    async def stop(self):
+        """Cancel the loop and any scan it is running."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.next_run_time = None
+        await self.scanner.cancel_scan()
+        print("[Scheduler] Stopped")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        scheduled = loop.time() + random.uniform(0, self.jitter)
+
+        while True:
+            delay = max(0.0, scheduled - loop.time())
+            self.next_run_time = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+
+            started = loop.time()
+            self.lag = started - scheduled
+
+            if self.scanner.is_scanning:
+                # A manual scan is in flight; don't pile another one on top
+                self.skipped += 1
+                print("[Scheduler] Scan still in progress, skipping this run")
+            else:
+                self.last_run_time = datetime.utcnow()
+                try:
+                    await self.scanner.scan_for_anomalies()
+                except Exception as e:
+                    print(f"[Scheduler] Scan failed: {e}")
+                self.runs += 1
+                self.last_duration = loop.time() - started
+                self._adapt_interval()
+
+            scheduled = max(started + self.current_interval, loop.time()) + random.uniform(0, self.jitter)
+
+    def _adapt_interval(self):
+        if self.last_duration > self.current_interval:
+            self.current_interval = min(self.max_interval, self.last_duration * SCAN_BACKOFF_FACTOR)
+            print(f"[Scheduler] Scan took {self.last_duration:.1f}s, backing off to {self.current_interval:.1f}s")
+        elif self.current_interval > self.interval:
+            self.current_interval = max(self.interval, self.current_interval / SCAN_BACKOFF_FACTOR)
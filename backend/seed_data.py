@@ -2,10 +2,14 @@
 Seed script to populate Elasticsearch with demo incidents and logs.
 Run this to set up data for the demo.
 """
+import asyncio
 import os
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from dotenv import load_dotenv
+from bootstrap import bootstrap_indices
+from log_store import LogStore, LOCAL_STORE_MIRROR
+from local_esql import ESQL_BACKEND
 import random
 
 load_dotenv()
@@ -47,26 +51,23 @@ INFO_MESSAGES = [
     "Metrics exported to Prometheus"
 ]
 
+async def bootstrap():
+    """Install index templates, data streams and the incidents index."""
+    client = AsyncElasticsearch(
+        hosts=[os.getenv("ELASTIC_ENDPOINT")],
+        api_key=os.getenv("ELASTIC_API_KEY")
+    )
+    try:
+        await bootstrap_indices(client)
+    finally:
+        await client.close()
+
 def generate_trace_id():
     return f"trace-{random.choice(['hq', 'us', 'eu', 'ap'])}-{random.randint(100, 999)}"
 
 def seed_logs():
-    """Create the logs index and seed with sample data."""
-    print("Creating greenstick-logs index...")
-    
-    # Create index with mapping
-    if not es.indices.exists(index="greenstick-logs"):
-        es.indices.create(index="greenstick-logs", body={
-            "mappings": {
-                "properties": {
-                    "@timestamp": {"type": "date"},
-                    "service": {"type": "keyword"},
-                    "level": {"type": "keyword"},
-                    "message": {"type": "text"},
-                    "trace_id": {"type": "keyword"}
-                }
-            }
-        })
+    """Seed the logs data stream with sample data."""
+    print("Seeding greenstick-logs...")
     
     # Generate logs for the past 24 hours
     now = datetime.utcnow()
@@ -85,6 +86,7 @@ def seed_logs():
         
         logs.append({
             "_index": "greenstick-logs",
+            "_op_type": "create",  # data streams only accept creates
             "_source": {
                 "@timestamp": timestamp.isoformat() + "Z",
                 "service": random.choice(SERVICES),
@@ -99,24 +101,16 @@ def seed_logs():
     success, failed = bulk(es, logs)
     print(f"Seeded {success} logs ({failed} failed)")
 
+    # Same logs into the local columnar store used by ESQL_BACKEND=local
+    if ESQL_BACKEND == "local" or LOCAL_STORE_MIRROR:
+        store = LogStore()
+        store.append([log["_source"] for log in logs])
+        store.flush()
+        print(f"Seeded {len(logs)} logs into the local store at {store.path}")
+
 def seed_incidents():
-    """Create the incidents index with historical data."""
-    print("Creating greenstick-incidents index...")
-    
-    if not es.indices.exists(index="greenstick-incidents"):
-        es.indices.create(index="greenstick-incidents", body={
-            "mappings": {
-                "properties": {
-                    "incident_id": {"type": "keyword"},
-                    "description": {"type": "text"},
-                    "root_cause": {"type": "text"},
-                    "resolution": {"type": "text"},
-                    "severity": {"type": "keyword"},
-                    "created_at": {"type": "date"},
-                    "resolved_at": {"type": "date"}
-                }
-            }
-        })
+    """Seed the incidents index with historical data."""
+    print("Seeding greenstick-incidents...")
     
     # Historical incidents
     incidents = [
@@ -166,23 +160,8 @@ def seed_incidents():
     print(f"Seeded {len(incidents)} historical incidents")
 
 def seed_audit_logs():
-    """Create the audit index with sample agent actions."""
-    print("Creating greenstick-audit index...")
-    
-    if not es.indices.exists(index="greenstick-audit"):
-        es.indices.create(index="greenstick-audit", body={
-            "mappings": {
-                "properties": {
-                    "@timestamp": {"type": "date"},
-                    "trace_id": {"type": "keyword"},
-                    "action_type": {"type": "keyword"},
-                    "description": {"type": "text"},
-                    "confidence": {"type": "float"},
-                    "status": {"type": "keyword"},
-                    "metadata": {"type": "object", "enabled": True}
-                }
-            }
-        })
+    """Seed the audit data stream with sample agent actions."""
+    print("Seeding greenstick-audit...")
     
     # Sample audit entries representing agent actions
     ACTION_TYPES = ["K8S_RESTART", "CONFIG_ROLLBACK", "SCALE_UP", "ALERT_ESCALATE", "ANALYSIS"]
@@ -210,6 +189,7 @@ def seed_audit_logs():
         
         audit_entries.append({
             "_index": "greenstick-audit",
+            "_op_type": "create",
             "_source": {
                 "@timestamp": timestamp.isoformat() + "Z",
                 "trace_id": generate_trace_id(),
@@ -234,6 +214,7 @@ if __name__ == "__main__":
     print("GreenStick Demo Data Seeder")
     print("=" * 50)
     
+    asyncio.run(bootstrap())
     seed_logs()
     seed_incidents()
     seed_audit_logs()
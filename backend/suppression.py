@@ -0,0 +1,128 @@
+"""
+Anomaly Suppression - Remembers recent agent analyses so the scanner does not
+re-analyze the same anomaly on every scan.
+
+Anomalies are keyed on a fingerprint of type + service + template (or keyword,
+or trace id when no template is known). While a fingerprint keeps being seen
+within SUPPRESSION_TTL_SECONDS, the cached analysis is reused; it is analyzed
+again only once the entry expires or its severity escalates by
+SUPPRESSION_ESCALATION_FACTOR over the severity that was analyzed. The cache
+is bounded with LRU eviction.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+import os
+import time
+
+SUPPRESSION_TTL_SECONDS = float(os.getenv("SUPPRESSION_TTL_SECONDS", "1800"))  # since the anomaly was last seen
+SUPPRESSION_MAX_ENTRIES = int(os.getenv("SUPPRESSION_MAX_ENTRIES", "1000"))
+SUPPRESSION_ESCALATION_FACTOR = float(os.getenv("SUPPRESSION_ESCALATION_FACTOR", "2.0"))
+
+Fingerprint = Tuple[str, str, str]
+
+
+def fingerprint(anomaly: Dict[str, Any]) -> Fingerprint:
+    """Identity of an anomaly across scans."""
+    anomaly_type = anomaly.get("type", "unknown")
+    service = str(anomaly.get("service", "unknown"))
+
+    if anomaly.get("template_id") is not None:
+        detail = f"template:{anomaly['template_id']}"
+    elif anomaly_type == "critical_keyword":
+        detail = f"keyword:{anomaly.get('keyword', '')}"
+    elif anomaly_type == "error_spike":
+        detail = ""  # a spike is per service; its sample trace changes every scan
+    else:
+        detail = f"trace:{anomaly.get('trace_id', '')}"
+    return (anomaly_type, service, detail)
+
+
+def severity(anomaly: Dict[str, Any]) -> float:
+    """Magnitude used to decide whether a known anomaly escalated."""
+    baseline = anomaly.get("baseline")
+    if baseline:
+        return max(float(baseline.get("zscore", 0.0)), 0.0)
+    for key in ("error_count", "repeat_count", "occurrences"):
+        if key in anomaly:
+            return float(anomaly[key])
+    return 1.0
+
+
+class _Entry:
+    __slots__ = ("analysis", "severity", "analyzed_at", "last_seen", "suppressed")
+
+    def __init__(self, analysis: Dict[str, Any], severity: float, now: float):
+        self.analysis = analysis
+        self.severity = severity
+        self.analyzed_at = datetime.utcnow()
+        self.last_seen = now
+        self.suppressed = 0
+
+
+class SuppressionCache:
+    """Fingerprint -> last analysis, with a sliding TTL and LRU eviction."""
+
+    def __init__(self, ttl: float = SUPPRESSION_TTL_SECONDS, max_entries: int = SUPPRESSION_MAX_ENTRIES,
+                 escalation_factor: float = SUPPRESSION_ESCALATION_FACTOR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.escalation_factor = escalation_factor
+        self._entries: "OrderedDict[Fingerprint, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.escalations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, anomaly: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return suppression details (including the cached analysis) if the
+        anomaly should not be re-analyzed, otherwise None.
+        """
+        key = fingerprint(anomaly)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is None or now - entry.last_seen > self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        current = severity(anomaly)
+        if current >= entry.severity * self.escalation_factor and current > entry.severity:
+            self.escalations += 1
+            self.misses += 1
+            return None
+
+        entry.last_seen = now
+        entry.suppressed += 1
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return {
+            "fingerprint": "/".join(part for part in key if part),
+            "analysis": entry.analysis,
+            "analyzed_at": entry.analyzed_at.isoformat(),
+            "analyzed_severity": entry.severity,
+            "severity": current,
+            "times_suppressed": entry.suppressed
+        }
+
+    def store(self, anomaly: Dict[str, Any], analysis: Dict[str, Any]):
+        """Remember a completed analysis for the anomaly's fingerprint."""
+        key = fingerprint(anomaly)
+        self._entries[key] = _Entry(analysis, severity(anomaly), time.monotonic())
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "escalations": self.escalations,
+            "ttl_seconds": self.ttl
+        }
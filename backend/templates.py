@@ -0,0 +1,126 @@
+"""
+Log Template Mining - Streaming Drain-style template miner.
+
+Messages are masked (numbers, ids, durations, addresses become <*>), then
+routed through a fixed-depth parse tree keyed on token count and leading
+tokens to a small list of candidate clusters. The most similar cluster
+absorbs the message (differing positions become <*>), otherwise a new
+cluster is created. Routing is bounded by the tree depth and the per-leaf
+cluster count, so each message is assigned a template id in roughly
+constant time. The number of templates is capped with LRU eviction.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import re
+
+TEMPLATE_WILDCARD = "<*>"
+TEMPLATE_TREE_DEPTH = 2  # leading tokens used for routing
+TEMPLATE_SIMILARITY = 0.5  # min fraction of matching tokens to join a cluster
+TEMPLATE_MAX_CHILDREN = 100  # per tree node; overflow routes through <*>
+TEMPLATE_MAX_CLUSTERS = 5000
+TEMPLATE_MESSAGE_CACHE = 20000  # exact message -> template id
+
+# Variables that may be glued to punctuation; anything else containing a
+# digit (counts, durations, request ids, ports) is masked per token.
+_MASK = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"  # UUID
+    r"|\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?"  # IPv4[:port]
+)
+_HAS_DIGIT = re.compile(r"\d").search
+
+
+def tokenize(message: str) -> List[str]:
+    """Split a message into tokens, replacing variable-looking ones with the wildcard."""
+    return [
+        TEMPLATE_WILDCARD if _HAS_DIGIT(token) else token
+        for token in _MASK.sub(TEMPLATE_WILDCARD, message).split()
+    ]
+
+
+def mask_message(message: str) -> str:
+    """Message with its variable-looking tokens replaced by the wildcard."""
+    return " ".join(tokenize(message))
+
+
+class _Cluster:
+    __slots__ = ("id", "tokens", "size", "leaf")
+
+    def __init__(self, cluster_id: int, tokens: List[str], leaf: List["_Cluster"]):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.size = 0
+        self.leaf = leaf
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """Assigns each log message a stable template id."""
+
+    def __init__(self, similarity: float = TEMPLATE_SIMILARITY, max_clusters: int = TEMPLATE_MAX_CLUSTERS):
+        self.similarity = similarity
+        self.max_clusters = max_clusters
+        self._root: Dict[Any, Any] = {}
+        self._clusters: "OrderedDict[int, _Cluster]" = OrderedDict()
+        self._message_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def add(self, message: str) -> int:
+        """Assign the message to a template (creating or generalizing one) and return its id."""
+        cached = self._message_cache.get(message)
+        if cached is not None and cached in self._clusters:
+            self._message_cache.move_to_end(message)
+            self._clusters.move_to_end(cached)
+            return cached
+
+        tokens = tokenize(message)
+        leaf = self._leaf(tokens)
+
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            cluster = _Cluster(self._next_id, tokens, leaf)
+            self._next_id += 1
+            leaf.append(cluster)
+            self._clusters[cluster.id] = cluster
+            if len(self._clusters) > self.max_clusters:
+                _, evicted = self._clusters.popitem(last=False)
+                evicted.leaf.remove(evicted)
+        else:
+            cluster.tokens = [
+                current if current == token else TEMPLATE_WILDCARD
+                for current, token in zip(cluster.tokens, tokens)
+            ]
+            self._clusters.move_to_end(cluster.id)
+
+        cluster.size += 1
+        self._message_cache[message] = cluster.id
+        if len(self._message_cache) > TEMPLATE_MESSAGE_CACHE:
+            self._message_cache.popitem(last=False)
+        return cluster.id
+
+    def template(self, template_id: int) -> Optional[str]:
+        """Current template text for an id (None if it has been evicted)."""
+        cluster = self._clusters.get(template_id)
+        return cluster.template if cluster else None
+
+    def _leaf(self, tokens: List[str]) -> List[_Cluster]:
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[:TEMPLATE_TREE_DEPTH]:
+            if token not in node and len(node) >= TEMPLATE_MAX_CHILDREN:
+                token = TEMPLATE_WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])  # None key holds the cluster list
+
+    def _best_match(self, leaf: List[_Cluster], tokens: List[str]) -> Optional[_Cluster]:
+        best, best_score = None, -1.0
+        for cluster in leaf:
+            same = sum(1 for current, token in zip(cluster.tokens, tokens) if current == token)
+            score = same / len(tokens) if tokens else 1.0
+            if score > best_score:
+                best, best_score = cluster, score
+        return best if best is not None and best_score >= self.similarity else None
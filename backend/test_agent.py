@@ -42,6 +42,8 @@ async def test_agent():
     print(f"Message: {execution.get('message')}")
     print(f"Approval Required: {execution.get('approval_required')}")
     print("=" * 50)
+    
+    await agent.close()
 
 if __name__ == "__main__":
     asyncio.run(test_agent())
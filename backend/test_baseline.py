@@ -0,0 +1,80 @@
+import random
+import time
+import numpy as np
+from baseline import BaselineModel, ServiceBaseline, BASELINE_QUANTILE, BASELINE_WARMUP_MINUTES
+
+NOW = int(time.time() // 60)
+
+
+def warmed_up(volume=100, errors=2, minutes=BASELINE_WARMUP_MINUTES + 5):
+    baseline = ServiceBaseline()
+    start = NOW - minutes
+    for minute in range(start, NOW):
+        baseline.observe(minute, errors, volume)
+    return baseline
+
+
+def test_traffic_spike_at_normal_rate_is_not_anomalous():
+    baseline = warmed_up()
+    assert baseline.warmed_up
+    baseline.observe(NOW, 20, 1000)  # 10x traffic, same 2% error rate
+    assert not baseline.evaluate(NOW)["anomalous"]
+
+
+def test_error_rate_spike_is_anomalous():
+    baseline = warmed_up()
+    baseline.observe(NOW, 40, 100)
+    evaluation = baseline.evaluate(NOW)
+    assert evaluation["anomalous"] and evaluation["rate"] == 0.4
+
+
+def test_silent_minutes_do_not_warm_up():
+    baseline = ServiceBaseline()
+    baseline.observe(NOW - 500, 1, 10)
+    baseline.observe(NOW, 1, 10)  # a long silent gap folds nothing
+    assert baseline.minutes_seen == 1 and not baseline.warmed_up
+
+
+def test_future_minutes_are_rejected():
+    model = BaselineModel()
+    model.update_counts([("api", NOW - 1, 1, 10)])
+    model.update_counts([("api", NOW + 10000, 5, 10)])
+    baseline = model.get("api")
+    assert baseline.current_minute == NOW - 1 and baseline.minutes_seen == 0
+
+
+def test_old_minutes_are_rejected():
+    baseline = ServiceBaseline(window=10)
+    baseline.observe(NOW, 1, 10)
+    assert not baseline.observe(NOW - 10, 1, 10)
+    assert baseline.observe(NOW - 9, 1, 10)
+
+
+def test_cached_quantile_matches_recomputation():
+    rng = random.Random(3)
+    baseline = ServiceBaseline()
+    minute = NOW - 5000
+    for _ in range(3000):
+        if rng.random() < 0.3:
+            minute += rng.randint(1, 3)
+        late = minute - rng.randint(0, 70) if rng.random() < 0.1 else minute
+        baseline.observe(late, rng.randint(0, 9), rng.randint(10, 20))
+
+        slots = (baseline.current_minute - 1 - np.arange(baseline.window - 1)) % baseline.window
+        totals = baseline.totals[slots]
+        rates = baseline.errors[slots][totals > 0] / totals[totals > 0]
+        expected = float(np.quantile(rates, BASELINE_QUANTILE)) if rates.size else 0.0
+        assert baseline.quantile() == expected
+
+
+def test_repeat_threshold_scales_with_volume():
+    small, large = warmed_up(volume=10, errors=1), warmed_up(volume=1000, errors=100)
+    assert small.repeat_threshold(2) < large.repeat_threshold(2)
+    assert ServiceBaseline().repeat_threshold(2) == 2
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,158 @@
+import random
+import numpy as np
+from detector import BatchDetector, LogBatch, factorize
+from rules import RuleEngine
+from templates import TemplateMiner
+
+KEYWORDS = ['OOM', 'FATAL', 'crash', 'killed', 'OutOfMemory', 'connection refused', 'timeout']
+ERROR_RATE_THRESHOLD = 3
+REPEAT_FAILURE_THRESHOLD = 2
+
+MESSAGES = [
+    "Connection timeout after {}ms",
+    "Database connection pool exhausted",
+    "OOM killer invoked on pid {}",
+    "FATAL: worker {} crashed",
+    "ok",
+    "request {} served in {}ms",
+    "Payment gateway returned an unexpected response code for merchant {} order {}",
+    "Upstream connection refused by 10.0.{}.{}:5432 while resolving inventory for sku {}",
+    "Batch 0 of {} rows processed",
+]
+
+
+def reference_detect(logs):
+    """The scanner's original per-log detection loop, kept as the parity oracle."""
+    anomalies = []
+    error_logs = [log for log in logs if log.get("level") == "ERROR"]
+
+    if len(error_logs) >= ERROR_RATE_THRESHOLD:
+        service_errors = {}
+        for log in error_logs:
+            service_errors.setdefault(log.get("service", "unknown"), []).append(log)
+        for service, errors in service_errors.items():
+            if len(errors) >= REPEAT_FAILURE_THRESHOLD:
+                anomalies.append({
+                    "type": "error_spike",
+                    "service": service,
+                    "error_count": len(errors),
+                    "trace_id": errors[0].get("trace_id", f"spike-{service}"),
+                    "message": f"Error spike detected: {len(errors)} errors in {service}",
+                    "samples": errors[:3]
+                })
+
+    for log in logs:
+        message = log.get("message", "")
+        for keyword in KEYWORDS:
+            if keyword.lower() in message.lower():
+                anomalies.append({
+                    "type": "critical_keyword",
+                    "keyword": keyword,
+                    "service": log.get("service", "unknown"),
+                    "trace_id": log.get("trace_id", f"critical-{keyword}"),
+                    "message": f"Critical keyword '{keyword}' detected in {log.get('service', 'unknown')}",
+                    "log": log
+                })
+                break
+
+    message_counts = {}
+    for log in error_logs:
+        msg = log.get("message", "")[:50]
+        data = message_counts.setdefault(msg, {"count": 0, "logs": []})
+        data["count"] += 1
+        data["logs"].append(log)
+    for msg, data in message_counts.items():
+        if data["count"] >= REPEAT_FAILURE_THRESHOLD:
+            first_log = data["logs"][0]
+            anomalies.append({
+                "type": "repeated_failure",
+                "service": first_log.get("service", "unknown"),
+                "repeat_count": data["count"],
+                "trace_id": first_log.get("trace_id", "repeated"),
+                "message": f"Repeated failure ({data['count']}x): {msg}...",
+                "logs": data["logs"][:3]
+            })
+
+    seen_traces = set()
+    unique = []
+    for anomaly in anomalies:
+        if anomaly.get("trace_id") not in seen_traces:
+            seen_traces.add(anomaly.get("trace_id"))
+            unique.append(anomaly)
+    return unique
+
+
+def random_logs(rng, n, traces):
+    logs = []
+    for _ in range(n):
+        template = rng.choice(MESSAGES)
+        message = template.format(*(rng.randint(0, 12) for _ in range(template.count("{}"))))
+        log = {
+            "service": rng.choice(["api", "auth", "payments"]),
+            "level": rng.choice(["ERROR", "ERROR", "WARN", "INFO"]),
+            "message": message,
+            "@timestamp": "2024-01-01T00:%02d:00.000Z" % rng.randint(0, 5)
+        }
+        if rng.random() < 0.8:
+            log["trace_id"] = f"t{rng.randint(0, traces)}"
+        if rng.random() < 0.05:
+            del log["service"]
+        logs.append(log)
+    return logs
+
+
+def detector(miner=None, error_rate_threshold=ERROR_RATE_THRESHOLD):
+    return BatchDetector(error_rate_threshold, REPEAT_FAILURE_THRESHOLD, RuleEngine.from_keywords(KEYWORDS), miner=miner)
+
+
+def test_matches_original_scanner_without_miner():
+    rng = random.Random(2)
+    batch_detector = detector()
+    for batch in range(300):
+        logs = random_logs(rng, rng.choice([0, 1, 3, 20, 200]), rng.choice([3, 50, 10000]))
+        anomalies = batch_detector.detect(logs)
+        for anomaly in anomalies:
+            anomaly.pop("matched_rules", None)
+        assert anomalies == reference_detect(logs), f"batch {batch}"
+
+
+def test_repeated_failures_keep_digits_in_prefix():
+    logs = [
+        {"level": "ERROR", "service": "api", "message": "request 1 failed", "trace_id": "a"},
+        {"level": "ERROR", "service": "api", "message": "request 2 failed", "trace_id": "b"},
+        {"level": "ERROR", "service": "api", "message": "request 1 failed", "trace_id": "c"},
+    ]
+    # No spike, so the repeated failure keeps its trace id
+    repeated = [a for a in detector(error_rate_threshold=100).detect(logs) if a["type"] == "repeated_failure"]
+    assert [(a["repeat_count"], a["message"]) for a in repeated] == [(2, "Repeated failure (2x): request 1 failed...")]
+
+
+def test_miner_groups_messages_differing_in_digits():
+    logs = [
+        {"level": "ERROR", "service": "api", "message": f"request {i} failed", "trace_id": f"t{i}"}
+        for i in range(5)
+    ]
+    repeated = [a for a in detector(TemplateMiner(), error_rate_threshold=100).detect(logs) if a["type"] == "repeated_failure"]
+    assert len(repeated) == 1 and repeated[0]["repeat_count"] == 5
+
+
+def test_factorize_and_batch_columns():
+    codes, uniques = factorize(["b", "a", "b", "c"])
+    assert uniques == ["b", "a", "c"] and codes.tolist() == [0, 1, 0, 2]
+
+    batch = LogBatch([
+        {"service": "api", "level": "ERROR", "message": "took 15ms"},
+        {"level": "INFO", "message": "took 99ms"},
+    ])
+    assert batch.services == ["api", "unknown"]
+    assert batch.message_keys == ["took 00ms"]
+    assert batch.fingerprints == ["took 15ms", "took 99ms"]
+    assert batch.level_mask("ERROR").tolist() == [True, False]
+    assert np.isnat(batch.timestamps).all()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+from history_index import HistoryIndex
+
+
+def _epoch_ms(value):
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+class FakeIncidents:
+    """Just enough of AsyncElasticsearch.search for HistoryIndex.refresh()."""
+
+    def __init__(self, docs):
+        self.docs = docs  # _id -> _source
+        self.searches = 0
+
+    def _matches(self, query, source):
+        if "match_all" in query:
+            return True
+        if "range" in query:
+            created = source.get("created_at")
+            return created is not None and _epoch_ms(created) >= query["range"]["created_at"]["gte"]
+        if "bool" in query and "must_not" in query["bool"]:
+            return not source.get(query["bool"]["must_not"]["exists"]["field"])
+        return any(self._matches(clause, source) for clause in query["bool"]["should"])
+
+    async def search(self, index, ignore_unavailable, body):
+        self.searches += 1
+        await asyncio.sleep(0.01)
+        hits = [
+            {"_id": doc_id, "_source": dict(source),
+             "sort": [_epoch_ms(source["created_at"]) if source.get("created_at") else -2**63, doc_id]}
+            for doc_id, source in self.docs.items() if self._matches(body["query"], source)
+        ]
+        hits.sort(key=lambda hit: hit["sort"])
+        return {"hits": {"hits": hits}}
+
+
+def test_concurrent_first_use_shares_one_load():
+    es = FakeIncidents({"a": {"description": "db timeout", "created_at": "2024-01-02T00:00:00+00:00"}})
+    index = HistoryIndex()
+
+    async def run():
+        await asyncio.gather(*(index.ensure_fresh(es) for _ in range(5)))
+
+    asyncio.run(run())
+    assert es.searches == 1 and len(index) == 1
+
+
+def test_watermark_compares_instants_not_strings():
+    es = FakeIncidents({
+        "a": {"description": "db timeout", "created_at": "2024-01-02T00:00:00+00:00"},
+        # Later instant, earlier string
+        "b": {"description": "oom", "created_at": "2024-01-01T23:00:00-05:00"},
+    })
+    index = HistoryIndex()
+    asyncio.run(index.refresh(es))
+    assert index._watermark == _epoch_ms("2024-01-01T23:00:00-05:00")
+
+
+def test_incidents_without_created_at_are_picked_up_later():
+    es = FakeIncidents({"a": {"description": "db timeout", "created_at": "2024-01-02T00:00:00+00:00"}})
+    index = HistoryIndex()
+    asyncio.run(index.refresh(es))
+
+    es.docs["legacy"] = {"description": "payment gateway certificate expired"}
+    asyncio.run(index.refresh(es))
+    assert len(index) == 2
+    assert index.search("gateway certificate expired", k=1)[0][0]["description"] == "payment gateway certificate expired"
+
+
+def test_search_ranks_paraphrases():
+    index = HistoryIndex()
+    index.add("1", {"description": "Database connection pool exhausted", "root_cause": "leak in checkout"})
+    index.add("2", {"description": "Disk full on logging node", "root_cause": "retention misconfigured"})
+    results = index.search("connection pool exhaustion in the database", k=2)
+    assert results[0][0]["description"] == "Database connection pool exhausted"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
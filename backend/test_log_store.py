@@ -0,0 +1,100 @@
+import os
+import tempfile
+import numpy as np
+from log_store import LogStore
+from local_esql import LocalEsql, EsqlError
+
+
+def logs(n, start=0, service="api"):
+    return [
+        {"@timestamp": f"2024-01-01T00:{(start + i) % 60:02d}:00Z", "service": service,
+         "level": "ERROR" if (start + i) % 3 == 0 else "INFO", "message": f"m{start + i}", "trace_id": f"t{start + i}"}
+        for i in range(n)
+    ]
+
+
+def decoded(store, name):
+    column = store.column(name)
+    return [column.dictionary[code] if code >= 0 else None for code in column.data]
+
+
+def test_unflushed_rows_survive_a_reopen():
+    path = tempfile.mkdtemp()
+    store = LogStore(path, segment_rows=4)
+    store.append(logs(6))  # one segment plus two buffered rows
+    assert store.get_status()["segments"] == 1 and store.get_status()["buffered"] == 2
+
+    reopened = LogStore(path, segment_rows=4)
+    assert reopened.rows == 6
+    assert decoded(reopened, "message") == [f"m{i}" for i in range(6)]
+
+
+def test_torn_append_log_line_is_dropped():
+    path = tempfile.mkdtemp()
+    LogStore(path).append(logs(2))
+    wal = os.path.join(path, "wal-seg-000000.jsonl")
+    with open(wal, "a") as f:
+        f.write('{"message": "cut sh')
+
+    reopened = LogStore(path)
+    assert reopened.rows == 2
+    reopened.append(logs(1, start=2))
+    assert LogStore(path).rows == 3
+
+
+def test_columns_grow_incrementally_without_touching_earlier_views():
+    store = LogStore(tempfile.mkdtemp(), segment_rows=3)
+    store.append(logs(2))
+    first = store.column("@timestamp").data.copy()
+    view = store.column("@timestamp").data
+    for start in range(2, 11, 3):
+        store.append(logs(3, start=start))
+        assert decoded(store, "trace_id") == [f"t{i}" for i in range(start + 3)]
+    assert np.array_equal(view, first)
+    assert len(store.column("@timestamp").data) == 11
+
+
+def test_status_reports_the_newest_timestamp():
+    path = tempfile.mkdtemp()
+    store = LogStore(path, segment_rows=2)
+    assert store.get_status()["latest_timestamp"] is None
+    store.append(logs(3, start=10) + logs(1, start=5))
+    assert store.get_status()["latest_timestamp"] == "2024-01-01T00:12:00+00:00"
+    assert LogStore(path, segment_rows=2).get_status()["latest_timestamp"] == "2024-01-01T00:12:00+00:00"
+
+
+def test_appended_logs_get_an_ingest_time():
+    store = LogStore(tempfile.mkdtemp())
+    store.append([dict(logs(1)[0], **{"event.ingested": "2024-02-01T00:00:00Z"})] + logs(1, start=1))
+    ingested = store.column("event.ingested").data
+    assert ingested[0] == 1706745600000.0
+    assert not np.isnan(ingested[1]) and ingested[1] > ingested[0]
+
+
+def test_local_esql_stats_where_and_errors():
+    store = LogStore(tempfile.mkdtemp(), segment_rows=5)
+    store.append(logs(9) + logs(3, start=20, service="auth"))
+    esql = LocalEsql(store)
+
+    result = esql.execute(
+        'FROM greenstick-logs | STATS errors = COUNT(*) WHERE level == "ERROR", total = COUNT(*) BY service '
+        "| SORT service"
+    )
+    assert [column["name"] for column in result["columns"]] == ["errors", "total", "service"]
+    assert result["values"] == [[3, 9, "api"], [1, 3, "auth"]]
+
+    result = esql.execute('FROM greenstick-logs | WHERE message LIKE "m2*" | KEEP trace_id | SORT trace_id', columnar=True)
+    assert result["values"] == [["t2", "t20", "t21", "t22"]]
+
+    try:
+        esql.execute("FROM greenstick-logs | MV_EXPAND service")
+        assert False, "unsupported command accepted"
+    except EsqlError:
+        pass
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
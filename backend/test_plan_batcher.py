@@ -0,0 +1,105 @@
+import asyncio
+import json
+import re
+from llm_guard import LLMGuard, CircuitOpenError
+from plan_batcher import PlanBatcher, parse_batch_plans
+
+
+def sections(i):
+    return {"Incident Details": json.dumps({"service": f"svc-{i}"}), "Correlated Events": "[]"}
+
+
+class FakeModel:
+    """Answers batch prompts with one plan per incident, optionally leaving some out."""
+
+    def __init__(self, skip=(), error=None):
+        self.prompts = []
+        self.skip = set(skip)
+        self.error = error
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        if self.error:
+            raise self.error
+        count = len(re.findall(r"^Incident \d+:$", prompt, re.M))
+        return json.dumps({"plans": [
+            {"incident": i, "action": "RESTART_SERVICE", "confidence": 0.9, "reasoning": f"batched {i}", "steps": []}
+            for i in range(count) if i not in self.skip
+        ]})
+
+
+def batcher(model, window_ms=20, max_incidents=10, guard=None):
+    singles = []
+
+    async def plan_single(s):
+        singles.append(s)
+        return {"action": "CREATE_TICKET", "confidence": 0.5, "reasoning": "single"}
+
+    call_model = model if guard is None else (lambda prompt: guard.call(lambda: model(prompt)))
+    plan_batcher = PlanBatcher(call_model, plan_single, lambda e: {"action": "MANUAL_INVESTIGATION", "degraded": True},
+                               window_ms=window_ms, max_incidents=max_incidents)
+    return plan_batcher, singles
+
+
+def run(plan_batcher, count):
+    async def go():
+        return await asyncio.gather(*(plan_batcher.plan(sections(i)) for i in range(count)))
+    return asyncio.run(go())
+
+
+def test_concurrent_plans_share_one_call_through_one_guard_slot():
+    # More incidents than the guard admits at once still take a single model call
+    model, guard = FakeModel(), LLMGuard(max_concurrency=1)
+    plan_batcher, singles = batcher(model, guard=guard)
+    plans = run(plan_batcher, 6)
+
+    assert len(model.prompts) == 1 and guard.calls == 1
+    assert [plan["reasoning"] for plan in plans] == [f"batched {i}" for i in range(6)]
+    assert not singles
+    assert plan_batcher.get_status()["batches"] == 1 and plan_batcher.get_status()["batched_incidents"] == 6
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    model = FakeModel()
+    plan_batcher, _ = batcher(model, window_ms=60000, max_incidents=3)
+
+    async def go():
+        return await asyncio.wait_for(asyncio.gather(*(plan_batcher.plan(sections(i)) for i in range(3))), 1)
+
+    assert len(asyncio.run(go())) == 3 and len(model.prompts) == 1
+
+
+def test_missing_answers_fall_back_to_single_calls():
+    model = FakeModel(skip={1})
+    plan_batcher, singles = batcher(model)
+    plans = run(plan_batcher, 3)
+
+    assert [plan["reasoning"] for plan in plans] == ["batched 0", "single", "batched 2"]
+    assert singles == [sections(1)] and plan_batcher.fallbacks == 1
+
+
+def test_unavailable_model_degrades_the_whole_batch():
+    model = FakeModel(error=CircuitOpenError("open"))
+    plan_batcher, singles = batcher(model)
+    plans = run(plan_batcher, 4)
+
+    assert all(plan["degraded"] for plan in plans)
+    assert not singles and plan_batcher.degraded == 4
+
+
+def test_parse_batch_plans_drops_malformed_entries():
+    text = "```json\n" + json.dumps({"plans": [
+        {"incident": 0, "action": "ROLLBACK", "confidence": 0.8},
+        {"incident": 0, "action": "SCALE_UP", "confidence": 0.7},  # duplicate
+        {"incident": 1, "action": "ROLLBACK"},  # no confidence
+        {"incident": 5, "action": "ROLLBACK", "confidence": 0.8},  # out of range
+    ]}) + "```"
+    assert parse_batch_plans(text, 3) == {0: {"action": "ROLLBACK", "confidence": 0.8}}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
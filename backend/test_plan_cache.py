@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+from plan_cache import PlanCache, plan_fingerprint
+
+PLAN = {"action": "ROLLBACK", "confidence": 0.8, "reasoning": "bad deploy", "steps": []}
+
+
+def incident(trace, ms, copies=1, errors=40):
+    log = {"@timestamp": f"2024-01-01T00:00:0{ms % 10}Z", "trace_id": trace, "service": "api",
+           "message": f"Upstream timeout after {ms}ms", "error_count": errors}
+    return [dict(log) for _ in range(copies)]
+
+
+def test_same_incident_minutes_later_shares_a_key():
+    first = plan_fingerprint(incident("t1", 120), [], [])
+    assert first == plan_fingerprint(incident("t2", 987, copies=3, errors=45), [], [])
+    assert first != plan_fingerprint(incident("t1", 120, errors=400), [], [])
+    assert first != plan_fingerprint([dict(incident("t1", 120)[0], service="auth")], [], [])
+
+
+def test_ttl_and_lru():
+    cache = PlanCache(ttl=3600, max_entries=2, db_path="")
+    cache.put("a", PLAN)
+    cache.put("b", PLAN)
+    assert cache.get("a") == PLAN  # "b" is now the oldest
+    cache.put("c", PLAN)
+    assert cache.get("b") is None and cache.get("c") == PLAN
+
+    cache._entries["a"] = (PLAN, time.time() - 3601)
+    assert cache.get("a") is None and "a" not in cache._entries
+
+
+def test_plans_survive_a_restart_with_a_db():
+    path = os.path.join(tempfile.mkdtemp(), "plans.sqlite3")
+    PlanCache(db_path=path).put("a", PLAN)
+    reopened = PlanCache(db_path=path)
+    assert reopened.get("a") == PLAN and reopened.disk_hits == 1
+    assert reopened.get("a") == PLAN and reopened.disk_hits == 1  # now served from memory
+
+    expired = PlanCache(ttl=0.01, db_path=path)
+    time.sleep(0.02)
+    assert expired.get("a") is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
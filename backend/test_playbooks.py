@@ -0,0 +1,66 @@
+import json
+import tempfile
+from playbooks import Playbook, PlaybookEngine, PLAYBOOK_HISTORY_BOOST
+
+
+def playbook(id, pattern, confidence, **kwargs):
+    return Playbook(id=id, pattern=pattern, action="RESTART_SERVICE", confidence=confidence,
+                    reasoning=f"{id} reasoning", steps=[f"{id} step"], **kwargs)
+
+
+ENGINE = PlaybookEngine([
+    playbook("db-pool", "connection pool exhausted", 0.8, history_keywords=["pool size"]),
+    playbook("disk-full", "no space left on device", 0.95),
+    playbook("auth-only", "token expired", 0.9, services=["auth"]),
+])
+
+
+def log(message, level="ERROR", service="api"):
+    return {"message": message, "level": level, "service": service}
+
+
+def test_primary_template_beats_a_more_confident_context_error():
+    incident = [log(f"Connection pool exhausted after {ms}ms") for ms in (120, 340, 95)]
+    incident.append(log("write failed: no space left on device"))
+    match = ENGINE.match(incident)
+    assert match["playbook"] == "db-pool" and match["plan"]["steps"] == ["db-pool step"]
+
+
+def test_majority_coverage_qualifies_a_non_primary_playbook():
+    # The only ERROR is the primary template, but the disk playbook covers 3 of 4 messages
+    incident = [log("retrying request 7")]
+    incident += [log(f"volume /data/{i}: no space left on device", level="WARN") for i in range(3)]
+    assert ENGINE.match(incident)["playbook"] == "disk-full"
+
+
+def test_context_only_match_is_a_miss():
+    incident = [log("checkout failed for order 1"), log("checkout failed for order 2"),
+                log("no space left on device", level="WARN")]
+    assert ENGINE.match(incident) is None and ENGINE.misses >= 1
+
+
+def test_service_restriction_and_history_boost():
+    assert ENGINE.match([log("token expired for user 5")]) is None
+    assert ENGINE.match([log("token expired for user 5", service="auth")])["playbook"] == "auth-only"
+
+    incident = [log("Connection pool exhausted")]
+    history = [{"description": "checkout outage", "root_cause": "Pool size too small"}]
+    assert ENGINE.match(incident, history)["confidence"] == round(0.8 + PLAYBOOK_HISTORY_BOOST, 2)
+
+
+def test_load_playbooks_from_file():
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"playbooks": [{
+            "id": "oom", "pattern": "out of memory", "action": "SCALE_UP", "confidence": 0.85,
+            "reasoning": "memory", "steps": ["scale"]
+        }]}, f)
+    engine = PlaybookEngine.from_file(f.name)
+    assert [p.id for p in engine.playbooks] == ["oom"]
+    assert engine.match([log("java.lang.OutOfMemoryError: out of memory")])["plan"]["action"] == "SCALE_UP"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import types
+import query_cache
+from query_cache import QueryCache
+
+
+@contextlib.contextmanager
+def clock(start=3000.0):
+    now = [start]
+    real = query_cache.time
+    query_cache.time = types.SimpleNamespace(time=lambda: now[0])
+    try:
+        yield now
+    finally:
+        query_cache.time = real
+
+
+class Source:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("es down")
+        return [{"call": self.calls}]
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def run():
+        cache, source = QueryCache(bucket_seconds=30), Source()
+        results = await asyncio.gather(*(cache.get("FROM logs |  LIMIT 1", source) for _ in range(5)))
+        results.append(await cache.get("FROM logs | LIMIT 1", source))  # same query, other whitespace
+        return cache, source, results
+
+    with clock():
+        cache, source, results = asyncio.run(run())
+    assert source.calls == 1 and all(result == [{"call": 1}] for result in results)
+    assert cache.misses == 1 and cache.coalesced == 4 and cache.hits == 1
+
+
+def test_previous_bucket_is_served_while_the_current_one_loads():
+    async def run(now):
+        cache, source = QueryCache(bucket_seconds=30, refresh_ahead=0), Source()
+        await cache.get("q", source)
+        now[0] += 30
+        stale = await cache.get("q", source)
+        await asyncio.sleep(0.05)
+        fresh = await cache.get("q", source)
+        now[0] += 60
+        expired = await cache.get("q", source)
+        return cache, stale, fresh, expired
+
+    with clock() as now:
+        cache, stale, fresh, expired = asyncio.run(run(now))
+    assert stale == [{"call": 1}] and fresh == [{"call": 2}] and expired == [{"call": 3}]
+    assert cache.stale_hits == 1
+
+
+def test_refresh_ahead_loads_the_next_bucket():
+    async def run(now):
+        cache, source = QueryCache(bucket_seconds=30, refresh_ahead=5), Source()
+        await cache.get("q", source)
+        now[0] += 26
+        await cache.get("q", source)  # hit near the end of the bucket
+        await asyncio.sleep(0.05)
+        now[0] += 4
+        return cache, source, await cache.get("q", source)
+
+    with clock() as now:
+        cache, source, result = asyncio.run(run(now))
+    assert result == [{"call": 2}] and cache.refreshes == 1 and cache.hits == 2
+
+
+def test_failures_are_not_cached_and_shapes_are_separate():
+    async def run():
+        cache = QueryCache(bucket_seconds=30)
+        try:
+            await cache.get("q", Source(fail=True))
+            assert False, "failure swallowed"
+        except RuntimeError:
+            pass
+        rows = await cache.get("q", Source())
+        columnar = await cache.get("q", Source(), shape="columnar")
+        return cache, rows, columnar
+
+    with clock():
+        cache, rows, columnar = asyncio.run(run())
+    assert rows == columnar == [{"call": 1}]
+    assert cache.fetch_failures == 1 and cache.misses == 3
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
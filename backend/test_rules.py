@@ -0,0 +1,77 @@
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from rules import Rule, RuleEngine, digit_key
+
+
+def linear_match(rules, message):
+    """Reference: check every rule on its own."""
+    return [
+        index for index, rule in enumerate(rules)
+        if (rule.pattern.lower() in message.lower() if rule.kind == "keyword"
+            else re.search(rule.pattern, message, re.IGNORECASE))
+    ]
+
+
+def random_rules(rng):
+    alphabet = "ab1 "
+    rules = [Rule(id=f"k{i}", pattern="".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))))
+             for i in range(rng.randint(1, 8))]
+    regexes = [r"a\d+b", r"b{2}", r"(a)1", r"1[^1]", r"^ab"]
+    rules += [Rule(id=f"r{i}", pattern=pattern, kind="regex") for i, pattern in enumerate(rng.sample(regexes, 2))]
+    rng.shuffle(rules)
+    return rules
+
+
+def test_trie_matches_linear_scan():
+    rng = random.Random(7)
+    for _ in range(300):
+        rules = random_rules(rng)
+        engine = RuleEngine(rules)
+        for _ in range(20):
+            message = "".join(rng.choice("aAbB12 ") for _ in range(rng.randint(0, 12)))
+            assert engine.match(message) == linear_match(rules, message), (rules, message)
+
+
+def test_digit_keys_agree_with_per_message_matching():
+    rng = random.Random(11)
+    for _ in range(300):
+        rules = random_rules(rng)
+        engine = RuleEngine(rules)
+        for _ in range(20):
+            message = "".join(rng.choice("ab0123 ") for _ in range(rng.randint(0, 12)))
+            by_key = engine.match_key(digit_key(message))
+            assert by_key is None or by_key == engine.match(message), (rules, message)
+
+
+def test_overlapping_keywords_all_match():
+    engine = RuleEngine.from_keywords(["OutOfMemory", "memory", "killed", "oom"])
+    assert engine.match_ids("java.lang.OutOfMemoryError, worker OOM-killed") == ["OutOfMemory", "memory", "killed", "oom"]
+
+
+def test_reload_keeps_previous_rules_on_bad_file():
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+    with open(path, "w") as f:
+        json.dump({"rules": [{"id": "oom", "pattern": "OOM"}]}, f)
+    engine = RuleEngine.from_file(path)
+    assert not engine.reload_if_changed()
+
+    with open(path, "w") as f:
+        json.dump([{"id": "bad", "pattern": "(", "kind": "regex"}], f)
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    assert not engine.reload_if_changed() and engine.match_ids("OOM") == ["oom"]
+
+    with open(path, "w") as f:
+        json.dump([{"id": "fatal", "pattern": "FATAL"}], f)
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert engine.reload_if_changed() and engine.match_ids("FATAL OOM") == ["fatal"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,64 @@
+import contextlib
+import types
+import suppression
+from suppression import SuppressionCache, fingerprint
+
+
+@contextlib.contextmanager
+def clock(start=1000.0):
+    now = [start]
+    real = suppression.time
+    suppression.time = types.SimpleNamespace(monotonic=lambda: now[0])
+    try:
+        yield now
+    finally:
+        suppression.time = real
+
+
+def spike(service="api", errors=5):
+    return {"type": "error_spike", "service": service, "error_count": errors, "trace_id": f"t-{errors}"}
+
+
+def test_spike_fingerprint_ignores_its_sample_trace():
+    assert fingerprint(spike(errors=5)) == fingerprint(spike(errors=6)) == ("error_spike", "api", "")
+
+
+def test_ttl_slides_while_the_anomaly_keeps_being_seen():
+    with clock() as now:
+        cache = SuppressionCache(ttl=60)
+        cache.store(spike(), {"plan": "restart"})
+        for _ in range(3):
+            now[0] += 50
+            hit = cache.lookup(spike())
+            assert hit["analysis"] == {"plan": "restart"}
+        assert hit["times_suppressed"] == 3
+
+        now[0] += 61
+        assert cache.lookup(spike()) is None and len(cache) == 0
+
+
+def test_escalation_is_re_analyzed():
+    with clock():
+        cache = SuppressionCache(ttl=60, escalation_factor=2.0)
+        cache.store(spike(errors=5), {})
+        assert cache.lookup(spike(errors=9)) is not None
+        assert cache.lookup(spike(errors=10)) is None
+        assert cache.escalations == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    with clock():
+        cache = SuppressionCache(max_entries=2)
+        cache.store(spike("a"), {})
+        cache.store(spike("b"), {})
+        assert cache.lookup(spike("a"))  # "b" is now the oldest
+        cache.store(spike("c"), {})
+        assert cache.lookup(spike("b")) is None
+        assert cache.lookup(spike("a")) and cache.lookup(spike("c"))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,61 @@
+import asyncio
+from tools import execute_tools
+
+
+class FakeEsql:
+    """es_client.esql stand-in: fails trace queries, counts concurrent calls."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def query(self, query, columnar=False):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if "trace_id ==" in query:
+                raise ConnectionError("connection reset")
+            return {"columns": [{"name": "service", "type": "keyword"}], "values": [["api"]]}
+        finally:
+            self.in_flight -= 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.esql = FakeEsql()
+
+
+def run(invocations, client, concurrency=4):
+    return asyncio.run(execute_tools(invocations, client, concurrency=concurrency))
+
+
+def test_failing_tools_do_not_affect_the_others():
+    client = FakeClient()
+    entries = run([
+        ("service_health", {"timeframe": "1 hour"}),
+        ("trace_request", {"trace_id": "abc"}),  # transport error
+        ("search_logs", {"limit": 5}),  # missing parameter
+        ("no_such_tool", {}),
+        ("service_health", {"timeframe": "1 hour"}),
+    ], client)
+
+    assert [entry["status"] for entry in entries] == ["ok", "error", "error", "error", "ok"]
+    assert entries[0]["results"] == [{"service": "api"}] == entries[4]["results"]
+    assert "connection reset" in entries[1]["error"]
+    assert entries[2]["error"].startswith("KeyError")
+    assert entries[3]["error"] == "Unknown tool: no_such_tool"
+    assert all("elapsed_ms" in entry for entry in entries)
+
+
+def test_concurrency_is_bounded():
+    client = FakeClient()
+    entries = run([("service_health", {"timeframe": "1 hour"})] * 10, client, concurrency=3)
+    assert len(entries) == 10 and client.esql.peak == 3
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
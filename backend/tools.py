@@ -5,8 +5,12 @@ Defines ES|QL-powered tools that the GreenStick agent can use.
 This aligns with Elastic Agent Builder's tool-based architecture.
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
+import asyncio
+import os
+import time
+from esql_results import EsqlResult, run_esql, columnar_result
 
 @dataclass
 class AgentTool:
@@ -16,6 +20,11 @@ class AgentTool:
     esql_template: str
     parameters: Dict[str, str]
 
+TOOL_BATCH_CONCURRENCY = int(os.getenv("TOOL_BATCH_CONCURRENCY", "4"))  # tools of one batch running at once
+TOOL_BATCH_MAX_TOOLS = 20
+
+_PARAM_TYPES = {"str": str, "int": int, "float": float}
+
 # ES|QL-powered tools for the GreenStick agent
 AGENT_TOOLS: Dict[str, AgentTool] = {
     "search_logs": AgentTool(
@@ -134,8 +143,42 @@ def get_tool_definitions() -> List[Dict[str, Any]]:
     ]
 
 
-def execute_tool(tool_id: str, params: Dict[str, Any], es_client) -> List[Dict[str, Any]]:
-    """Execute a tool with the given parameters"""
+def validate_params(tool_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check params against the tool's declared parameters and return them
+    converted to the declared types (numeric strings are accepted).
+    Raises ValueError describing the first problem found.
+    """
+    if tool_id not in AGENT_TOOLS:
+        raise ValueError(f"Unknown tool: {tool_id}")
+    declared = AGENT_TOOLS[tool_id].parameters
+
+    missing = [name for name in declared if name not in params]
+    if missing:
+        raise ValueError(f"Missing parameter(s) for {tool_id}: {', '.join(missing)}")
+    unexpected = [name for name in params if name not in declared]
+    if unexpected:
+        raise ValueError(f"Unexpected parameter(s) for {tool_id}: {', '.join(unexpected)}")
+
+    validated = {}
+    for name, type_name in declared.items():
+        value = params[name]
+        try:
+            if isinstance(value, (bool, dict, list)) or value is None:
+                raise TypeError
+            if type_name == "int" and isinstance(value, float) and not value.is_integer():
+                raise ValueError
+            validated[name] = _PARAM_TYPES[type_name](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Parameter '{name}' of {tool_id} must be {type_name}, got {value!r}")
+    return validated
+
+
+async def execute_tool(tool_id: str, params: Dict[str, Any], es_client, cache=None, columnar: bool = False) -> EsqlResult:
+    """
+    Execute a tool with the given parameters, through the QueryCache if one
+    is given. Returns row dicts, or column arrays with columnar=True.
+    """
     if tool_id not in AGENT_TOOLS:
         raise ValueError(f"Unknown tool: {tool_id}")
     
@@ -144,13 +187,42 @@ def execute_tool(tool_id: str, params: Dict[str, Any], es_client) -> List[Dict[s
     
     try:
         if hasattr(es_client, 'esql'):
-            resp = es_client.esql.query(query=query)
-            columns = [col['name'] for col in resp.get('columns', [])]
-            results = []
-            for row in resp.get('values', []):
-                results.append(dict(zip(columns, row)))
-            return results
+            if cache is not None:
+                return await cache.get(
+                    query, lambda: run_esql(es_client, query, columnar), shape="columnar" if columnar else "rows"
+                )
+            return await run_esql(es_client, query, columnar)
     except Exception as e:
         raise RuntimeError(f"Tool execution failed: {e}")
     
-    return []
+    return columnar_result({}) if columnar else []
+
+
+async def execute_tools(invocations: List[Tuple[str, Dict[str, Any]]], es_client, cache=None, columnar: bool = False,
+                        concurrency: int = TOOL_BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Run several (tool_id, params) invocations concurrently, at most
+    `concurrency` at a time. Returns one entry per invocation, in order, with
+    its results or error and how long it ran; one failing tool does not
+    affect the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(tool_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            entry: Dict[str, Any] = {"tool_id": tool_id, "status": "ok"}
+            try:
+                entry["results"] = await execute_tool(tool_id, params, es_client, cache=cache, columnar=columnar)
+            except (ValueError, RuntimeError) as e:
+                entry["status"] = "error"
+                entry["error"] = str(e)
+            except Exception as e:
+                # Transport or client errors: still only this tool's entry fails
+                print(f"[Tools] {tool_id} failed: {e!r}")
+                entry["status"] = "error"
+                entry["error"] = f"{type(e).__name__}: {e}"
+            entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return entry
+
+    return await asyncio.gather(*(run(tool_id, params) for tool_id, params in invocations))
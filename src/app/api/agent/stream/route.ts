@@ -0,0 +1,49 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { cookies } from 'next/headers';
+
+const BACKEND_URL = process.env.BACKEND_URL || 'http://localhost:8000';
+
+// Proxies the backend's Server-Sent Events stream without buffering it
+export async function GET(request: NextRequest) {
+    try {
+        const cookieStore = await cookies();
+        const apiKey = cookieStore.get('greenstick_api_key')?.value;
+
+        const headers: Record<string, string> = {
+            'Accept': 'text/event-stream',
+        };
+
+        if (apiKey) {
+            headers['Authorization'] = `Bearer ${apiKey}`;
+        }
+
+        const { searchParams } = new URL(request.url);
+        const incidentId = searchParams.get('incident_id') || 'trace-hq-001';
+
+        const response = await fetch(
+            `${BACKEND_URL}/agent/analyze/stream?incident_id=${encodeURIComponent(incidentId)}`,
+            { headers, signal: request.signal }
+        );
+
+        if (!response.ok || !response.body) {
+            if (response.status === 401) {
+                return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+            }
+            throw new Error(`Backend returned ${response.status}`);
+        }
+
+        return new Response(response.body, {
+            headers: {
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'Connection': 'keep-alive',
+            },
+        });
+    } catch (error) {
+        console.error('Agent stream error:', error);
+        return NextResponse.json(
+            { error: 'Failed to stream incident analysis', details: String(error) },
+            { status: 500 }
+        );
+    }
+}